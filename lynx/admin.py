@@ -7,7 +7,7 @@ from lynx.utils.singlefile import is_singlefile_enabled
 
 # Register your models here.
 
-from .models import Note, Tag, Link, UserSetting, UserCookie, Feed, FeedItem, LinkArchive
+from .models import Note, Tag, Link, UserSetting, UserCookie, Feed, FeedItem, Job, LinkArchive
 
 class LinkAdmin(admin.ModelAdmin):
   actions = ['create_archive']
@@ -22,8 +22,8 @@ class LinkAdmin(admin.ModelAdmin):
       )
       return
   
-    for link in queryset.filter(linkarchive__isnull=True):
-      create_archive_for_link_in_background(link.user.pk, link.pk)
+    create_archive_for_link_in_background.enqueue_many(
+        queryset.filter(has_archive=False).values_list('user_id', 'pk'))
 
   def get_actions(self, request: HttpRequest) -> OrderedDict[Any, Any]:
     actions = super().get_actions(request)
@@ -31,6 +31,11 @@ class LinkAdmin(admin.ModelAdmin):
       del actions['create_archive']
     return actions
 
+  def save_model(self, request, obj, form, change):
+    if 'article_html' in form.changed_data:
+      obj.render_reader_view()
+    super().save_model(request, obj, form, change)
+
 admin.site.register(Link, LinkAdmin)
 admin.site.register(UserSetting)
 admin.site.register(UserCookie)
@@ -39,4 +44,4 @@ admin.site.register(FeedItem)
 admin.site.register(Tag)
 admin.site.register(Note)
 admin.site.register(LinkArchive)
-
+admin.site.register(Job)
@@ -1,9 +1,14 @@
 from asgiref.sync import sync_to_async
 from django.http import HttpRequest
 from ninja import NinjaAPI, Schema
+from ninja.errors import HttpError
 from ninja.security import HttpBearer, APIKeyHeader
-from lynx.models import Note, UserSetting, Link
-from lynx import commands, url_parser
+from django.conf import settings
+from django.shortcuts import aget_object_or_404
+from lynx.errors import UrlParseError
+from lynx.models import Job, Note, UserSetting, Link
+from lynx import (api_keys, commands, extraction, summary_cache, tasks,
+                  url_parser)
 from typing import Any, Optional
 
 api = NinjaAPI()
@@ -15,10 +20,9 @@ class LynxKeyAuthenticator:
                    key: Optional[str]) -> Optional[UserSetting]:
     if key is None or key == "":
       return None
-    try:
-      return await UserSetting.objects.aget(lynx_api_key=key)
-    except UserSetting.DoesNotExist:
-      return None
+    # The setting comes with its user, so endpoints can use
+    # request.auth.user without another query.
+    return await api_keys.get_setting_for_api_key(key)
 
 
 class LynxApiKeyHeader(LynxKeyAuthenticator, APIKeyHeader):
@@ -33,6 +37,9 @@ lynx_auth_methods = [LynxApiKeyBearer(), LynxApiKeyHeader()]
 
 class LinkCreate(Schema):
   url: str
+  # Queue the link to be loaded in the background and respond with a job
+  # to poll, rather than waiting for it
+  background: bool = False
 
 class LinkOverview(Schema):
   id: int
@@ -43,10 +50,50 @@ class LinkOverview(Schema):
   read_time_seconds: int = None
   read_time_display: str = None
 
+class LinkJobOverview(Schema):
+  job_id: int
+  status: str
+  error: Optional[str] = None
+  link: Optional[LinkOverview] = None
+
 class NoteCreate(Schema):
   url: str
   content: str
 
+class LinkBatchCreate(Schema):
+  urls: list[str]
+
+class LinkBatchResult(Schema):
+  url: str
+  # 'existing', 'created' or 'failed'
+  status: str
+  error: Optional[str] = None
+  link: Optional[LinkOverview] = None
+
+class NoteBatchCreate(Schema):
+  notes: list[NoteCreate]
+
+class ExtractionMetricsOverview(Schema):
+  workers: int
+  in_flight: int
+  queue_depth: int
+  submitted: int
+  completed: int
+  failed: int
+  avg_wait_ms: float
+  avg_run_ms: float
+  max_latency_ms: float
+
+class SummaryCacheMetricsOverview(Schema):
+  hits: int
+  misses: int
+  hit_rate: float
+  tokens_saved: int
+  evictions: int
+  entries: int
+  total_hits: int
+  total_tokens_saved: int
+
 class NoteOverview(Schema):
   id: int
   content: str
@@ -55,15 +102,155 @@ class NoteOverview(Schema):
   link_title: str
   link: LinkOverview = None
 
-@api.post("/links/add", auth=lynx_auth_methods, response=LinkOverview)
+@api.post("/links/add",
+          auth=lynx_auth_methods,
+          response={
+              200: LinkOverview,
+              202: LinkJobOverview
+          })
 async def create_link(request, link_create: LinkCreate):
   assert isinstance(request.auth, UserSetting)
-  user = await (sync_to_async(lambda: request.auth.user)())
-  url, _ = await commands.get_or_create_link(link_create.url, user)
-  return url
+  user = request.auth.user
+  if not link_create.background:
+    url, _ = await commands.get_or_create_link(link_create.url, user)
+    return url
+
+  existing_link = await commands.find_existing_link(link_create.url, user)
+  if existing_link is not None:
+    return existing_link
+  job = await sync_to_async(tasks.add_link_in_background)(user.pk,
+                                                          link_create.url)
+  return 202, await get_link_job_overview(job, user)
+
+async def get_link_job_overview(job: Job, user) -> dict:
+  overview = {
+      'job_id': job.pk,
+      'status': job.status,
+      'error': job.last_error or None,
+      'link': None,
+  }
+  if job.status == Job.Status.COMPLETE and job.result:
+    overview['link'] = await Link.objects.filter(
+        pk=job.result['link_id'], user=user).afirst()
+  return overview
+
+@api.get("/links/jobs/{job_id}",
+         auth=lynx_auth_methods,
+         response=LinkJobOverview)
+async def link_job_status(request, job_id: int):
+  assert isinstance(request.auth, UserSetting)
+  user = request.auth.user
+  # The user is the job's first argument
+  job = await aget_object_or_404(Job,
+                                 pk=job_id,
+                                 name=tasks.add_link_in_background.name,
+                                 args__0=user.pk)
+  return await get_link_job_overview(job, user)
 
 @api.post("/notes/add", auth=lynx_auth_methods, response=NoteOverview)
 async def create_note(request, note_create: NoteCreate):
   assert isinstance(request.auth, UserSetting)
-  user = await (sync_to_async(lambda: request.auth.user)())
-  return await commands.create_note(user, note_create.url, note_create.content)
\ No newline at end of file
+  user = request.auth.user
+  return await commands.create_note(user, note_create.url, note_create.content)
+
+class NoteBatchResult(Schema):
+  url: str
+  # 'created' or 'failed'
+  status: str
+  error: Optional[str] = None
+  note: Optional[NoteOverview] = None
+
+def check_batch_size(size: int):
+  limit = settings.LYNX_API_BATCH_MAX_ITEMS
+  if size > limit:
+    raise HttpError(422, f'Batches are limited to {limit} items')
+
+def get_error_message(error: Exception) -> str:
+  if isinstance(error, UrlParseError):
+    return str(error.http_error)
+  return str(error) or error.__class__.__name__
+
+async def get_or_create_links(urls: list[str],
+                              user) -> list[commands.BatchLinkResult]:
+  return await commands.get_or_create_links(
+      urls, user, settings.LYNX_API_BATCH_CONCURRENCY)
+
+@api.post("/links/add/batch",
+          auth=lynx_auth_methods,
+          response=list[LinkBatchResult])
+async def create_links(request, batch: LinkBatchCreate):
+  assert isinstance(request.auth, UserSetting)
+  check_batch_size(len(batch.urls))
+  results = []
+  for result in await get_or_create_links(batch.urls, request.auth.user):
+    if result.error is not None:
+      results.append({
+          'url': result.url,
+          'status': 'failed',
+          'error': get_error_message(result.error),
+      })
+    else:
+      results.append({
+          'url': result.url,
+          'status': 'created' if result.created else 'existing',
+          'link': result.link,
+      })
+  return results
+
+@api.post("/notes/add/batch",
+          auth=lynx_auth_methods,
+          response=list[NoteBatchResult])
+async def create_notes(request, batch: NoteBatchCreate):
+  assert isinstance(request.auth, UserSetting)
+  check_batch_size(len(batch.notes))
+  user = request.auth.user
+  link_results = await get_or_create_links(
+      [note.url for note in batch.notes], user)
+  notes = [
+      Note(user=user,
+           content=note.content,
+           link=result.link,
+           hostname=result.link.hostname,
+           url=result.link.cleaned_url,
+           link_title=result.link.title)
+      for note, result in zip(batch.notes, link_results)
+      if result.error is None
+  ]
+  # Saved together, in the order of the batch
+  await Note.objects.abulk_create(notes)
+
+  saved_notes = iter(notes)
+  results = []
+  for result in link_results:
+    if result.error is not None:
+      results.append({
+          'url': result.url,
+          'status': 'failed',
+          'error': get_error_message(result.error),
+      })
+    else:
+      results.append({
+          'url': result.url,
+          'status': 'created',
+          'note': next(saved_notes),
+      })
+  return results
+
+@api.get("/extraction/metrics",
+         auth=lynx_auth_methods,
+         response=ExtractionMetricsOverview)
+async def extraction_metrics(request):
+  # Metrics are per web process, not aggregated across processes.
+  return extraction.metrics.snapshot()
+
+@api.get("/summaries/cache/metrics",
+         auth=lynx_auth_methods,
+         response=SummaryCacheMetricsOverview)
+async def summary_cache_metrics(request):
+  # The counters are per process, so they leave out the summaries made by
+  # the background worker. The totals come from the cache itself. They
+  # cover every user's summaries, so only staff can see them.
+  assert isinstance(request.auth, UserSetting)
+  if not request.auth.user.is_staff:
+    raise HttpError(403, 'Only staff users can see the summary cache metrics')
+  return summary_cache.metrics.snapshot() | await summary_cache.get_totals()
@@ -0,0 +1,68 @@
+import hashlib
+import secrets
+import time
+from typing import Optional
+
+from django.conf import settings
+from lynx.models import UserSetting
+
+# Only the hash of a key is stored. Keys are random, so a plain SHA-256 is
+# enough to keep them from being read back, and lets a key be looked up by
+# its hash on an index.
+API_KEY_BYTES = 16
+# The start of the key that's shown in the settings, so that users can tell
+# which key an app is using.
+API_KEY_PREFIX_LENGTH = 6
+
+
+def generate_api_key() -> str:
+  return secrets.token_hex(API_KEY_BYTES)
+
+
+def hash_api_key(key: str) -> str:
+  return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def set_api_key(setting: UserSetting, key: str):
+  # Pass an empty key to clear it
+  setting.lynx_api_key_hash = hash_api_key(key) if key else ''
+  setting.lynx_api_key_prefix = key[:API_KEY_PREFIX_LENGTH]
+
+
+class VerifiedKey:
+
+  def __init__(self, setting: UserSetting):
+    self.setting = setting
+    self.verified_at = time.monotonic()
+
+
+# Settings (with their user) by key hash, for keys that were recently
+# verified. Changes made in this process clear the user's entries right
+# away (see signals.py), other processes pick them up once they expire.
+_verified_keys: dict[str, VerifiedKey] = {}
+
+
+async def get_setting_for_api_key(key: str) -> Optional[UserSetting]:
+  if not key:
+    return None
+  key_hash = hash_api_key(key)
+  verified = _verified_keys.get(key_hash)
+  if (verified is not None and time.monotonic() - verified.verified_at <=
+      settings.LYNX_API_KEY_CACHE_SECONDS):
+    return verified.setting
+
+  setting = await UserSetting.objects.select_related('user').filter(
+      lynx_api_key_hash=key_hash).afirst()
+  if setting is None:
+    _verified_keys.pop(key_hash, None)
+    return None
+  _verified_keys[key_hash] = VerifiedKey(setting)
+  return setting
+
+
+def invalidate_api_keys(setting: UserSetting):
+  # Forgets the user's keys, and anyone else's that had the setting's key
+  _verified_keys.pop(setting.lynx_api_key_hash, None)
+  for key_hash, verified in list(_verified_keys.items()):
+    if verified.setting.user_id == setting.user_id:
+      _verified_keys.pop(key_hash, None)
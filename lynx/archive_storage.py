@@ -0,0 +1,143 @@
+import abc
+import hashlib
+import os
+import tempfile
+from typing import BinaryIO, Iterator
+
+import brotli
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+# SingleFile archives are HTML with every image and stylesheet inlined, so
+# they're large but compress very well. Archives are stored compressed and
+# keyed by the hash of their uncompressed content, so saving the same page
+# twice only stores it once.
+
+# Higher qualities are much slower for little extra gain on multi-megabyte
+# pages.
+COMPRESSION_QUALITY = 5
+CHUNK_SIZE = 64 * 1024
+
+
+def hash_content(content: bytes) -> str:
+  return hashlib.sha256(content).hexdigest()
+
+
+def compress_content(content: bytes) -> bytes:
+  return brotli.compress(content, quality=COMPRESSION_QUALITY)
+
+
+def lock_archive_content(content_hash: str):
+  """
+  Takes a lock on the stored content with this hash until the current
+  transaction ends. Saving content along with the LinkArchive that uses it,
+  and deleting content once nothing uses it, both happen under it.
+  Otherwise a save could find the content already stored just as it's
+  being deleted, and be left pointing at nothing.
+  """
+  with connection.cursor() as cursor:
+    cursor.execute('SELECT pg_advisory_xact_lock(hashtext(%s))',
+                   [f'lynx_archive:{content_hash}'])
+
+
+def decompress_chunks(compressed: BinaryIO) -> Iterator[bytes]:
+  decompressor = brotli.Decompressor()
+  while chunk := compressed.read(CHUNK_SIZE):
+    data = decompressor.process(chunk)
+    if data:
+      yield data
+
+
+class ArchiveStorage(abc.ABC):
+  """
+  Stores compressed archives by content hash. Subclasses provide the
+  actual storage; the content encoding is fixed to brotli so that stored
+  archives can be sent to browsers as-is.
+  """
+  content_encoding = 'br'
+
+  def save(self, content: bytes) -> str:
+    # Returns the key to look the archive up with later
+    key = hash_content(content)
+    if not self.exists(key):
+      self._save(key, compress_content(content))
+    return key
+
+  def save_compressed(self, key: str, compressed: bytes):
+    # For content compressed ahead of time with compress_content, keyed by
+    # the hash of the uncompressed content
+    if not self.exists(key):
+      self._save(key, compressed)
+
+  def read(self, key: str) -> bytes:
+    with self.open(key) as compressed:
+      return b''.join(decompress_chunks(compressed))
+
+  @abc.abstractmethod
+  def _save(self, key: str, compressed: bytes):
+    pass
+
+  @abc.abstractmethod
+  def open(self, key: str) -> BinaryIO:
+    # Opens the compressed archive for reading
+    pass
+
+  @abc.abstractmethod
+  def size(self, key: str) -> int:
+    # Size of the compressed archive in bytes
+    pass
+
+  @abc.abstractmethod
+  def exists(self, key: str) -> bool:
+    pass
+
+  @abc.abstractmethod
+  def delete(self, key: str):
+    pass
+
+
+class LocalArchiveStorage(ArchiveStorage):
+  """
+  Stores archives under LYNX_ARCHIVE_ROOT, fanned out into subdirectories by
+  the first characters of the hash so no single directory gets too big.
+  """
+
+  def __init__(self, root: str | None = None):
+    self.root = str(root or settings.LYNX_ARCHIVE_ROOT)
+
+  def path(self, key: str) -> str:
+    return os.path.join(self.root, key[:2], key[2:4], f'{key}.br')
+
+  def _save(self, key: str, compressed: bytes):
+    path = self.path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so a crash never leaves a partial
+    # archive behind under the real name.
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(compressed)
+      os.replace(temp_path, path)
+    except BaseException:
+      os.unlink(temp_path)
+      raise
+
+  def open(self, key: str) -> BinaryIO:
+    return open(self.path(key), 'rb')
+
+  def size(self, key: str) -> int:
+    return os.path.getsize(self.path(key))
+
+  def exists(self, key: str) -> bool:
+    return os.path.exists(self.path(key))
+
+  def delete(self, key: str):
+    try:
+      os.unlink(self.path(key))
+    except FileNotFoundError:
+      pass
+
+
+def get_archive_storage() -> ArchiveStorage:
+  return import_string(settings.LYNX_ARCHIVE_STORAGE)()
@@ -0,0 +1,212 @@
+import asyncio
+import codecs
+import csv
+from typing import IO, Iterable, Iterator, Optional
+
+from asgiref.sync import sync_to_async
+from dateutil import parser
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from lynx import commands, url_parser
+from lynx.jobs import JobBatch
+from lynx.models import BulkUpload, BulkUploadRow, Link, Tag
+from lynx.utils.urls import get_url_key
+
+# Rows are written to the database this many at a time as the file is read
+ROW_INSERT_BATCH_SIZE = 1000
+# Number of rows imported between progress updates. An interrupted import
+# redoes at most this many rows.
+IMPORT_BATCH_SIZE = 50
+# Maximum number of pages being downloaded at once
+MAX_CONCURRENT_FETCHES = 8
+
+
+def parse_readwise_row(row: dict, bulk_tag: str) -> Optional[BulkUploadRow]:
+  url = row['URL']
+  if url.startswith('mailto'):
+    return None
+  tags = []
+  if len(row.get('Document tags', '')) > 2:
+    tags = [
+        tag.strip().removesuffix("'").removeprefix("'")
+        for tag in row['Document tags'][1:-1].split(', ')
+    ]
+  tags.append(bulk_tag)
+  # Tags are created in one statement per batch, so a single overlong name
+  # would fail every link in it.
+  max_length = Tag._meta.get_field('name').max_length
+  tags = [tag[:max_length] for tag in tags]
+
+  last_viewed_at = None
+  if float(row.get('Reading progress', '0')) > 0.75:
+    last_viewed_at = timezone.now()
+
+  added_at = timezone.now()
+  if row.get('Saved date'):
+    added_at = parser.parse(row['Saved date'])
+
+  return BulkUploadRow(url=url,
+                       tags=tags,
+                       added_at=added_at,
+                       last_viewed_at=last_viewed_at)
+
+
+def read_readwise_rows(file: IO[bytes],
+                       bulk_tag: str) -> Iterator[BulkUploadRow]:
+  reader = csv.DictReader(codecs.iterdecode(file, 'utf-8'))
+  for row in reader:
+    upload_row = parse_readwise_row(row, bulk_tag)
+    if upload_row is not None:
+      yield upload_row
+
+
+def create_upload_rows(bulk_upload: BulkUpload,
+                       rows: Iterable[BulkUploadRow]) -> int:
+  # Stores the rows of an upload without holding the whole file in memory
+  total = 0
+  batch = []
+  for row in rows:
+    row.bulk_upload = bulk_upload
+    batch.append(row)
+    if len(batch) >= ROW_INSERT_BATCH_SIZE:
+      BulkUploadRow.objects.bulk_create(batch)
+      total += len(batch)
+      batch = []
+  if batch:
+    BulkUploadRow.objects.bulk_create(batch)
+    total += len(batch)
+  BulkUpload.objects.filter(pk=bulk_upload.pk).update(total_rows=total)
+  bulk_upload.total_rows = total
+  return total
+
+
+def resolve_tags(user, names: Iterable[str]) -> dict[str, Tag]:
+  # Looks up every tag in one query, creating the missing ones in another
+  names = set(names)
+  tags = {tag.name: tag for tag in Tag.objects.filter(user=user, name__in=names)}
+  missing = [Tag(user=user, name=name) for name in names if name not in tags]
+  for tag in Tag.objects.bulk_create(missing):
+    tags[tag.name] = tag
+  return tags
+
+
+def find_existing_links(user, urls: Iterable[str]) -> dict[str, int]:
+  # Maps the url keys of the given URLs to the pks of the links already
+  # saved from them, or cleaned to them, matching the same way as
+  # commands.find_existing_link.
+  keys = {get_url_key(url) for url in urls}
+  links = list(
+      Link.objects.filter(commands.match_url_keys(keys),
+                          user=user).values_list('pk', 'url_key',
+                                                 'cleaned_url_key'))
+  found = {url_key: pk for pk, url_key, _ in links if url_key in keys}
+  for pk, _, cleaned_url_key in links:
+    if cleaned_url_key in keys:
+      found.setdefault(cleaned_url_key, pk)
+  return found
+
+
+class BulkImporter:
+  """
+  Imports the pending rows of a BulkUpload in batches. For each batch, the
+  tags are resolved and the URLs are checked against the library with a
+  handful of queries, and only the pages that aren't already saved are
+  downloaded, several at a time.
+
+  Progress is stored on the BulkUpload as each batch finishes, so running
+  the importer again after a crash continues where it stopped.
+  """
+
+  def __init__(self,
+               bulk_upload: BulkUpload,
+               batch_size: int = IMPORT_BATCH_SIZE,
+               max_concurrency: int = MAX_CONCURRENT_FETCHES):
+    self.bulk_upload = bulk_upload
+    self.user = bulk_upload.user
+    self.batch_size = batch_size
+    self.max_concurrency = max_concurrency
+
+  async def run(self):
+    await BulkUpload.objects.filter(pk=self.bulk_upload.pk).aupdate(
+        status=BulkUpload.Status.IMPORTING)
+    while True:
+      rows = [
+          row async for row in BulkUploadRow.objects.filter(
+              bulk_upload=self.bulk_upload,
+              status=BulkUploadRow.Status.PENDING).order_by('pk')
+          [:self.batch_size]
+      ]
+      if not rows:
+        break
+      await self.import_rows(rows)
+    await BulkUpload.objects.filter(pk=self.bulk_upload.pk).aupdate(
+        status=BulkUpload.Status.COMPLETE)
+    await self.bulk_upload.arefresh_from_db()
+
+  async def import_rows(self, rows: list[BulkUploadRow]):
+    existing = await sync_to_async(find_existing_links)(
+        self.user, [row.url for row in rows])
+
+    # Only the first row for each URL is downloaded, the others share its
+    # link.
+    to_fetch: dict[str, BulkUploadRow] = {}
+    for row in rows:
+      key = get_url_key(row.url)
+      if key not in existing and key not in to_fetch:
+        to_fetch[key] = row
+
+    limit = asyncio.Semaphore(self.max_concurrency)
+
+    async def fetch(row: BulkUploadRow) -> Link | Exception:
+      try:
+        async with limit:
+          link = await url_parser.parse_url(
+              row.url,
+              self.user,
+              model_fields={
+                  'added_at': row.added_at or timezone.now(),
+                  'last_viewed_at': row.last_viewed_at,
+                  'created_from_bulk_upload': self.bulk_upload,
+              })
+        link, _ = await commands.save_new_link(link)
+        return link
+      except Exception as e:
+        return e
+
+    # The jobs queued for each new link are inserted together
+    async with JobBatch():
+      results = await asyncio.gather(
+          *[fetch(row) for row in to_fetch.values()])
+    errors = {}
+    for key, result in zip(to_fetch.keys(), results):
+      if isinstance(result, Exception):
+        errors[key] = str(result) or result.__class__.__name__
+      else:
+        existing[key] = result.pk
+
+    for row in rows:
+      key = get_url_key(row.url)
+      if key in existing:
+        row.link_id = existing[key]
+        row.status = BulkUploadRow.Status.IMPORTED
+      else:
+        row.status = BulkUploadRow.Status.FAILED
+        row.error = errors.get(key, '')
+    await sync_to_async(self._save_rows)(rows)
+
+  def _save_rows(self, rows: list[BulkUploadRow]):
+    imported = [row for row in rows if row.link_id is not None]
+    with transaction.atomic():
+      tags = resolve_tags(self.user,
+                          {name for row in imported for name in row.tags})
+      LinkTag = Link.tags.through
+      LinkTag.objects.bulk_create([
+          LinkTag(link_id=row.link_id, tag_id=tags[name].pk)
+          for row in imported for name in set(row.tags)
+      ],
+                                  ignore_conflicts=True)
+      BulkUploadRow.objects.bulk_update(rows, ['status', 'error', 'link'])
+      BulkUpload.objects.filter(pk=self.bulk_upload.pk).update(
+          processed_rows=F('processed_rows') + len(rows),
+          failed_rows=F('failed_rows') + len(rows) - len(imported))
@@ -1,11 +1,75 @@
+import asyncio
+import logging
+from datetime import datetime
+from http import HTTPStatus
 from typing import Tuple, Optional
-from lynx import url_parser
+from asgiref.sync import sync_to_async
+from lynx import extraction, url_parser
+from lynx.archive_storage import (compress_content, get_archive_storage,
+                                  hash_content, lock_archive_content)
 from lynx.models import Link, LinkArchive, Note, UserCookie
+from lynx.utils.urls import get_url_key
+from django.db import IntegrityError, transaction
 from django.db.models import Q
 from urllib.parse import urlparse
 
 from lynx.utils.singlefile import get_singlefile_content
 
+logger = logging.getLogger(__name__)
+
+# Fields that are replaced when a link is reloaded from its page
+RELOADED_FIELDS = [
+    'cleaned_url', 'hostname', 'title', 'article_date', 'author', 'excerpt',
+    'article_html', 'reader_html', 'table_of_contents', 'raw_text_content',
+    'full_page_html', 'header_image_url', 'read_time_seconds',
+    'read_time_display', 'etag', 'modified', 'content_hash'
+]
+# Fields that are replaced when a link is parsed again from its saved page
+REPARSED_FIELDS = [
+    'article_date', 'author', 'title', 'excerpt', 'article_html',
+    'reader_html', 'table_of_contents', 'raw_text_content', 'header_image_url',
+    'read_time_seconds', 'read_time_display'
+]
+
+
+def match_url_keys(keys) -> Q:
+  # Links saved from one of the URLs, or that were cleaned to one of them.
+  # Both keys are indexed together with the user.
+  return Q(url_key__in=keys) | Q(cleaned_url_key__in=keys)
+
+
+async def find_existing_link(url: str, user) -> Optional[Link]:
+  key = get_url_key(url)
+  links = [
+      link async for link in Link.objects.filter(match_url_keys([key]),
+                                                 user=user)
+  ]
+  # Prefer the link that was saved from the URL itself
+  for link in links:
+    if link.url_key == key:
+      return link
+  return links[0] if links else None
+
+
+def _insert_link(link: Link):
+  # In a savepoint so that a duplicate doesn't break any surrounding
+  # transaction.
+  with transaction.atomic():
+    link.save()
+
+
+async def save_new_link(link: Link) -> Tuple[Link, bool]:
+  # Another request may have saved the same page while this one was
+  # loading it, in which case that link wins.
+  try:
+    await sync_to_async(_insert_link)(link)
+  except IntegrityError:
+    existing_link = await find_existing_link(link.original_url, link.user)
+    if existing_link is None:
+      raise
+    return (existing_link, False)
+  return (link, True)
+
 
 async def get_or_create_link(url: str,
                              user,
@@ -14,15 +78,98 @@ async def get_or_create_link(url: str,
   # We could probably make this work with get_or_create but
   # this way we avoid loading the external link altogether in the case
   # where the link already exists.
-  existing_link = await Link.objects.filter(Q(cleaned_url__iexact=url)
-                                            | Q(original_url__iexact=url),
-                                            user=user).afirst()
+  existing_link = await find_existing_link(url, user)
   if existing_link is not None:
     return (existing_link, False)
 
   link = await url_parser.parse_url(url, user, model_fields)
-  await link.asave()
-  return (link, True)
+  return await save_new_link(link)
+
+
+class BatchLinkResult:
+  # The outcome of getting or creating one of the links in a batch
+
+  def __init__(self,
+               url: str,
+               link: Optional[Link] = None,
+               created: bool = False,
+               error: Optional[Exception] = None):
+    self.url = url
+    self.link = link
+    self.created = created
+    self.error = error
+
+
+async def find_existing_links(keys: set[str], user) -> dict[str, Link]:
+  # One lookup for the whole batch, keyed by the url keys it matched. As
+  # with find_existing_link, a link saved from a URL wins over one that was
+  # cleaned to it.
+  links = [
+      link async for link in Link.objects.filter(match_url_keys(keys),
+                                                 user=user)
+  ]
+  found = {link.url_key: link for link in links if link.url_key in keys}
+  for link in links:
+    if link.cleaned_url_key in keys:
+      found.setdefault(link.cleaned_url_key, link)
+  return found
+
+
+async def get_or_create_links(urls: list[str], user,
+                              concurrency: int) -> list[BatchLinkResult]:
+  """
+  Batch version of get_or_create_link. The URLs are checked against the
+  library together, and the new pages are loaded at most `concurrency` at
+  a time, each one once however many times it's in the batch. A URL that
+  can't be parsed or a page that fails to load only fails its own
+  results, which are returned in the order of `urls`. A page that's in the
+  batch more than once is reported as created only for its first URL.
+  """
+  keys: dict[str, str] = {}
+  invalid_urls: dict[str, ValueError] = {}
+  for url in urls:
+    try:
+      keys[url] = get_url_key(url)
+    except ValueError as e:
+      invalid_urls[url] = e
+  existing_links = await find_existing_links(set(keys.values()), user)
+  semaphore = asyncio.Semaphore(concurrency)
+
+  async def create(url: str) -> BatchLinkResult:
+    async with semaphore:
+      try:
+        link = await url_parser.parse_url(url, user)
+        link, created = await save_new_link(link)
+      except Exception as e:
+        logger.warning('Failed to add %s: %s', url, e)
+        return BatchLinkResult(url, error=e)
+    return BatchLinkResult(url, link, created)
+
+  created_by_key: dict[str, asyncio.Task] = {}
+  for url, key in keys.items():
+    if key not in existing_links and key not in created_by_key:
+      created_by_key[key] = asyncio.create_task(create(url))
+  if created_by_key:
+    await asyncio.wait(created_by_key.values())
+
+  results = []
+  reported_keys = set()
+  for url in urls:
+    if url in invalid_urls:
+      results.append(BatchLinkResult(url, error=invalid_urls[url]))
+      continue
+    key = keys[url]
+    if key in existing_links:
+      results.append(BatchLinkResult(url, existing_links[key]))
+    else:
+      created = created_by_key[key].result()
+      # Only the first spelling of a new page reports it as created, by
+      # the time the others come up it already exists.
+      results.append(
+          BatchLinkResult(url, created.link, created.created and
+                          key not in reported_keys, created.error))
+      reported_keys.add(key)
+  return results
 
 
 async def get_or_create_link_with_content(
@@ -30,14 +177,68 @@ async def get_or_create_link_with_content(
     content: str,
     user,
     model_fields: Optional[dict] = None) -> Tuple[Link, bool]:
-  existing_link = await Link.objects.filter(Q(cleaned_url__iexact=url)
-                                            | Q(original_url__iexact=url),
-                                            user=user).afirst()
+  existing_link = await find_existing_link(url, user)
   if existing_link is not None:
     return (existing_link, False)
-  link = url_parser.parse_url_with_content(url, content, user, model_fields)
-  await link.asave()
-  return (link, True)
+  link = await url_parser.parse_url_with_content(url, content, user,
+                                                model_fields)
+  return await save_new_link(link)
+
+
+async def reload_link(link: Link, user) -> bool:
+  """
+  Downloads the link's page again and re-extracts it. Pages the server
+  reports as not modified, or that come back identical to the saved one,
+  are left alone without extracting or saving anything. Returns whether
+  the link was updated.
+  """
+  url_context = url_parser.UrlContext(link.original_url, user)
+  page = await url_parser.fetch_page(url_context,
+                                     etag=link.etag,
+                                     modified=link.modified)
+  if page.status_code == HTTPStatus.NOT_MODIFIED:
+    return False
+  if link.content_hash and url_parser.hash_page(
+      page.text) == link.content_hash:
+    return False
+
+  new_link = await url_parser.parse_page(url_context, page)
+  for field in RELOADED_FIELDS:
+    setattr(link, field, getattr(new_link, field))
+  await link.asave(update_fields=RELOADED_FIELDS +
+                   ['cleaned_url_key', 'updated_at'])
+  return True
+
+
+def apply_reparsed_fields(link: Link, parsed: dict) -> bool:
+  """
+  Copies the fields parsed from the link's saved page onto it. Returns
+  whether any of them changed.
+  """
+  changed = False
+  for field in REPARSED_FIELDS:
+    value = parsed[field]
+    # Pages without a published date get the current time. Keep the date
+    # the link already has instead.
+    if field == 'article_date' and isinstance(value, datetime):
+      continue
+    if getattr(link, field) != value:
+      setattr(link, field, value)
+      changed = True
+  return changed
+
+
+async def reparse_link(link: Link, user) -> bool:
+  # Links are usually loaded without their content
+  deferred = link.get_deferred_fields() & {'full_page_html', *REPARSED_FIELDS}
+  if deferred:
+    await link.arefresh_from_db(fields=list(deferred))
+  url_context = url_parser.UrlContext(link.original_url, user)
+  parsed = await extraction.parse_content(url_context, link.full_page_html)
+  if not apply_reparsed_fields(link, parsed):
+    return False
+  await link.asave(update_fields=REPARSED_FIELDS + ['updated_at'])
+  return True
 
 
 async def create_note_for_link(user, link: Link, note_content: str) -> Note:
@@ -77,8 +278,26 @@ async def create_archive_for_link(user, link: Link) -> Optional[LinkArchive]:
   archive_content = await get_singlefile_content(url, cookies=cookie_data)
   if archive_content is None:
     return None
-  return await LinkArchive.objects.acreate(
-      user=user,
-      link=link,
-      archive_content=archive_content,
-  )
+  content = archive_content.encode('utf-8')
+  # Compressing a multi-megabyte page takes a while, so keep it off the
+  # event loop, and outside of the transaction below.
+  compressed = await sync_to_async(compress_content,
+                                   thread_sensitive=False)(content)
+  return await sync_to_async(_save_link_archive)(user, link,
+                                                 hash_content(content),
+                                                 compressed, len(content))
+
+
+def _save_link_archive(user, link: Link, content_hash: str, compressed: bytes,
+                       content_size: int) -> LinkArchive:
+  # Under the lock that deleting unused content takes (see signals.py), so
+  # the content can't be deleted between being found and being used.
+  with transaction.atomic():
+    lock_archive_content(content_hash)
+    get_archive_storage().save_compressed(content_hash, compressed)
+    return LinkArchive.objects.create(
+        user=user,
+        link=link,
+        content_hash=content_hash,
+        content_size=content_size,
+    )
@@ -0,0 +1,142 @@
+import gzip
+import json
+import zipfile
+from typing import IO, Callable, Iterator, Optional
+
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Model, QuerySet
+from lynx.models import Feed, FeedItem, Link, LinkArchive, Note, Tag
+
+# Rows are fetched from a server-side cursor this many at a time, so only
+# one chunk of a model is ever held in memory.
+EXPORT_CHUNK_SIZE = 200
+
+# The page content takes up most of an account. These fields are left out
+# when exporting without content.
+CONTENT_FIELDS = {
+    Link: [
+        'article_html', 'reader_html', 'table_of_contents', 'raw_text_content',
+        'full_page_html'
+    ],
+    LinkArchive: ['archive_content'],
+}
+# Computed by the database, so there's no point exporting them.
+GENERATED_FIELDS = {
+    Link: ['content_search'],
+    Note: ['content_search'],
+}
+
+FORMAT_NDJSON = 'ndjson'
+FORMAT_ZIP = 'zip'
+EXPORT_FORMATS = [FORMAT_NDJSON, FORMAT_ZIP]
+
+
+def _get_querysets(user) -> list[tuple[type[Model], QuerySet]]:
+  return [
+      (Tag, Tag.objects.filter(user=user)),
+      (Note, Note.objects.filter(user=user).prefetch_related('tags')),
+      (Feed, Feed.objects.filter(user=user)),
+      # Feed Items don't have user directly on the model
+      (FeedItem, FeedItem.objects.filter(feed__user=user)),
+      (Link, Link.objects_with_full_content.filter(
+          user=user).prefetch_related('tags')),
+      (LinkArchive, LinkArchive.objects.filter(user=user)),
+  ]
+
+
+def _get_exported_fields(model: type[Model],
+                         include_content: bool) -> list[str]:
+  excluded = set(GENERATED_FIELDS.get(model, []))
+  if not include_content:
+    excluded.update(CONTENT_FIELDS.get(model, []))
+  return [
+      field.name
+      for field in model._meta.concrete_model._meta.local_fields +
+      model._meta.concrete_model._meta.local_many_to_many
+      if field.serialize and field.name not in excluded
+  ]
+
+
+def iter_model_records(model: type[Model], queryset: QuerySet,
+                       include_content: bool) -> Iterator[dict]:
+  fields = _get_exported_fields(model, include_content)
+  deferred = GENERATED_FIELDS.get(model, []) + ([] if include_content else
+                                                CONTENT_FIELDS.get(model, []))
+  if deferred:
+    queryset = queryset.defer(*deferred)
+  for obj in queryset.order_by('pk').iterator(chunk_size=EXPORT_CHUNK_SIZE):
+    if isinstance(obj, LinkArchive) and include_content:
+      # Archive content lives in archive storage rather than the database
+      obj.archive_content = obj.get_content()
+    yield from serializers.serialize('python', [obj], fields=fields)
+
+
+def iter_export_lines(model: type[Model], queryset: QuerySet,
+                      include_content: bool) -> Iterator[str]:
+  for record in iter_model_records(model, queryset, include_content):
+    yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
+
+
+def _model_label(model: type[Model]) -> str:
+  return str(model._meta)
+
+
+class UserDataExporter:
+  """
+  Writes everything belonging to a user as JSON lines in the same
+  {"model", "pk", "fields"} shape as Django's serializers, one object at a
+  time so that memory use doesn't grow with the size of the account.
+
+  The ndjson format is a single stream of every object, and the zip format
+  has a separate `<app>.<model>.jsonl` file for each model.
+  """
+
+  def __init__(self,
+               user,
+               include_content: bool = True,
+               progress: Optional[Callable[[type[Model], int], None]] = None):
+    self.user = user
+    self.include_content = include_content
+    self.progress = progress
+
+  def _iter_lines(self, model: type[Model],
+                  queryset: QuerySet) -> Iterator[str]:
+    count = 0
+    for line in iter_export_lines(model, queryset, self.include_content):
+      count += 1
+      yield line
+    if self.progress:
+      self.progress(model, count)
+
+  def write_ndjson(self, f: IO[str]):
+    for model, queryset in _get_querysets(self.user):
+      for line in self._iter_lines(model, queryset):
+        f.write(line)
+
+  def write_zip(self, f: IO[bytes], compress: bool = True):
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    with zipfile.ZipFile(f, 'w', compression=compression) as archive:
+      for model, queryset in _get_querysets(self.user):
+        with archive.open(f'{_model_label(model)}.jsonl', 'w',
+                          force_zip64=True) as entry:
+          for line in self._iter_lines(model, queryset):
+            entry.write(line.encode('utf-8'))
+
+  def export(self, path: str, export_format: str, compress: bool = False):
+    if export_format == FORMAT_ZIP:
+      with open(path, 'wb') as f:
+        self.write_zip(f, compress)
+    elif compress:
+      with gzip.open(path, 'wt', encoding='utf-8') as f:
+        self.write_ndjson(f)
+    else:
+      with open(path, 'w', encoding='utf-8') as f:
+        self.write_ndjson(f)
+
+
+def get_default_export_filename(username: str, export_format: str,
+                                compress: bool) -> str:
+  if export_format == FORMAT_ZIP:
+    return f'{username}_data_export.zip'
+  return f'{username}_data_export.ndjson' + ('.gz' if compress else '')
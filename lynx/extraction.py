@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from .url_context import UrlContext
+
+# Article extraction (trafilatura, readability, BeautifulSoup, readtime) is
+# CPU-bound and holds the GIL for hundreds of milliseconds on large pages.
+# Running it in a separate process keeps the event loop responsive and lets
+# extraction use more than one core.
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+class ExtractionMetrics:
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self._lock:
+      self.submitted = 0
+      self.completed = 0
+      self.failed = 0
+      self.in_flight = 0
+      self.total_wait_seconds = 0.0
+      self.total_run_seconds = 0.0
+      self.max_latency_seconds = 0.0
+
+  def record_submitted(self):
+    with self._lock:
+      self.submitted += 1
+      self.in_flight += 1
+
+  def record_finished(self, latency: float, run_seconds: Optional[float]):
+    with self._lock:
+      self.in_flight -= 1
+      if run_seconds is None:
+        self.failed += 1
+        return
+      self.completed += 1
+      self.total_run_seconds += run_seconds
+      self.total_wait_seconds += max(0.0, latency - run_seconds)
+      self.max_latency_seconds = max(self.max_latency_seconds, latency)
+
+  def snapshot(self) -> dict:
+    workers = get_pool_size()
+    with self._lock:
+      completed = self.completed or 1
+      return {
+          'workers': workers,
+          'in_flight': self.in_flight,
+          # Anything beyond the number of workers is waiting for a process
+          'queue_depth': max(0, self.in_flight - max(workers, 1)),
+          'submitted': self.submitted,
+          'completed': self.completed,
+          'failed': self.failed,
+          'avg_wait_ms': self.total_wait_seconds / completed * 1000,
+          'avg_run_ms': self.total_run_seconds / completed * 1000,
+          'max_latency_ms': self.max_latency_seconds * 1000,
+      }
+
+
+metrics = ExtractionMetrics()
+
+
+def get_pool_size() -> int:
+  return settings.LYNX_EXTRACTION_WORKERS
+
+
+def _init_worker():
+  # Workers are spawned rather than forked (forking a process with open
+  # database connections and running threads isn't safe), so Django needs
+  # to be set up again before lynx can be imported.
+  import django
+  django.setup()
+
+
+def _parse_content_in_worker(url: str, content: str) -> tuple[dict, float]:
+  from lynx import url_parser
+  start = time.perf_counter()
+  parsed = url_parser.parse_content(UrlContext(url, None), content)
+  return parsed, time.perf_counter() - start
+
+
+def _get_pool() -> ProcessPoolExecutor:
+  global _pool
+  with _pool_lock:
+    if _pool is None:
+      _pool = ProcessPoolExecutor(
+          max_workers=get_pool_size(),
+          mp_context=multiprocessing.get_context('spawn'),
+          initializer=_init_worker)
+    return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+  global _pool
+  with _pool_lock:
+    if _pool is pool:
+      _pool = None
+  pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_pool():
+  global _pool
+  with _pool_lock:
+    pool, _pool = _pool, None
+  if pool is not None:
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+async def parse_content(url_context: UrlContext, content: str) -> dict:
+  """
+  Async equivalent of url_parser.parse_content that runs the extraction
+  in the extraction process pool. If LYNX_EXTRACTION_WORKERS is 0 the
+  extraction runs in a thread instead.
+  """
+  metrics.record_submitted()
+  start = time.perf_counter()
+  run_seconds = None
+  try:
+    if get_pool_size() > 0:
+      pool = _get_pool()
+      try:
+        parsed, run_seconds = await asyncio.get_running_loop().run_in_executor(
+            pool, _parse_content_in_worker, url_context.url, content)
+      except BrokenProcessPool:
+        # A worker died (e.g. it was OOM killed), so start over with a fresh
+        # pool next time rather than failing every extraction from now on.
+        _discard_pool(pool)
+        raise
+    else:
+      parsed, run_seconds = await sync_to_async(_parse_content_in_worker,
+                                                thread_sensitive=False)(
+                                                    url_context.url, content)
+  finally:
+    metrics.record_finished(time.perf_counter() - start, run_seconds)
+
+  # The user can't be sent to the worker, so fill it in afterwards.
+  parsed['user'] = url_context.user
+  return parsed
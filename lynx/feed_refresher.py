@@ -0,0 +1,128 @@
+import asyncio
+from typing import Iterable, Optional
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+import feedparser
+import httpx
+
+from lynx import feed_utils
+from lynx.models import Feed
+
+# Maximum number of feeds being downloaded at once
+MAX_CONCURRENT_FETCHES = 10
+# Maximum number of feeds being downloaded at once from a single host, so
+# that refreshing many feeds from one site doesn't hammer it.
+MAX_CONCURRENT_FETCHES_PER_HOST = 2
+FETCH_TIMEOUT_SECONDS = 30
+
+
+class FeedRefreshResult:
+
+  def __init__(self,
+               feed: Feed,
+               loader: Optional[feed_utils.RemoteFeedLoader] = None,
+               error: Optional[Exception] = None):
+    self.feed = feed
+    self.loader = loader
+    self.error = error
+
+  def succeeded(self) -> bool:
+    return self.error is None and self.loader is not None
+
+  def get_status(self) -> Optional[int]:
+    if self.loader is None or self.loader.remote is None:
+      return None
+    return self.loader.remote.get('status')
+
+  def get_headers(self) -> dict:
+    # Lowercased response headers
+    if self.loader is None or self.loader.remote is None:
+      return {}
+    return self.loader.remote.get('headers', {})
+
+  def not_modified(self) -> bool:
+    return self.get_status() == 304
+
+  def get_new_entries(self) -> list:
+    if self.loader is None:
+      return []
+    return self.loader.get_new_entries()
+
+
+class FeedRefresher:
+  """
+  Refreshes many feeds at once. Feeds are downloaded concurrently over a
+  single shared HTTP client (using the stored etag/modified values for
+  conditional requests), then each one is parsed and persisted through
+  RemoteFeedLoader once its bytes have arrived.
+
+  Feeds should be loaded with select_related('user').
+  """
+
+  def __init__(self,
+               request=None,
+               max_concurrency: int = MAX_CONCURRENT_FETCHES,
+               max_per_host: int = MAX_CONCURRENT_FETCHES_PER_HOST,
+               timeout: float = FETCH_TIMEOUT_SECONDS,
+               transport: Optional[httpx.AsyncBaseTransport] = None):
+    self.request = request
+    self.max_concurrency = max_concurrency
+    self.max_per_host = max_per_host
+    self.timeout = timeout
+    self.transport = transport
+
+  def _build_client(self) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        transport=self.transport,
+        timeout=httpx.Timeout(self.timeout),
+        limits=httpx.Limits(max_connections=self.max_concurrency,
+                            max_keepalive_connections=self.max_concurrency),
+        headers={
+            'User-Agent': feedparser.USER_AGENT,
+            'Accept': feedparser.http.ACCEPT_HEADER,
+        })
+
+  async def refresh_feeds(self,
+                          feeds: Iterable[Feed]) -> list[FeedRefreshResult]:
+    global_limit = asyncio.Semaphore(self.max_concurrency)
+    host_limits: dict[str, asyncio.Semaphore] = {}
+
+    def host_limit(feed: Feed) -> asyncio.Semaphore:
+      host = urlparse(feed.feed_url).netloc.lower()
+      if host not in host_limits:
+        host_limits[host] = asyncio.Semaphore(self.max_per_host)
+      return host_limits[host]
+
+    async def refresh(client: httpx.AsyncClient,
+                      feed: Feed) -> FeedRefreshResult:
+      try:
+        # Take the host slot first so that feeds waiting on a busy host
+        # don't hold up global slots that other hosts could use.
+        async with host_limit(feed), global_limit:
+          response = await self._fetch(client, feed)
+        loader = await sync_to_async(self._load_and_persist)(feed, response)
+        return FeedRefreshResult(feed, loader=loader)
+      except Exception as e:
+        return FeedRefreshResult(feed, error=e)
+
+    async with self._build_client() as client:
+      return await asyncio.gather(
+          *[refresh(client, feed) for feed in feeds])
+
+  async def _fetch(self, client: httpx.AsyncClient,
+                   feed: Feed) -> httpx.Response:
+    headers = {}
+    if feed.etag:
+      headers['If-None-Match'] = feed.etag
+    if feed.modified:
+      headers['If-Modified-Since'] = feed.modified
+    return await client.get(feed.feed_url, headers=headers)
+
+  def _load_and_persist(self, feed: Feed,
+                        response: httpx.Response) -> feed_utils.RemoteFeedLoader:
+    remote = feed_utils.parse_feed_response(response)
+    return feed_utils.RemoteFeedLoader(
+        feed.user, self.request, feed=feed).load_remote_feed(
+            remote).persist_new_feed_items().persist_feed()
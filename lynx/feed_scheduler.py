@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from email.utils import parsedate_to_datetime
+import re
+from statistics import median
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.db.models import F, Q
+from django.utils import timezone
+
+from lynx import feed_utils
+from lynx.feed_refresher import FeedRefresher, FeedRefreshResult
+from lynx.models import Feed
+
+# Bounds on how often a healthy feed is polled
+MIN_POLL_INTERVAL = timedelta(minutes=15)
+MAX_POLL_INTERVAL = timedelta(days=1)
+# Failing feeds back off exponentially up to this delay
+MAX_ERROR_BACKOFF = timedelta(days=2)
+# Servers can ask us to wait longer than MAX_POLL_INTERVAL through
+# Cache-Control or Retry-After, but not indefinitely.
+MAX_SERVER_REQUESTED_DELAY = timedelta(days=7)
+# How much to stretch the interval when a poll finds nothing new
+UNCHANGED_BACKOFF_FACTOR = 1.5
+# How many of the most recent entries to look at when estimating how often
+# a feed publishes
+PUBLISH_HISTORY_SIZE = 10
+
+_MAX_AGE_RE = re.compile(r'(?:^|,)\s*(?:s-)?max-age\s*=\s*"?(\d+)"?',
+                         re.IGNORECASE)
+
+
+def parse_cache_control_max_age(headers: dict) -> Optional[timedelta]:
+  cache_control = headers.get('cache-control', '')
+  if re.search(r'no-cache|no-store', cache_control, re.IGNORECASE):
+    return None
+  ages = [int(age) for age in _MAX_AGE_RE.findall(cache_control)]
+  if not ages:
+    return None
+  return timedelta(seconds=max(ages))
+
+
+def parse_retry_after(headers: dict, now: datetime) -> Optional[timedelta]:
+  retry_after = headers.get('retry-after', '').strip()
+  if not retry_after:
+    return None
+  if retry_after.isdigit():
+    return timedelta(seconds=int(retry_after))
+  try:
+    retry_at = parsedate_to_datetime(retry_after)
+  except (TypeError, ValueError):
+    return None
+  if retry_at.tzinfo is None:
+    retry_at = retry_at.replace(tzinfo=dt_timezone.utc)
+  return max(timedelta(0), retry_at - now)
+
+
+def estimate_publish_interval(entries) -> Optional[timedelta]:
+  """
+  The median gap between the feed's most recent entries, or None if there
+  aren't enough dated entries to tell.
+  """
+  timestamps = sorted(
+      {
+          timestamp
+          for timestamp in (
+              feed_utils.get_usable_timestamp_from_entry(entry, None)
+              for entry in entries) if timestamp is not None
+      },
+      reverse=True)[:PUBLISH_HISTORY_SIZE]
+  if len(timestamps) < 2:
+    return None
+  return median(newer - older
+                for newer, older in zip(timestamps, timestamps[1:]))
+
+
+def _clamp(interval: timedelta, lower: timedelta,
+           upper: timedelta) -> timedelta:
+  return max(lower, min(upper, interval))
+
+
+def is_failure(result: FeedRefreshResult) -> bool:
+  if not result.succeeded():
+    return True
+  status = result.get_status()
+  # 410 marks the feed deleted (see RemoteFeedLoader.persist_feed), so it
+  # won't be polled again anyway.
+  return status is not None and status >= 400 and status != 410
+
+
+class PollSchedule:
+
+  def __init__(self, next_poll_at: datetime, poll_interval: timedelta,
+               consecutive_failures: int):
+    self.next_poll_at = next_poll_at
+    self.poll_interval = poll_interval
+    self.consecutive_failures = consecutive_failures
+
+
+def compute_schedule(result: FeedRefreshResult,
+                     now: datetime) -> PollSchedule:
+  """
+  Work out when a feed should next be polled given the result of polling
+  it just now.
+
+  The feed's base interval tracks how often it publishes: it snaps to the
+  observed gap between entries when new entries show up, and stretches
+  when a poll finds nothing new (including 304s). Failures back off
+  exponentially from the base interval without changing it, so a feed
+  goes straight back to its usual schedule once it recovers. Either way
+  the next poll is never sooner than the server asked for with
+  Cache-Control or Retry-After.
+  """
+  feed = result.feed
+  interval = _clamp(timedelta(seconds=feed.poll_interval_seconds),
+                    MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+  headers = result.get_headers()
+
+  if is_failure(result):
+    failures = feed.consecutive_failures + 1
+    # Doubled one step at a time, so a long run of failures can't overflow
+    delay = interval
+    for _ in range(failures):
+      if delay >= MAX_ERROR_BACKOFF:
+        break
+      delay *= 2
+    delay = min(MAX_ERROR_BACKOFF, delay)
+  else:
+    failures = 0
+    if result.get_new_entries():
+      publish_interval = estimate_publish_interval(
+          result.loader.remote.entries)
+      # Without enough history to go on, just poll more often
+      interval = publish_interval or interval / 2
+    else:
+      interval = interval * UNCHANGED_BACKOFF_FACTOR
+    interval = _clamp(interval, MIN_POLL_INTERVAL, MAX_POLL_INTERVAL)
+    delay = interval
+
+  server_delays = [
+      d for d in (parse_cache_control_max_age(headers),
+                  parse_retry_after(headers, now)) if d is not None
+  ]
+  if server_delays:
+    delay = max(delay, min(MAX_SERVER_REQUESTED_DELAY, max(server_delays)))
+
+  return PollSchedule(now + delay, interval, failures)
+
+
+def save_schedule(feed: Feed, schedule: PollSchedule):
+  # Only touch the scheduling columns, persist_feed has already saved the
+  # rest of the feed.
+  feed.next_poll_at = schedule.next_poll_at
+  feed.poll_interval_seconds = int(schedule.poll_interval.total_seconds())
+  feed.consecutive_failures = schedule.consecutive_failures
+  Feed.objects.filter(pk=feed.pk).update(
+      next_poll_at=feed.next_poll_at,
+      poll_interval_seconds=feed.poll_interval_seconds,
+      consecutive_failures=feed.consecutive_failures)
+
+
+def get_due_feeds(now: datetime, limit: int):
+  return Feed.objects.filter(
+      Q(next_poll_at__isnull=True) | Q(next_poll_at__lte=now),
+      is_deleted=False).select_related('user').order_by(
+          F('next_poll_at').asc(nulls_first=True), 'id')[:limit]
+
+
+async def poll_due_feeds(
+    limit: int,
+    refresher: Optional[FeedRefresher] = None) -> list[FeedRefreshResult]:
+  """
+  Refresh up to `limit` feeds (across all users) whose next poll time has
+  passed, then schedule each one's next poll.
+  """
+  feeds = [feed async for feed in get_due_feeds(timezone.now(), limit)]
+  if not feeds:
+    return []
+  results = await (refresher or FeedRefresher()).refresh_feeds(feeds)
+  now = timezone.now()
+  for result in results:
+    await sync_to_async(save_schedule)(result.feed,
+                                       compute_schedule(result, now))
+  return results
+
+
+async def get_next_poll_at() -> Optional[datetime]:
+  feed = await Feed.objects.filter(is_deleted=False).order_by(
+      F('next_poll_at').asc(nulls_first=True)).only('next_poll_at').afirst()
+  if feed is None:
+    return None
+  # A feed that has never been polled is due now
+  return feed.next_poll_at or timezone.now()
@@ -1,9 +1,14 @@
 from datetime import datetime, timedelta
+import io
 from typing import List, Optional
 from django.contrib.auth.models import User
 import feedparser
+import httpx
+from .jobs import JobBatch
 from .models import FeedItem, Feed
-from django.db import IntegrityError
+from django.db import router
+from django.db.models.constants import OnConflict
+from django.db.models.signals import post_save
 from django.contrib import messages
 from django.utils import timezone
 from bs4 import BeautifulSoup
@@ -17,6 +22,88 @@ def get_usable_timestamp_from_entry(entry, default: datetime) -> datetime:
   return default
 
 
+def parse_feed_response(response: httpx.Response) -> feedparser.FeedParserDict:
+  """
+  Parse an already-downloaded feed, filling in the same HTTP details
+  (status, href, etag, modified) that feedparser sets when it does the
+  fetching itself.
+  """
+  headers = {k.lower(): v for k, v in response.headers.items()}
+  headers['content-location'] = str(response.url)
+  if response.status_code == 304:
+    remote = feedparser.FeedParserDict(bozo=False,
+                                       entries=[],
+                                       feed=feedparser.FeedParserDict(),
+                                       headers=headers,
+                                       version='')
+  else:
+    # Wrapped in BytesIO so feedparser never treats the content as a URL
+    remote = feedparser.parse(io.BytesIO(response.content),
+                              response_headers=headers)
+
+  status = response.status_code
+  if response.history:
+    # Match feedparser, which reports the status of the redirect
+    status = response.history[-1].status_code
+    if status == 308:
+      status = 301
+  remote['status'] = status
+  remote['href'] = str(response.url)
+  if headers.get('etag'):
+    remote['etag'] = headers['etag']
+  if headers.get('last-modified'):
+    remote['modified'] = headers['last-modified']
+  return remote
+
+
+def insert_new_feed_items(feed_items: List[FeedItem]) -> List[FeedItem]:
+  """
+  Insert all of the feed items in a single statement, skipping any that
+  already exist for the (feed, guid) pair. Returns just the items that were
+  actually inserted.
+
+  This doesn't go through save(), so post_save is sent manually for each
+  new item to keep the auto-add-to-library signal working.
+  """
+  if not feed_items:
+    return []
+
+  opts = FeedItem._meta
+  using = router.db_for_write(FeedItem)
+  fields = [f for f in opts.concrete_fields if not f.primary_key]
+  # ON CONFLICT DO NOTHING only returns the rows it inserted. Return the
+  # guid along with the pk so they can be matched back up.
+  rows = FeedItem.objects._insert(
+      feed_items,
+      fields=fields,
+      returning_fields=[opts.pk, opts.get_field('guid')],
+      using=using,
+      on_conflict=OnConflict.IGNORE)
+  inserted_pks = {guid: pk for pk, guid in (row for row in rows if row)}
+
+  created = []
+  for feed_item in feed_items:
+    # A guid repeated within the feed is only inserted once
+    pk = inserted_pks.pop(feed_item.guid, None)
+    if pk is None:
+      continue
+    feed_item.pk = pk
+    feed_item._state.adding = False
+    feed_item._state.db = using
+    created.append(feed_item)
+
+  # Any jobs the signal handlers queue are inserted together
+  with JobBatch():
+    for feed_item in created:
+      post_save.send(sender=FeedItem,
+                     instance=feed_item,
+                     created=True,
+                     update_fields=None,
+                     raw=False,
+                     using=using)
+  return created
+
+
 class RemoteFeedLoader:
 
   def __init__(self,
@@ -39,14 +126,21 @@ class RemoteFeedLoader:
     self.request = request
     self.auto_add = auto_add
 
-  def load_remote_feed(self):
+  def load_remote_feed(self,
+                       remote: Optional[feedparser.FeedParserDict] = None):
+    # If the feed has already been fetched and parsed elsewhere (see
+    # feed_refresher) it can be passed in directly.
     if self.feed:
-      self.remote = feedparser.parse(self.feed.feed_url,
-                                     etag=self.feed.etag,
-                                     modified=self.feed.modified)
+      if remote is None:
+        remote = feedparser.parse(self.feed.feed_url,
+                                  etag=self.feed.etag,
+                                  modified=self.feed.modified)
+      self.remote = remote
 
     if self.feed_url:
-      self.remote = feedparser.parse(self.feed_url)
+      if remote is None:
+        remote = feedparser.parse(self.feed_url)
+      self.remote = remote
       feed_details = self.remote.get('feed', {})
       feed_title = feed_details.get('title', 'Unknown Feed')
       feed_description = BeautifulSoup(feed_details.get('description',
@@ -82,18 +176,18 @@ class RemoteFeedLoader:
               entry, datetime.min))
       latest_entries = sorted_entries[-3:]
 
-    for entry in latest_entries:
-      try:
-        feed_item = FeedItem.objects.create(
-            feed=self.feed,
-            title=entry.title,
-            url=entry.link,
-            description=BeautifulSoup(entry.summary).get_text(),
-            pub_date=get_usable_timestamp_from_entry(entry, datetime.now()),
-            guid=entry.id)
-        self.created_feed_items.append(feed_item)
-      except IntegrityError:
-        self.skipped_count += 1
+    feed_items = [
+        FeedItem(feed=self.feed,
+                 title=entry.title,
+                 url=entry.link,
+                 description=BeautifulSoup(entry.summary).get_text(),
+                 pub_date=get_usable_timestamp_from_entry(
+                     entry, datetime.now()),
+                 guid=entry.id) for entry in latest_entries
+    ]
+    created = insert_new_feed_items(feed_items)
+    self.created_feed_items.extend(created)
+    self.skipped_count += len(feed_items) - len(created)
 
     return self
 
@@ -47,4 +47,10 @@ class HTMLCleaner:
         return self
 
     def prettify(self) -> str:
-        return self.soup.prettify(formatter='html')
\ No newline at end of file
+        return self.soup.prettify(formatter='html')
+
+def render_reader_view(article_html: str) -> tuple[str, list[dict]]:
+    # The article as shown in the reader, and its table of contents
+    cleaner = HTMLCleaner(article_html)
+    cleaner.generate_headings().replace_image_links_with_images()
+    return cleaner.prettify(), [h.to_dict() for h in cleaner.get_headings()]
@@ -0,0 +1,29 @@
+from lxml.html import HtmlElement, HTMLParser, document_fromstring
+from readability.htmls import get_title
+
+# Same options trafilatura uses internally so that handing it a pre-parsed
+# tree gives the same results as handing it the raw string.
+HTML_PARSER = HTMLParser(collect_ids=False,
+                         default_doctype=False,
+                         encoding='utf-8',
+                         remove_comments=True,
+                         remove_pis=True)
+
+# BeautifulSoup's get_text() skips the contents of these tags, so we do too.
+_TEXT_XPATH = ('//text()[not(ancestor::script) and not(ancestor::style) '
+               'and not(ancestor::template)]')
+
+
+def parse_html(content: str) -> HtmlElement:
+  # Encode first since lxml refuses str input that has an
+  # encoding declaration in it.
+  return document_fromstring(content.encode('utf-8', 'replace'),
+                             parser=HTML_PARSER)
+
+
+def get_title_from_tree(tree: HtmlElement) -> str:
+  return get_title(tree)
+
+
+def get_text_from_tree(tree: HtmlElement) -> str:
+  return ''.join(tree.xpath(_TEXT_XPATH))
@@ -0,0 +1,360 @@
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import socket
+import time
+from datetime import timedelta
+from typing import Iterable, Optional
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, router, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from lynx.models import Job
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = 'default'
+# How long a job may run before it's cancelled and its claim expires
+DEFAULT_TIMEOUT = timedelta(minutes=10)
+DEFAULT_MAX_ATTEMPTS = 5
+# Failed jobs are retried after 30s, 1m, 2m... up to an hour
+RETRY_BASE_DELAY = timedelta(seconds=30)
+RETRY_MAX_DELAY = timedelta(hours=1)
+# Extra time given to a worker to record the result of a job that ran
+# until its timeout, before another worker can claim it.
+CLAIM_GRACE_PERIOD = timedelta(seconds=30)
+# Finished jobs are kept around for this long
+FINISHED_JOB_RETENTION = timedelta(days=7)
+# How often an idle worker deletes the finished jobs past their retention
+PRUNE_INTERVAL_SECONDS = 3600
+
+
+def get_dedupe_key(args: list, kwargs: dict) -> str:
+  payload = json.dumps([args, kwargs], sort_keys=True, cls=DjangoJSONEncoder)
+  return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def insert_jobs(jobs: Iterable[Job]) -> list[Job]:
+  """
+  Inserts the jobs in a single statement, skipping any that are already
+  waiting to run with the same arguments. Returns the jobs that were
+  actually inserted.
+  """
+  jobs_by_key = {}
+  for job in jobs:
+    job.dedupe_key = get_dedupe_key(job.args, job.kwargs)
+    jobs_by_key.setdefault((job.name, job.dedupe_key), job)
+  if not jobs_by_key:
+    return []
+
+  opts = Job._meta
+  using = router.db_for_write(Job)
+  fields = [f for f in opts.concrete_fields if not f.primary_key]
+  # Same as feed_utils.insert_new_feed_items, ON CONFLICT DO NOTHING only
+  # returns the rows it inserted.
+  rows = Job.objects._insert(list(jobs_by_key.values()),
+                             fields=fields,
+                             returning_fields=[
+                                 opts.pk,
+                                 opts.get_field('name'),
+                                 opts.get_field('dedupe_key')
+                             ],
+                             using=using,
+                             on_conflict=OnConflict.IGNORE)
+  inserted = []
+  for pk, name, dedupe_key in (row for row in rows if row):
+    job = jobs_by_key[(name, dedupe_key)]
+    job.pk = pk
+    job._state.adding = False
+    job._state.db = using
+    inserted.append(job)
+  return inserted
+
+
+_batch: contextvars.ContextVar[Optional[list[Job]]] = contextvars.ContextVar(
+    'lynx_job_batch', default=None)
+
+
+class JobBatch:
+  """
+  Holds on to the jobs queued inside it and inserts them all at once when
+  it exits, e.g. for the jobs that signals queue while many objects are
+  saved. If the block raises, the jobs are dropped, since whatever they
+  were queued for may have been rolled back. Works as a regular or async
+  context manager.
+  """
+
+  def __enter__(self):
+    self._token = _batch.set([])
+
+  def __exit__(self, exc_type, exc_value, traceback):
+    queued = _batch.get()
+    _batch.reset(self._token)
+    if exc_type is None:
+      insert_jobs(queued)
+
+  async def __aenter__(self):
+    self.__enter__()
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    queued = _batch.get()
+    _batch.reset(self._token)
+    if exc_type is None:
+      await sync_to_async(insert_jobs)(queued)
+
+
+class JobFunction:
+  """
+  An async function that can be queued to run on a worker. Calling it
+  queues a job with the given arguments, which have to be JSON
+  serializable, and `now` runs it right away instead. Whatever the
+  function returns is saved as the job's result, so it has to be JSON
+  serializable too.
+
+  A job is only queued once while it's waiting to run, queueing it again
+  with the same arguments returns the job that's already waiting.
+  """
+
+  def __init__(self, func, queue: str, timeout: timedelta, max_attempts: int):
+    self.func = func
+    self.name = f'{func.__module__}.{func.__qualname__}'
+    self.queue = queue
+    self.timeout = timeout
+    self.max_attempts = max_attempts
+
+  def _build(self, args: list, kwargs: dict) -> Job:
+    return Job(name=self.name,
+               queue=self.queue,
+               args=args,
+               kwargs=kwargs,
+               max_attempts=self.max_attempts)
+
+  def __call__(self, *args, **kwargs) -> Optional[Job]:
+    job = self._build(list(args), kwargs)
+    queued = _batch.get()
+    if queued is not None:
+      # Not saved until the batch exits
+      queued.append(job)
+      return job
+    if insert_jobs([job]):
+      return job
+    # The job that was waiting may have been claimed since the insert, in
+    # which case it's still the latest one.
+    return Job.objects.filter(
+        name=job.name, dedupe_key=job.dedupe_key).order_by('-pk').first()
+
+  def enqueue_many(self, arguments: Iterable[Iterable]) -> list[Job]:
+    # Queues a job for each set of positional arguments in one insert, and
+    # returns the ones that weren't already waiting.
+    return insert_jobs([self._build(list(args), {}) for args in arguments])
+
+  def now(self, *args, **kwargs):
+    return async_to_sync(self.func)(*args, **kwargs)
+
+
+def job(queue: str = DEFAULT_QUEUE,
+        timeout: timedelta = DEFAULT_TIMEOUT,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+
+  def decorator(func) -> JobFunction:
+    if not asyncio.iscoroutinefunction(func):
+      raise TypeError(f'{func.__qualname__} must be an async function')
+    return JobFunction(func, queue, timeout, max_attempts)
+
+  return decorator
+
+
+def get_job_function(name: str) -> Optional[JobFunction]:
+  try:
+    job_function = import_string(name)
+  except ImportError:
+    return None
+  if not isinstance(job_function, JobFunction):
+    return None
+  return job_function
+
+
+def get_retry_delay(attempts: int) -> timedelta:
+  delay = RETRY_BASE_DELAY
+  for _ in range(attempts - 1):
+    if delay >= RETRY_MAX_DELAY:
+      break
+    delay *= 2
+  return min(RETRY_MAX_DELAY, delay)
+
+
+def claim_jobs(queue: str, limit: int, worker_id: str) -> list[Job]:
+  """
+  Claims up to `limit` due jobs from the queue for this worker. Rows that
+  another worker is claiming at the same moment are skipped rather than
+  waited on, so any number of workers can share a queue without running
+  a job twice.
+  """
+  now = timezone.now()
+  with transaction.atomic():
+    jobs = list(
+        Job.objects.select_for_update(skip_locked=True).filter(
+            queue=queue,
+            status__in=[Job.Status.PENDING, Job.Status.RUNNING],
+            run_at__lte=now).order_by('run_at')[:limit])
+    claimed = []
+    for job in jobs:
+      job_function = get_job_function(job.name)
+      if job_function is None:
+        job.status = Job.Status.FAILED
+        job.last_error = f'Unknown job {job.name}'
+        job.finished_at = now
+      elif job.attempts >= job.max_attempts:
+        # Its last attempt was claimed by a worker that never finished it
+        job.status = Job.Status.FAILED
+        job.last_error = job.last_error or 'Timed out'
+        job.finished_at = now
+      else:
+        job.status = Job.Status.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.run_at = now + job_function.timeout + CLAIM_GRACE_PERIOD
+        claimed.append(job)
+    Job.objects.bulk_update(jobs, [
+        'status', 'attempts', 'locked_by', 'run_at', 'last_error',
+        'finished_at'
+    ])
+  return claimed
+
+
+def finish_job(job: Job,
+               error: Optional[BaseException] = None,
+               result=None):
+  now = timezone.now()
+  if error is None:
+    job.status = Job.Status.COMPLETE
+    job.last_error = ''
+    job.result = result
+    job.finished_at = now
+  else:
+    job.last_error = str(error) or error.__class__.__name__
+    if job.attempts < job.max_attempts:
+      job.status = Job.Status.PENDING
+      job.run_at = now + get_retry_delay(job.attempts)
+    else:
+      job.status = Job.Status.FAILED
+      job.finished_at = now
+  # If the claim expired and another worker has picked the job up since,
+  # the result belongs to that worker.
+  Job.objects.filter(pk=job.pk,
+                     status=Job.Status.RUNNING,
+                     locked_by=job.locked_by,
+                     attempts=job.attempts).update(
+                         status=job.status,
+                         run_at=job.run_at,
+                         last_error=job.last_error,
+                         result=job.result,
+                         finished_at=job.finished_at)
+
+
+def delete_finished_jobs(
+    older_than: timedelta = FINISHED_JOB_RETENTION) -> int:
+  deleted, _ = Job.objects.filter(
+      status__in=[Job.Status.COMPLETE, Job.Status.FAILED],
+      finished_at__lt=timezone.now() - older_than).delete()
+  return deleted
+
+
+def get_worker_id() -> str:
+  return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class JobWorker:
+  """
+  Runs jobs from one or more queues on a single event loop, with at most
+  the given number of jobs from each queue running at once. Jobs are
+  claimed as slots free up, and any number of workers can run side by
+  side.
+  """
+
+  def __init__(self,
+               queues: Optional[dict[str, int]] = None,
+               poll_interval: Optional[float] = None,
+               worker_id: Optional[str] = None):
+    self.queues = queues if queues is not None else settings.LYNX_JOB_QUEUES
+    self.poll_interval = (poll_interval if poll_interval is not None else
+                          settings.LYNX_JOB_POLL_INTERVAL_SECONDS)
+    self.worker_id = worker_id or get_worker_id()
+    self._running: dict[str, set[asyncio.Task]] = {
+        queue: set()
+        for queue in self.queues
+    }
+    self._stopping = False
+    self._last_pruned_at = None
+
+  def stop(self):
+    # Running jobs are finished, but no new ones are started
+    self._stopping = True
+
+  async def run(self, burst: bool = False):
+    """
+    Runs jobs until stopped. In burst mode, returns once no jobs are due
+    and all the claimed ones have finished instead.
+    """
+    while not self._stopping:
+      claimed = 0
+      for queue, concurrency in self.queues.items():
+        free = concurrency - len(self._running[queue])
+        if free <= 0:
+          continue
+        jobs = await sync_to_async(claim_jobs)(queue, free, self.worker_id)
+        for job in jobs:
+          task = asyncio.create_task(self.run_job(job))
+          self._running[queue].add(task)
+          task.add_done_callback(self._running[queue].discard)
+        claimed += len(jobs)
+
+      running = set().union(*self._running.values())
+      if burst and not claimed and not running:
+        break
+      if not claimed:
+        await self._wait(running)
+    await self.drain()
+
+  async def _wait(self, running: set[asyncio.Task]):
+    # Until a slot frees up or it's time to check for new jobs
+    if running:
+      await asyncio.wait(running,
+                         timeout=self.poll_interval,
+                         return_when=asyncio.FIRST_COMPLETED)
+    else:
+      await sync_to_async(close_old_connections)()
+      now = time.monotonic()
+      if (self._last_pruned_at is None
+          or now - self._last_pruned_at > PRUNE_INTERVAL_SECONDS):
+        self._last_pruned_at = now
+        await sync_to_async(delete_finished_jobs)()
+      await asyncio.sleep(self.poll_interval)
+
+  async def drain(self):
+    running = set().union(*self._running.values())
+    if running:
+      await asyncio.wait(running)
+
+  async def run_job(self, job: Job):
+    job_function = get_job_function(job.name)
+    error = None
+    result = None
+    try:
+      result = await asyncio.wait_for(
+          job_function.func(*job.args, **job.kwargs),
+          timeout=job_function.timeout.total_seconds())
+    except asyncio.TimeoutError as e:
+      logger.warning('Job %s (%s) timed out', job.pk, job.name)
+      error = e
+    except Exception as e:
+      logger.exception('Job %s (%s) failed', job.pk, job.name)
+      error = e
+    await sync_to_async(finish_job)(job, error, result)
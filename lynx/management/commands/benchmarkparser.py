@@ -0,0 +1,184 @@
+import contextlib
+import json
+import time
+from unittest.mock import patch
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+import htmldate.utils
+import lxml.html
+import readtime
+from readability import Document
+import trafilatura
+from trafilatura.settings import use_config
+from lynx import html_tree, transforms, url_parser
+from lynx.url_context import UrlContext
+
+BENCHMARK_URL = 'https://example.com/posts/benchmark'
+
+
+class ParseCounter:
+  """
+  Counts how many times an HTML string is parsed into a tree, either by
+  lxml directly (which is what trafilatura and readability use) or by
+  BeautifulSoup. Nested calls (e.g. lxml.html.fromstring delegating to
+  document_fromstring) only count once. Modules that imported a parser by
+  name keep their own reference to it, so those are patched too.
+  """
+
+  def __init__(self):
+    self.count = 0
+    self._depth = 0
+
+  def wrap(self, func):
+
+    def counted(*args, **kwargs):
+      if self._depth == 0:
+        self.count += 1
+      self._depth += 1
+      try:
+        return func(*args, **kwargs)
+      finally:
+        self._depth -= 1
+
+    return counted
+
+  @contextlib.contextmanager
+  def install(self):
+    original_feed = BeautifulSoup._feed
+    with patch('lxml.html.document_fromstring',
+               self.wrap(lxml.html.document_fromstring)), \
+        patch('lxml.html.fromstring', self.wrap(lxml.html.fromstring)), \
+        patch('lynx.html_tree.document_fromstring',
+              self.wrap(html_tree.document_fromstring)), \
+        patch('trafilatura.utils.fromstring',
+              self.wrap(trafilatura.utils.fromstring)), \
+        patch('htmldate.utils.fromstring',
+              self.wrap(htmldate.utils.fromstring)), \
+        patch.object(BeautifulSoup, '_feed', self.wrap(original_feed)):
+      yield self
+
+
+def legacy_parse_content(url_context: UrlContext, content: str) -> dict:
+  # The multi-parse pipeline that parse_content replaced, kept here
+  # only so there is something to compare against.
+  new_config = use_config()
+  new_config.set("DEFAULT", "EXTRACTION_TIMEOUT", "0")
+  extracted_json_str = trafilatura.extract(content,
+                                           include_links=True,
+                                           include_formatting=True,
+                                           include_images=True,
+                                           output_format='json',
+                                           config=new_config)
+  json_meta = json.loads(
+      str(extracted_json_str)) if extracted_json_str is not None else {}
+
+  soup = BeautifulSoup(content, features="lxml")
+  for image_container in soup.find_all(class_="captioned-image-container"):
+    image_container.unwrap()
+  for image_container in soup.find_all(class_="image-link-expand"):
+    image_container.decompose()
+  for link in soup.find_all('a', class_='image-link'):
+    link.replace_with(soup.new_tag('img', src=link['href']))
+  soup = BeautifulSoup(Document(str(soup)).summary(), features="lxml")
+  soup = transforms.remove_styling(soup, url_context)
+  soup = transforms.relative_to_absolute_links(soup, url_context)
+
+  summary_html = soup.prettify(formatter='html')
+  read_time = readtime.of_html(summary_html)
+  return {
+      'title': json_meta.get('title') or Document(content).title(),
+      'article_html': summary_html,
+      'raw_text_content': json_meta.get('raw_text')
+      or BeautifulSoup(content, features="lxml").get_text(),
+      'read_time_seconds': read_time.seconds,
+  }
+
+
+def generate_synthetic_page(paragraphs: int) -> str:
+  # Roughly shaped like a news or blog page: a modest article surrounded by
+  # a lot of navigation, inline scripts, icons and related-article cards.
+  icon = ('<svg viewBox="0 0 24 24" width="16" height="16"><path d="M12 2 '
+          'L2 7 L12 12 L22 7 Z M2 17 L12 22 L22 17 M2 12 L12 17 L22 12"/>'
+          '</svg>')
+  nav = ''.join(f'<li class="menu-item"><a href="/section/{i}">{icon}'
+                f'<span>Section {i}</span></a></li>' for i in range(150))
+  cards = ''.join(
+      f'<div class="card"><div class="card-media"><a href="/related/{i}">'
+      f'<img src="/thumbs/{i}.jpg" srcset="/thumbs/{i}.jpg 1x, '
+      f'/thumbs/{i}@2x.jpg 2x" alt="Related {i}"></a></div>'
+      f'<div class="card-body"><h3><a href="/related/{i}">Related story '
+      f'{i}</a></h3><span class="byline">By Someone Else</span>{icon}'
+      f'</div></div>' for i in range(300))
+  state = json.dumps({'items': [{'id': i, 'slug': f'story-{i}'}
+                                for i in range(2000)]})
+  body = []
+  for i in range(paragraphs):
+    body.append(
+        f'<p>Paragraph {i} of the article talks about <a href="/ref/{i}">'
+        f'something interesting</a> and keeps going for a while so that '
+        f'readability has real text to score, <em>with formatting</em> '
+        f'and <strong>emphasis</strong> sprinkled throughout.</p>')
+    if i % 25 == 0:
+      body.append(f'<h2>Heading {i}</h2>')
+    if i % 40 == 0:
+      body.append(
+          f'<div class="captioned-image-container"><a class="image-link" '
+          f'href="/img/{i}.png">image</a><div class="image-link-expand">'
+          f'expand</div></div>')
+  return (
+      '<!DOCTYPE html><html><head><title>Synthetic benchmark page</title>'
+      '<meta name="author" content="Benchmark Author">'
+      f'<script>window.__STATE__ = {state};</script>'
+      '<style>body { font-family: serif; }</style></head><body>'
+      f'<header><nav><ul>{nav}</ul></nav></header>'
+      f'<main><article><h1>Synthetic benchmark page</h1>{"".join(body)}'
+      f'</article></main><aside>{cards}</aside>'
+      f'<footer><ul>{nav}</ul>Copyright Example</footer></body></html>')
+
+
+class Command(BaseCommand):
+  help = 'Benchmark parse_content against the previous multi-parse pipeline.'
+
+  def add_arguments(self, parser):
+    parser.add_argument('paths',
+                        nargs='*',
+                        type=str,
+                        help='HTML files to benchmark. Uses a synthetic '
+                        'page if none are provided.')
+    parser.add_argument('--iterations',
+                        type=int,
+                        default=5,
+                        help='Number of times to parse each page')
+    parser.add_argument('--paragraphs',
+                        type=int,
+                        default=150,
+                        help='Number of paragraphs in the synthetic page')
+
+  def handle(self, *args, **options):
+    pages = []
+    for path in options['paths']:
+      with open(path, encoding='utf-8', errors='replace') as f:
+        pages.append((path, f.read()))
+    if not pages:
+      pages.append(('synthetic page',
+                    generate_synthetic_page(options['paragraphs'])))
+
+    url_context = UrlContext(BENCHMARK_URL, None)
+    iterations = max(1, options['iterations'])
+    pipelines = [
+        ('multi-parse (previous)', legacy_parse_content),
+        ('single-parse', url_parser.parse_content),
+    ]
+    for name, content in pages:
+      self.stdout.write(f'{name} ({len(content) / 1024:.0f} KiB)')
+      for pipeline_name, pipeline in pipelines:
+        counter = ParseCounter()
+        with counter.install():
+          pipeline(url_context, content)
+        start = time.perf_counter()
+        for _ in range(iterations):
+          pipeline(url_context, content)
+        elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+        self.stdout.write(f'  {pipeline_name:<24} {counter.count} parses, '
+                          f'{elapsed_ms:.1f} ms/page')
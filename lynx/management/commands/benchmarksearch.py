@@ -0,0 +1,132 @@
+from datetime import timedelta
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+from lynx.models import Link
+from lynx.utils import search
+
+SYLLABLES = [
+    'ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'ze', 'pa', 'qui', 'dor',
+    'len', 'mar', 'tis', 'bel', 'gon', 'ash', 'ford', 'wyn'
+]
+BATCH_SIZE = 2000
+PAGE_SIZE = 15
+
+
+def legacy_search(queryset, query_string: str):
+  # The single-phase query that search_queryset replaced, kept here only so
+  # there is something to compare against.
+  search_query = SearchQuery(query_string,
+                             search_type="websearch",
+                             config='english')
+  return queryset.annotate(
+      rank=SearchRank(F('content_search'), search_query)).filter(
+          content_search=search_query, rank__gte=0.3).order_by('-rank')
+
+
+def generate_vocabulary(rng: random.Random, size: int) -> list[str]:
+  words = set()
+  while len(words) < size:
+    words.add(''.join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+  return sorted(words)
+
+
+class Command(BaseCommand):
+  help = ('Benchmark full text search over a synthetic library, comparing '
+          'the two-phase search against ranking every match.')
+
+  def add_arguments(self, parser):
+    parser.add_argument('--links',
+                        type=int,
+                        default=100000,
+                        help='Number of links in the synthetic library')
+    parser.add_argument('--words',
+                        type=int,
+                        default=300,
+                        help='Number of words of text per link')
+    parser.add_argument('--iterations',
+                        type=int,
+                        default=5,
+                        help='Number of times to run each query')
+    parser.add_argument('--keep',
+                        action='store_true',
+                        help="Don't delete the synthetic library afterwards")
+
+  def handle(self, *args, **options):
+    rng = random.Random(42)
+    vocabulary = generate_vocabulary(rng, 5000)
+    # Zipf-ish word frequencies, so some terms match most of the library
+    # and others almost nothing.
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+
+    User = get_user_model()
+    user = User.objects.create(
+        username=f'search-benchmark-{int(time.time())}')
+    try:
+      self.populate(user, rng, vocabulary, weights, options['links'],
+                    options['words'])
+      self.stdout.write('Analyzing...')
+      with connection.cursor() as cursor:
+        cursor.execute('ANALYZE lynx_link')
+
+      iterations = max(1, options['iterations'])
+      queries = [
+          ('common term', vocabulary[0]),
+          ('medium term', vocabulary[100]),
+          ('rare term', vocabulary[3000]),
+          ('two terms', f'{vocabulary[1]} {vocabulary[50]}'),
+      ]
+      pipelines = [
+          ('rank all (previous)', legacy_search),
+          ('two-phase', search.search_queryset),
+      ]
+      base = Link.objects.filter(user=user)
+      for name, query_string in queries:
+        matches = base.filter(content_search=SearchQuery(
+            query_string, search_type="websearch", config='english')).count()
+        self.stdout.write(f'{name} "{query_string}" ({matches} matches)')
+        for pipeline_name, pipeline in pipelines:
+          start = time.perf_counter()
+          for _ in range(iterations):
+            queryset = pipeline(base, query_string)
+            # What the first page of results in link_feed_view costs
+            queryset.count()
+            list(queryset[:PAGE_SIZE])
+          elapsed_ms = (time.perf_counter() - start) * 1000 / iterations
+          self.stdout.write(f'  {pipeline_name:<24} {elapsed_ms:.1f} ms/page')
+    finally:
+      if options['keep']:
+        self.stdout.write(f'Kept synthetic library for user "{user}"')
+      else:
+        self.stdout.write('Cleaning up...')
+        Link.objects.filter(user=user).delete()
+        user.delete()
+
+  def populate(self, user, rng: random.Random, vocabulary: list[str],
+               weights: list[float], count: int, words: int):
+    self.stdout.write(f'Creating {count} links...')
+    now = timezone.now()
+    created = 0
+    while created < count:
+      batch = []
+      for i in range(created, min(count, created + BATCH_SIZE)):
+        text = ' '.join(rng.choices(vocabulary, weights=weights, k=words))
+        batch.append(
+            Link(user=user,
+                 added_at=now - timedelta(minutes=i),
+                 original_url=f'https://example.com/posts/{i}',
+                 cleaned_url=f'https://example.com/posts/{i}',
+                 hostname='example.com',
+                 article_date=now.date(),
+                 title=' '.join(rng.choices(vocabulary, k=6)),
+                 excerpt=text[:200],
+                 raw_text_content=text,
+                 read_time_seconds=60))
+      Link.objects.bulk_create(batch)
+      created += len(batch)
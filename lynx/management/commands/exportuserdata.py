@@ -1,16 +1,26 @@
-import json
 from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
-from django.core import serializers
-from lynx.models import Link, Tag, Note, Feed, FeedItem, LinkArchive
+from lynx.data_export import (EXPORT_FORMATS, FORMAT_NDJSON, UserDataExporter,
+                              get_default_export_filename)
 
 User = get_user_model()
 
 class Command(BaseCommand):
-    help = 'Exports all data for a given user in JSON format, excluding UserSettings'
+    help = ('Exports all data for a given user as JSON lines, excluding '
+            'UserSettings. Objects are written as they are read, so large '
+            'accounts can be exported without loading them into memory.')
 
     def add_arguments(self, parser):
         parser.add_argument('username', type=str, help='Username of the user to export data for')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default=FORMAT_NDJSON,
+                            help='ndjson writes a single file with one object per line, '
+                                 'zip writes a JSON lines file per model')
+        parser.add_argument('--compress', action='store_true',
+                            help='Gzip the ndjson output or deflate the zip entries')
+        parser.add_argument('--exclude-content', action='store_true',
+                            help='Leave out page content and archives, which make up '
+                                 'most of an export')
+        parser.add_argument('--output', type=str, help='File to write the export to')
 
     def handle(self, *args, **options):
         username = options['username']
@@ -19,28 +29,17 @@ class Command(BaseCommand):
         except User.DoesNotExist:
             raise CommandError(f'User "{username}" does not exist')
 
-        data = {}
+        export_format = options['format']
+        compress = options['compress']
+        filename = options['output'] or get_default_export_filename(
+            username, export_format, compress)
 
-        models_to_export = [
-            Tag, Note, Feed, LinkArchive
-        ]
+        def progress(model, count):
+            self.stdout.write(f'Exported {count} {model._meta.verbose_name_plural}')
 
-        # Need to use the full content to get all the fields
-        links_with_content = Link.objects_with_full_content.filter(user=user)
-        data[Link.__name__] = json.loads(serializers.serialize('json', links_with_content))
-        
-        for model in models_to_export:
-            queryset = model.objects.filter(user=user)
-            data[model.__name__] = json.loads(serializers.serialize('json', queryset))
+        exporter = UserDataExporter(user,
+                                    include_content=not options['exclude_content'],
+                                    progress=progress)
+        exporter.export(filename, export_format, compress)
 
-        # Feed Items don't have user directly on the model
-        feed_items = FeedItem.objects.filter(feed__user=user)
-        data[FeedItem.__name__] = json.loads(serializers.serialize('json', feed_items))
-        
-        output = json.dumps(data, indent=2)
-
-        filename = f'{username}_data_export.json'
-        with open(filename, 'w') as f:
-            f.write(output)
-
-        self.stdout.write(self.style.SUCCESS(f'Successfully exported data for user "{username}" to {filename}'))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS(f'Successfully exported data for user "{username}" to {filename}'))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from lynx.archive_storage import (get_archive_storage, hash_content,
+                                  lock_archive_content)
+from lynx.models import LinkArchive
+
+
+class Command(BaseCommand):
+  help = ('Move archives saved in the database into archive storage, '
+          'compressing and deduplicating them along the way.')
+
+  def handle(self, *args, **options):
+    storage = get_archive_storage()
+    pks = list(
+        LinkArchive.objects.filter(content_hash='').values_list('pk',
+                                                                flat=True))
+    self.stdout.write(f'Moving {len(pks)} archives into storage')
+    saved_bytes = 0
+    # One archive at a time, since each can be many megabytes
+    for i, pk in enumerate(pks, start=1):
+      archive = LinkArchive.objects.get(pk=pk)
+      content = archive.archive_content.encode('utf-8')
+      content_hash = hash_content(content)
+      # See lock_archive_content, another archive with the same content
+      # could be deleted meanwhile.
+      with transaction.atomic():
+        lock_archive_content(content_hash)
+        archive.content_hash = storage.save(content)
+        archive.content_size = len(content)
+        archive.archive_content = ''
+        archive.save(
+            update_fields=['content_hash', 'content_size', 'archive_content'])
+      saved_bytes += len(content)
+      if i % 100 == 0:
+        self.stdout.write(f'Moved {i} of {len(pks)} archives')
+    self.stdout.write(
+        self.style.SUCCESS(f'Moved {len(pks)} archives '
+                           f'({saved_bytes / 1024 / 1024:.1f} MiB) out of '
+                           'the database'))
@@ -0,0 +1,72 @@
+import time
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from lynx import feed_scheduler
+
+
+class Command(BaseCommand):
+  help = ('Continuously refresh the feeds of every user, polling each feed '
+          'on its own adaptive schedule.')
+
+  def add_arguments(self, parser):
+    parser.add_argument('--once',
+                        action='store_true',
+                        help='Poll the feeds that are currently due and exit')
+    parser.add_argument('--batch-size',
+                        type=int,
+                        default=100,
+                        help='Maximum number of feeds to refresh at once')
+    parser.add_argument('--max-sleep',
+                        type=int,
+                        default=60,
+                        help='Maximum number of seconds to wait between '
+                        'checks for due feeds')
+
+  def handle(self, *args, **options):
+    batch_size = max(1, options['batch_size'])
+    max_sleep = max(1, options['max_sleep'])
+    while True:
+      # This process lives forever, so don't hang on to connections the
+      # database may have dropped in the meantime.
+      close_old_connections()
+      results = async_to_sync(feed_scheduler.poll_due_feeds)(batch_size)
+      for result in results:
+        self.report(result)
+
+      if options['once'] and len(results) < batch_size:
+        return
+      if len(results) == batch_size:
+        # There may be more feeds already due
+        continue
+
+      next_poll_at = async_to_sync(feed_scheduler.get_next_poll_at)()
+      sleep_seconds = max_sleep
+      if next_poll_at is not None:
+        sleep_seconds = min(
+            max_sleep,
+            max(1, (next_poll_at - timezone.now()).total_seconds()))
+      time.sleep(sleep_seconds)
+
+  def report(self, result):
+    feed = result.feed
+    next_poll = f'next poll at {feed.next_poll_at:%Y-%m-%d %H:%M}'
+    if result.error is not None:
+      self.stderr.write(
+          self.style.ERROR(f'Failed to refresh feed: {feed.feed_name} - '
+                           f'{str(result.error)} ({next_poll})'))
+    elif feed_scheduler.is_failure(result):
+      self.stderr.write(
+          self.style.ERROR(f'Failed to refresh feed: {feed.feed_name} - '
+                           f'HTTP {result.get_status()} ({next_poll})'))
+    elif len(result.get_new_entries()) > 0:
+      self.stdout.write(
+          self.style.SUCCESS(
+              f'Found {len(result.get_new_entries())} new entries for feed: '
+              f'{feed.feed_name} ({next_poll})'))
+    else:
+      self.stdout.write(
+          f'No new entries found for feed: {feed.feed_name} ({next_poll})')
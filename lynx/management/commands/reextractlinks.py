@@ -0,0 +1,83 @@
+from datetime import date
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from lynx import reextraction
+from lynx.models import Reextraction
+from lynx.tasks import reextract_links_in_background
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+  help = ('Parse the saved pages of links again, e.g. after changing the '
+          'transforms, and save the links that come out differently.')
+
+  def add_arguments(self, parser):
+    parser.add_argument('--user', help='Only links saved by this username')
+    parser.add_argument('--hostname', help='Only links from this hostname')
+    parser.add_argument('--added-after',
+                        type=date.fromisoformat,
+                        help='Only links added on or after this date '
+                        '(YYYY-MM-DD)')
+    parser.add_argument('--added-before',
+                        type=date.fromisoformat,
+                        help='Only links added before this date (YYYY-MM-DD)')
+    parser.add_argument('--resume',
+                        type=int,
+                        metavar='ID',
+                        help='Continue an earlier run that was interrupted')
+    parser.add_argument('--batch-size',
+                        type=int,
+                        default=reextraction.REEXTRACT_BATCH_SIZE,
+                        help='Number of links parsed and saved at once')
+    parser.add_argument('--background',
+                        action='store_true',
+                        help='Queue the run as a background job instead')
+
+  def handle(self, *args, **options):
+    if options['resume']:
+      try:
+        run = Reextraction.objects.get(pk=options['resume'])
+      except Reextraction.DoesNotExist:
+        raise CommandError(f'Re-extraction {options["resume"]} does not exist')
+      if run.status == Reextraction.Status.COMPLETE:
+        raise CommandError(f'Re-extraction {run.pk} is already complete')
+    else:
+      run = Reextraction.objects.create(filters=reextraction.build_filters(
+          user_id=self.get_user_id(options['user']),
+          hostname=options['hostname'],
+          added_after=options['added_after'],
+          added_before=options['added_before']))
+
+    if options['background']:
+      reextract_links_in_background(run.pk)
+      self.stdout.write(f'Queued re-extraction {run.pk}')
+      return
+
+    self.stdout.write(f'Starting re-extraction {run.pk}, use --resume '
+                      f'{run.pk} to continue it if it is interrupted')
+    extractor = reextraction.LinkReextractor(run,
+                                             batch_size=max(
+                                                 1, options['batch_size']),
+                                             progress=self.report)
+    async_to_sync(extractor.run)()
+    self.stdout.write(
+        self.style.SUCCESS(
+            f'Re-extracted {run.processed_links} links: {run.updated_links} '
+            f'updated, {run.failed_links} failed'))
+
+  def get_user_id(self, username):
+    if not username:
+      return None
+    try:
+      return User.objects.get(username=username).pk
+    except User.DoesNotExist:
+      raise CommandError(f'User "{username}" does not exist')
+
+  def report(self, run: Reextraction):
+    self.stdout.write(f'Processed {run.processed_links} of {run.total_links} '
+                      f'links ({run.updated_links} updated, '
+                      f'{run.failed_links} failed)')
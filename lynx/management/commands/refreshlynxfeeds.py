@@ -1,7 +1,8 @@
+from asgiref.sync import async_to_sync
 from django.core.management.base import BaseCommand
 from lynx.models import Feed
 from django.contrib.auth import get_user_model
-from lynx import feed_utils
+from lynx.feed_refresher import FeedRefresher
 
 
 class Command(BaseCommand):
@@ -19,20 +20,19 @@ class Command(BaseCommand):
       self.stderr.write(self.style.ERROR(f'User "{username}" does not exist.'))
       return
 
-    feeds = Feed.objects.filter(user=user, is_deleted=False)
+    feeds = list(
+        Feed.objects.filter(user=user, is_deleted=False).select_related('user'))
     self.stdout.write(f'Refreshing {len(feeds)} feeds for user "{username}"')
-    for feed in feeds:
-      try:
-        loader = feed_utils.RemoteFeedLoader(
-            user, None, feed=feed).load_remote_feed().persist_new_feed_items(
-            ).persist_feed()
-        if len(loader.get_new_entries()) > 0:
-          self.stdout.write(
-              self.style.SUCCESS(
-                  f'Successfully refreshed feed: {feed.feed_name}'))
-        else:
-          self.stdout.write(f'No new entries found for feed: {feed.feed_name}')
-      except Exception as e:
+    results = async_to_sync(FeedRefresher().refresh_feeds)(feeds)
+    for result in results:
+      feed = result.feed
+      if result.error is not None:
         self.stderr.write(
             self.style.ERROR(
-                f'Failed to refresh feed: {feed.feed_name} - {str(e)}'))
+                f'Failed to refresh feed: {feed.feed_name} - {str(result.error)}'
+            ))
+      elif len(result.get_new_entries()) > 0:
+        self.stdout.write(
+            self.style.SUCCESS(f'Successfully refreshed feed: {feed.feed_name}'))
+      else:
+        self.stdout.write(f'No new entries found for feed: {feed.feed_name}')
@@ -0,0 +1,54 @@
+import signal
+import threading
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lynx.jobs import JobWorker
+
+
+class Command(BaseCommand):
+  help = ('Run background jobs, many at once. Any number of these can run '
+          'side by side, each job is only run by one of them.')
+
+  def add_arguments(self, parser):
+    parser.add_argument('--queue',
+                        action='append',
+                        dest='queues',
+                        help='Only run jobs from this queue. Can be given '
+                        'more than once.')
+    parser.add_argument('--burst',
+                        action='store_true',
+                        help='Exit once there are no more jobs to run')
+    parser.add_argument('--duration',
+                        type=int,
+                        default=0,
+                        help='Stop starting new jobs after this many seconds '
+                        'and exit once the running ones finish. Runs '
+                        'forever by default.')
+
+  def handle(self, *args, **options):
+    queues = settings.LYNX_JOB_QUEUES
+    if options['queues']:
+      unknown = set(options['queues']) - set(queues)
+      if unknown:
+        raise CommandError(f'Unknown queues: {", ".join(sorted(unknown))}')
+      queues = {queue: queues[queue] for queue in options['queues']}
+
+    worker = JobWorker(queues)
+
+    def stop(signum, frame):
+      self.stdout.write('Finishing running jobs...')
+      worker.stop()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    if options['duration'] > 0:
+      timer = threading.Timer(options['duration'], worker.stop)
+      timer.daemon = True
+      timer.start()
+
+    self.stdout.write(
+        f'Running jobs from {", ".join(queues)} as {worker.worker_id}')
+    async_to_sync(worker.run)(burst=options['burst'])
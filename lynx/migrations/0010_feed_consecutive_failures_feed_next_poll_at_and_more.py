@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0009_usersetting_anthropic_api_key_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feed',
+            name='consecutive_failures',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='next_poll_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='feed',
+            name='poll_interval_seconds',
+            field=models.IntegerField(default=3600),
+        ),
+    ]
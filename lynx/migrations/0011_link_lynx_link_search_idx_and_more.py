@@ -0,0 +1,32 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:18
+
+import django.contrib.postgres.indexes
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0010_feed_consecutive_failures_feed_next_poll_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='link',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['content_search'], name='lynx_link_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['user', '-added_at'], name='lynx_link_user_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['content_search'], name='lynx_note_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['user', '-saved_at'], name='lynx_note_user_saved_idx'),
+        ),
+    ]
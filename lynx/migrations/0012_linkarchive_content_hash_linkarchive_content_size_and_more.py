@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0011_link_lynx_link_search_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='linkarchive',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='linkarchive',
+            name='content_size',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='linkarchive',
+            name='archive_content',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_uploads_complete(apps, schema_editor):
+    # Uploads from before this migration were queued one task per row, so
+    # there's nothing left for the new importer to do with them.
+    BulkUpload = apps.get_model('lynx', 'BulkUpload')
+    BulkUpload.objects.update(status='complete')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0012_linkarchive_content_hash_linkarchive_content_size_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkupload',
+            name='failed_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkupload',
+            name='processed_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkupload',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('importing', 'Importing'), ('complete', 'Complete')], default='pending', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='bulkupload',
+            name='total_rows',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(
+            mark_existing_uploads_complete,
+            migrations.RunPython.noop,
+        ),
+        migrations.CreateModel(
+            name='BulkUploadRow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.URLField(max_length=2000)),
+                ('tags', models.JSONField(default=list)),
+                ('added_at', models.DateTimeField(blank=True, null=True)),
+                ('last_viewed_at', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('imported', 'Imported'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('error', models.TextField(blank=True)),
+                ('bulk_upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rows', to='lynx.bulkupload')),
+                ('link', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='lynx.link')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bulk_upload', 'status'], name='lynx_bulkuploadrow_status_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:43
+
+import lynx.models
+from django.db import migrations
+from lynx.utils.urls import get_url_key
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_url_keys(apps, schema_editor):
+    # Links are keyed by user in order, so the oldest of any existing
+    # duplicates keeps the key and the rest are left without one.
+    Link = apps.get_model('lynx', 'Link')
+    links = Link.objects.only('pk', 'user_id', 'original_url').order_by(
+        'user_id', 'pk')
+    current_user_id = None
+    seen = set()
+    batch = []
+    for link in links.exclude(original_url='').iterator(
+            chunk_size=BACKFILL_BATCH_SIZE):
+        if link.user_id != current_user_id:
+            current_user_id = link.user_id
+            seen = set()
+        key = get_url_key(link.original_url)
+        if key in seen:
+            continue
+        seen.add(key)
+        link.url_key = key
+        batch.append(link)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Link.objects.bulk_update(batch, ['url_key'])
+            batch = []
+    if batch:
+        Link.objects.bulk_update(batch, ['url_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0013_bulkupload_failed_rows_bulkupload_processed_rows_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='url_key',
+            field=lynx.models.UrlKeyField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(
+            backfill_url_keys,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0014_link_url_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='link',
+            constraint=models.UniqueConstraint(fields=('user', 'url_key'), name='lynx_link_unique_url_key'),
+        ),
+    ]
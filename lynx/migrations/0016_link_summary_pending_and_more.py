@@ -0,0 +1,24 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:47
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0015_link_lynx_link_unique_url_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='summary_pending',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(condition=models.Q(('summary_pending', True)), fields=['id'], name='lynx_link_summary_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:48
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0016_link_summary_pending_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content_hash', models.CharField(max_length=64)),
+                ('summarization_model', models.CharField(max_length=255)),
+                ('summary', models.TextField()),
+                ('tokens', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('hit_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='summarycacheentry',
+            constraint=models.UniqueConstraint(fields=('content_hash', 'summarization_model'), name='lynx_summary_cache_key'),
+        ),
+    ]
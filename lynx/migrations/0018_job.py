@@ -0,0 +1,67 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:52
+
+import django.utils.timezone
+import json
+
+from django.db import migrations, models
+
+# Jobs that run on a queue other than the default one
+JOB_QUEUES = {
+    'lynx.tasks.create_archive_for_link_in_background': 'archives',
+}
+
+
+def move_queued_background_tasks(apps, schema_editor):
+    # Tasks queued for the old background_task runner become jobs. Locked
+    # tasks are being run right now and failed ones won't be retried, so
+    # those are left where they are.
+    Task = apps.get_model('background_task', 'Task')
+    Job = apps.get_model('lynx', 'Job')
+    tasks = Task.objects.filter(locked_by__isnull=True, failed_at__isnull=True)
+    jobs = []
+    for task in tasks:
+        args, kwargs = json.loads(task.task_params)
+        jobs.append(
+            Job(name=task.task_name,
+                queue=JOB_QUEUES.get(task.task_name, 'default'),
+                args=args,
+                kwargs={str(key): value for key, value in kwargs.items()},
+                run_at=task.run_at))
+    Job.objects.bulk_create(jobs)
+    tasks.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0017_summarycacheentry_and_more'),
+        ('background_task', '0004_auto_20220202_1721'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('queue', models.CharField(default='default', max_length=64)),
+                ('args', models.JSONField(default=list)),
+                ('kwargs', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('run_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('attempts', models.IntegerField(default=0)),
+                ('max_attempts', models.IntegerField(default=5)),
+                ('locked_by', models.CharField(blank=True, max_length=255)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['pending', 'running'])), fields=['queue', 'run_at'], name='lynx_job_ready_idx')],
+            },
+        ),
+        migrations.RunPython(
+            move_queued_background_tasks,
+            migrations.RunPython.noop,
+        ),
+    ]
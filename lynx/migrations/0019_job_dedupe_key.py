@@ -0,0 +1,50 @@
+# Generated by Django 5.0.3 on 2026-10-17 19:56
+
+import hashlib
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+
+
+def set_dedupe_keys(apps, schema_editor):
+    # Same as lynx.jobs.get_dedupe_key. Of the jobs waiting to run with the
+    # same arguments, only the oldest is kept.
+    Job = apps.get_model('lynx', 'Job')
+    seen = set()
+    duplicates = []
+    for job in Job.objects.order_by('pk').iterator():
+        payload = json.dumps([job.args, job.kwargs],
+                             sort_keys=True,
+                             cls=DjangoJSONEncoder)
+        job.dedupe_key = hashlib.sha256(payload.encode('utf-8')).hexdigest()
+        if job.status == 'pending' and job.attempts == 0:
+            if (job.name, job.dedupe_key) in seen:
+                duplicates.append(job.pk)
+                continue
+            seen.add((job.name, job.dedupe_key))
+        job.save(update_fields=['dedupe_key'])
+    Job.objects.filter(pk__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0018_job'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='dedupe_key',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(
+            set_dedupe_keys,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('attempts', 0), ('status', 'pending')), fields=('name', 'dedupe_key'), name='lynx_job_unique_pending'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0019_job_dedupe_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='etag',
+            field=models.CharField(blank=True, max_length=1000),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='modified',
+            field=models.CharField(blank=True, max_length=1000),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0020_link_fetch_validators'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reextraction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('filters', models.JSONField(default=dict)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('complete', 'Complete')], default='pending', max_length=20)),
+                ('last_link_id', models.BigIntegerField(default=0)),
+                ('total_links', models.IntegerField(default=0)),
+                ('processed_links', models.IntegerField(default=0)),
+                ('updated_links', models.IntegerField(default=0)),
+                ('failed_links', models.IntegerField(default=0)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0021_reextraction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='reader_html',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='link',
+            name='table_of_contents',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
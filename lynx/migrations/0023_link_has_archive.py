@@ -0,0 +1,27 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:07
+
+from django.db import migrations, models
+
+
+def set_has_archive(apps, schema_editor):
+    Link = apps.get_model('lynx', 'Link')
+    Link.objects.filter(linkarchive__isnull=False).update(has_archive=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0022_link_reader_view'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='has_archive',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(
+            set_has_archive,
+            migrations.RunPython.noop,
+        ),
+    ]
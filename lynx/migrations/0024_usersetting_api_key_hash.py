@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:10
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def hash_api_keys(apps, schema_editor):
+    # Existing keys keep working, but can't be shown in the settings anymore
+    UserSetting = apps.get_model('lynx', 'UserSetting')
+    settings = list(UserSetting.objects.exclude(lynx_api_key=''))
+    for setting in settings:
+        key = setting.lynx_api_key
+        setting.lynx_api_key_hash = hashlib.sha256(
+            key.encode('utf-8')).hexdigest()
+        setting.lynx_api_key_prefix = key[:6]
+    UserSetting.objects.bulk_update(
+        settings, ['lynx_api_key_hash', 'lynx_api_key_prefix'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0023_link_has_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usersetting',
+            name='lynx_api_key_hash',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='usersetting',
+            name='lynx_api_key_prefix',
+            field=models.CharField(blank=True, max_length=16),
+        ),
+        migrations.RunPython(
+            hash_api_keys,
+            migrations.RunPython.noop,
+        ),
+        migrations.RemoveField(
+            model_name='usersetting',
+            name='lynx_api_key',
+        ),
+    ]
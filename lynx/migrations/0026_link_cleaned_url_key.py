@@ -0,0 +1,46 @@
+# Generated by Django 5.0.3 on 2026-10-17 20:23
+
+import lynx.models
+from django.conf import settings
+from django.db import migrations, models
+from lynx.utils.urls import get_url_key
+
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_cleaned_url_keys(apps, schema_editor):
+    Link = apps.get_model('lynx', 'Link')
+    links = Link.objects.only('pk', 'cleaned_url').exclude(cleaned_url='')
+    batch = []
+    for link in links.iterator(chunk_size=BACKFILL_BATCH_SIZE):
+        link.cleaned_url_key = get_url_key(link.cleaned_url)
+        batch.append(link)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            Link.objects.bulk_update(batch, ['cleaned_url_key'])
+            batch = []
+    if batch:
+        Link.objects.bulk_update(batch, ['cleaned_url_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lynx', '0025_job_result'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='link',
+            name='cleaned_url_key',
+            field=lynx.models.CleanedUrlKeyField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.RunPython(
+            backfill_cleaned_url_keys,
+            migrations.RunPython.noop,
+        ),
+        migrations.AddIndex(
+            model_name='link',
+            index=models.Index(fields=['user', 'cleaned_url_key'], name='lynx_link_cleaned_url_key_idx'),
+        ),
+    ]
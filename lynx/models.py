@@ -6,6 +6,9 @@ from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.urls import reverse
 from django.utils import timezone
 from autoslug import AutoSlugField
+from lynx import html_cleaner
+from lynx.archive_storage import get_archive_storage
+from lynx.utils.urls import get_url_key
 import urllib.parse
 
 
@@ -29,12 +32,86 @@ class BulkUpload(models.Model):
                               on_delete=models.CASCADE)
   tag_slug = models.CharField(max_length=50, blank=True, null=True)
 
+  class Status(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    IMPORTING = 'importing', 'Importing'
+    COMPLETE = 'complete', 'Complete'
+
+  status = models.CharField(max_length=20,
+                            choices=Status,
+                            default=Status.PENDING)
+  # Progress through the rows of the upload. Rows are only counted as
+  # processed once their links and tags are saved, so an interrupted import
+  # picks up from the first unprocessed row.
+  total_rows = models.IntegerField(default=0)
+  processed_rows = models.IntegerField(default=0)
+  failed_rows = models.IntegerField(default=0)
+
+  def __str__(self):
+    return f'BulkUpload({self.pk}, {self.processed_rows}/{self.total_rows})'
+
+
+class BulkUploadRow(models.Model):
+  # A single link from an uploaded file, waiting to be imported
+  bulk_upload = models.ForeignKey(BulkUpload,
+                                  on_delete=models.CASCADE,
+                                  related_name='rows')
+  url = models.URLField(max_length=2000)
+  tags = models.JSONField(default=list)
+  added_at = models.DateTimeField(null=True, blank=True)
+  last_viewed_at = models.DateTimeField(null=True, blank=True)
+
+  class Status(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    IMPORTED = 'imported', 'Imported'
+    FAILED = 'failed', 'Failed'
+
+  status = models.CharField(max_length=20,
+                            choices=Status,
+                            default=Status.PENDING)
+  error = models.TextField(blank=True)
+  link = models.ForeignKey('Link',
+                           on_delete=models.SET_NULL,
+                           null=True,
+                           blank=True)
+
+  class Meta:
+    indexes = [
+        models.Index(fields=['bulk_upload', 'status'],
+                     name='lynx_bulkuploadrow_status_idx'),
+    ]
+
 
 class LinkSansContentManager(models.Manager):
 
   def get_queryset(self):
     return super().get_queryset().defer('article_html', 'raw_text_content',
-                                        'full_page_html', 'content_search')
+                                        'full_page_html', 'reader_html',
+                                        'content_search')
+
+
+class UrlKeyField(models.CharField):
+  # Filled in from the link's original_url when it's first inserted,
+  # including through bulk_create.
+
+  def pre_save(self, model_instance, add):
+    value = getattr(model_instance, self.attname)
+    if add and not value and model_instance.original_url:
+      value = get_url_key(model_instance.original_url)
+      setattr(model_instance, self.attname, value)
+    return value
+
+
+class CleanedUrlKeyField(models.CharField):
+  # Follows the link's cleaned_url, which changes when the link is reloaded,
+  # so it's worked out again whenever the field is saved.
+
+  def pre_save(self, model_instance, add):
+    value = None
+    if model_instance.cleaned_url:
+      value = get_url_key(model_instance.cleaned_url)
+    setattr(model_instance, self.attname, value)
+    return value
 
 
 class Link(models.Model):
@@ -50,9 +127,20 @@ class Link(models.Model):
   last_viewed_at = models.DateTimeField(null=True, blank=True)
 
   original_url = models.URLField(max_length=2000)
+  # Identifies the page regardless of how its URL is written, see
+  # utils.urls.canonicalize_url. This is what duplicates are checked
+  # against. Null for links without a URL, and for links that were already
+  # duplicates when the key was introduced.
+  url_key = UrlKeyField(max_length=64, null=True, blank=True, editable=False)
 
   # Extracted metadata
   cleaned_url = models.URLField(max_length=2000)
+  # The same key for cleaned_url, so that adding the page a link resolved
+  # to (say, after a redirect) finds the link too.
+  cleaned_url_key = CleanedUrlKeyField(max_length=64,
+                                       null=True,
+                                       blank=True,
+                                       editable=False)
   hostname = models.CharField(max_length=500, blank=True)
   article_date = models.DateField(blank=True,
                                   null=False)  # Published date of the article
@@ -65,6 +153,16 @@ class Link(models.Model):
   article_html = models.TextField(blank=True)
   raw_text_content = models.TextField(blank=True)
   full_page_html = models.TextField(blank=True)
+  # article_html as shown in the reader, with heading anchors and images,
+  # and the headings it links to. Rendered whenever article_html is
+  # extracted, see html_cleaner.render_reader_view.
+  reader_html = models.TextField(blank=True)
+  table_of_contents = models.JSONField(default=list, blank=True)
+  # Validators of the response full_page_html was fetched from, so that
+  # reloading can skip pages that haven't changed.
+  etag = models.CharField(max_length=1000, blank=True)
+  modified = models.CharField(max_length=1000, blank=True)
+  content_hash = models.CharField(max_length=64, blank=True)
   content_search = models.GeneratedField(
       db_persist=True,
       expression=SearchVector('title', 'excerpt', weight='A', config='english')
@@ -73,6 +171,11 @@ class Link(models.Model):
 
   # Extras
   summary = models.TextField(blank=True)  # AI summary if generated
+  # Waiting to be summarized by url_summarizer.summarize_pending_links
+  summary_pending = models.BooleanField(default=False)
+  # Whether a LinkArchive exists for this link, kept up to date by the
+  # signals in signals.py so that link lists don't have to look it up.
+  has_archive = models.BooleanField(default=False, editable=False)
   read_time_seconds = models.IntegerField(blank=True)
   read_time_display = models.CharField(max_length=100, blank=True)
 
@@ -96,9 +199,140 @@ class Link(models.Model):
   def __str__(self):
     return f'Link({self.title})'
 
+  def save(self, *args, **kwargs):
+    # has_archive is only ever changed with queryset updates, so a link
+    # loaded before its archive was made or deleted holds a stale value.
+    # Updates leave it out unless it's asked for by name.
+    if not self._state.adding and kwargs.get('update_fields') is None:
+      deferred = self.get_deferred_fields()
+      kwargs['update_fields'] = [
+          field.attname for field in self._meta.concrete_fields
+          if not field.primary_key and not field.generated and
+          field.attname != 'has_archive' and field.attname not in deferred
+      ]
+    super().save(*args, **kwargs)
+
+  def render_reader_view(self):
+    # Has to be called whenever article_html changes
+    self.reader_html, self.table_of_contents = (
+        html_cleaner.render_reader_view(self.article_html))
+
   class Meta:
     ordering = ['-added_at']
     base_manager_name = 'objects'
+    indexes = [
+        GinIndex(fields=['content_search'], name='lynx_link_search_idx'),
+        # Searches and lists are always scoped to a single user. Postgres
+        # combines this with the search index when filtering by both.
+        models.Index(fields=['user', '-added_at'],
+                     name='lynx_link_user_added_idx'),
+        models.Index(fields=['id'],
+                     condition=models.Q(summary_pending=True),
+                     name='lynx_link_summary_pending_idx'),
+        models.Index(fields=['user', 'cleaned_url_key'],
+                     name='lynx_link_cleaned_url_key_idx'),
+    ]
+    constraints = [
+        models.UniqueConstraint(fields=['user', 'url_key'],
+                                name='lynx_link_unique_url_key'),
+    ]
+
+
+class Reextraction(models.Model):
+  # A run of reextraction.LinkReextractor over the links matching filters
+  created_at = models.DateTimeField(auto_now_add=True)
+  filters = models.JSONField(default=dict)
+
+  class Status(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    COMPLETE = 'complete', 'Complete'
+
+  status = models.CharField(max_length=20,
+                            choices=Status,
+                            default=Status.PENDING)
+  # Links are processed in pk order, and a run that was interrupted picks up
+  # after the last link it saved.
+  last_link_id = models.BigIntegerField(default=0)
+  total_links = models.IntegerField(default=0)
+  processed_links = models.IntegerField(default=0)
+  updated_links = models.IntegerField(default=0)
+  failed_links = models.IntegerField(default=0)
+  finished_at = models.DateTimeField(null=True, blank=True)
+
+  def __str__(self):
+    return (f'Reextraction({self.pk}, '
+            f'{self.processed_links}/{self.total_links})')
+
+
+class SummaryCacheEntry(models.Model):
+  # A generated summary, keyed by the article text it was generated from,
+  # so that any link with the same text can reuse it.
+  content_hash = models.CharField(max_length=64)
+  summarization_model = models.CharField(max_length=255)
+  summary = models.TextField()
+  # Estimated tokens it took to generate the summary, i.e. what a cache hit
+  # saves.
+  tokens = models.IntegerField(default=0)
+  created_at = models.DateTimeField(auto_now_add=True)
+  last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+  hit_count = models.IntegerField(default=0)
+
+  class Meta:
+    constraints = [
+        models.UniqueConstraint(fields=['content_hash', 'summarization_model'],
+                                name='lynx_summary_cache_key'),
+    ]
+
+
+class Job(models.Model):
+  # A unit of background work, run by the runjobs command. See lynx.jobs.
+  name = models.CharField(max_length=255)
+  queue = models.CharField(max_length=64, default='default')
+  args = models.JSONField(default=list)
+  kwargs = models.JSONField(default=dict)
+  # Hash of the arguments. Only one job with the same name and arguments
+  # can be waiting to run at a time.
+  dedupe_key = models.CharField(max_length=64, blank=True)
+
+  class Status(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    RUNNING = 'running', 'Running'
+    COMPLETE = 'complete', 'Complete'
+    FAILED = 'failed', 'Failed'
+
+  status = models.CharField(max_length=20,
+                            choices=Status,
+                            default=Status.PENDING)
+  # When a pending job is next due. While a job is running this is when its
+  # claim expires, after which another worker may pick it up again.
+  run_at = models.DateTimeField(default=timezone.now)
+  attempts = models.IntegerField(default=0)
+  max_attempts = models.IntegerField(default=5)
+  locked_by = models.CharField(max_length=255, blank=True)
+  last_error = models.TextField(blank=True)
+  # What the job's function returned, if it completed
+  result = models.JSONField(null=True, blank=True)
+  created_at = models.DateTimeField(auto_now_add=True)
+  finished_at = models.DateTimeField(null=True, blank=True)
+
+  def __str__(self):
+    return f'Job({self.pk}, {self.name}, {self.status})'
+
+  class Meta:
+    indexes = [
+        models.Index(fields=['queue', 'run_at'],
+                     name='lynx_job_ready_idx',
+                     condition=models.Q(status__in=['pending', 'running'])),
+    ]
+    constraints = [
+        # Jobs waiting for a retry don't count, since new changes may have
+        # come in after their first attempt started.
+        models.UniqueConstraint(fields=['name', 'dedupe_key'],
+                                name='lynx_job_unique_pending',
+                                condition=models.Q(status='pending',
+                                                   attempts=0)),
+    ]
 
 
 class UserSetting(models.Model):
@@ -108,7 +342,11 @@ class UserSetting(models.Model):
   anthropic_api_key = models.CharField(max_length=255, blank=True)
   automatically_summarize_new_links = models.BooleanField(default=False)
 
-  lynx_api_key = models.CharField(max_length=255, blank=True)
+  # The API key itself isn't stored, see api_keys.py
+  lynx_api_key_hash = models.CharField(max_length=64,
+                                       blank=True,
+                                       db_index=True)
+  lynx_api_key_prefix = models.CharField(max_length=16, blank=True)
 
   headers_for_scraping = models.JSONField(default=dict)
   headers_updated_at = models.DateTimeField(null=True,
@@ -160,6 +398,12 @@ class Feed(models.Model):
   is_deleted = models.BooleanField(default=False)
   auto_add_feed_items_to_library = models.BooleanField(default=False)
 
+  # Polling schedule, see feed_scheduler. A feed with no next_poll_at
+  # is due immediately.
+  next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True)
+  poll_interval_seconds = models.IntegerField(default=3600)
+  consecutive_failures = models.IntegerField(default=0)
+
   def __str__(self):
     return f"Feed({self.feed_name})"
 
@@ -243,6 +487,11 @@ class Note(models.Model):
 
   class Meta:
     ordering = ['-saved_at']
+    indexes = [
+        GinIndex(fields=['content_search'], name='lynx_note_search_idx'),
+        models.Index(fields=['user', '-saved_at'],
+                     name='lynx_note_user_saved_idx'),
+    ]
 
 
 # Lynx supports using SingleFile to export full
@@ -250,7 +499,16 @@ class Note(models.Model):
 class LinkArchive(models.Model):
   user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
   link = models.OneToOneField(Link, on_delete=models.CASCADE)
-  archive_content = models.TextField()
-  
+  # Only used by archives saved before archive_storage existed, newer
+  # ones are stored there under content_hash instead.
+  archive_content = models.TextField(blank=True)
+  content_hash = models.CharField(max_length=64, blank=True, db_index=True)
+  content_size = models.BigIntegerField(default=0)
+
+  def get_content(self) -> str:
+    if not self.content_hash:
+      return self.archive_content
+    return get_archive_storage().read(self.content_hash).decode('utf-8')
+
   def __str__(self):
     return f"Archive(Link {self.link.pk})"
\ No newline at end of file
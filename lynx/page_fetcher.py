@@ -0,0 +1,288 @@
+import asyncio
+import codecs
+import contextlib
+import logging
+import re
+import time
+import weakref
+from typing import Optional
+from urllib.parse import urlparse
+
+import httpx
+from django.conf import settings
+from lynx.errors import UrlParseError
+from lynx.models import UserCookie, UserSetting
+
+logger = logging.getLogger(__name__)
+
+# Content types that are parsed as pages. A response without one is
+# treated as HTML.
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+# How much of a page is searched for a <meta charset> when the response
+# doesn't declare one
+CHARSET_SNIFF_BYTES = 2048
+DEFAULT_CHARSET = 'utf-8'
+_META_CHARSET_RE = re.compile(
+    rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+class ScrapingProfile:
+  # The headers and cookies a user's pages are fetched with
+  def __init__(self, headers: dict, cookies_by_domain: dict[str, dict]):
+    self.headers = headers
+    self.cookies_by_domain = cookies_by_domain
+    self.loaded_at = time.monotonic()
+
+  def get_cookies(self, url: str) -> dict:
+    return self.cookies_by_domain.get(urlparse(url).netloc, {})
+
+
+# Profiles by user id. Changes made in this process clear the entry right
+# away (see signals.py), other processes pick them up once it expires.
+_profiles: dict[int, ScrapingProfile] = {}
+
+
+async def load_scraping_profile(user) -> ScrapingProfile:
+  setting = await UserSetting.objects.filter(user=user).only(
+      'headers_for_scraping').afirst()
+  cookies_by_domain: dict[str, dict] = {}
+  async for cookie in UserCookie.objects.filter(user=user).only(
+      'cookie_name', 'cookie_value', 'cookie_domain'):
+    cookies_by_domain.setdefault(cookie.cookie_domain,
+                                 {})[cookie.cookie_name] = cookie.cookie_value
+  headers = setting.headers_for_scraping if setting is not None else {}
+  return ScrapingProfile(headers or {}, cookies_by_domain)
+
+
+async def get_scraping_profile(user) -> ScrapingProfile:
+  profile = _profiles.get(user.pk)
+  if (profile is None or time.monotonic() - profile.loaded_at >
+      settings.LYNX_SCRAPING_PROFILE_CACHE_SECONDS):
+    profile = await load_scraping_profile(user)
+    _profiles[user.pk] = profile
+  return profile
+
+
+def invalidate_scraping_profile(user_id: int):
+  _profiles.pop(user_id, None)
+
+
+def get_content_type(headers: httpx.Headers) -> str:
+  return headers.get('content-type', '').split(';')[0].strip().lower()
+
+
+def get_declared_charset(headers: httpx.Headers) -> Optional[str]:
+  for param in headers.get('content-type', '').split(';')[1:]:
+    name, _, value = param.partition('=')
+    if name.strip().lower() == 'charset':
+      return value.strip().strip('"\'') or None
+  return None
+
+
+def sniff_charset(head: bytes) -> Optional[str]:
+  if head.startswith(codecs.BOM_UTF8):
+    return 'utf-8-sig'
+  match = _META_CHARSET_RE.search(head[:CHARSET_SNIFF_BYTES])
+  if match is None:
+    return None
+  return match.group(1).decode('ascii', errors='ignore')
+
+
+def get_decoder(charset: Optional[str]) -> codecs.IncrementalDecoder:
+  try:
+    return codecs.getincrementaldecoder(charset or DEFAULT_CHARSET)(
+        errors='replace')
+  except LookupError:
+    return codecs.getincrementaldecoder(DEFAULT_CHARSET)(errors='replace')
+
+
+class FetchedPage:
+
+  def __init__(self, url: str, status_code: int, headers: httpx.Headers,
+               text: str):
+    self.url = url
+    self.status_code = status_code
+    self.headers = headers
+    self.text = text
+
+
+class HostLimit:
+  # Bounds the fetches to one host, for as long as any are running or
+  # waiting
+
+  def __init__(self, max_per_host: int):
+    self.semaphore = asyncio.Semaphore(max_per_host)
+    self.users = 0
+
+
+class PageFetcher:
+  """
+  Downloads pages over a connection pool shared by every fetch, so
+  connections (and with HTTP/2, their streams) are reused between pages
+  from the same site. Each fetch still gets its own headers and cookie
+  jar.
+
+  Pages are streamed and decoded as they arrive. Anything that isn't HTML
+  is refused from its headers, and downloads are stopped once they pass
+  LYNX_FETCH_MAX_BYTES, so a fetch never holds more than that in memory.
+
+  The pool belongs to the event loop it was created on, use
+  get_page_fetcher to get the one for the current loop, which is closed
+  along with the loop.
+  """
+
+  def __init__(self,
+               max_connections: Optional[int] = None,
+               max_per_host: Optional[int] = None,
+               http2: Optional[bool] = None,
+               max_bytes: Optional[int] = None,
+               transport: Optional[httpx.AsyncBaseTransport] = None):
+    self.max_bytes = max_bytes or settings.LYNX_FETCH_MAX_BYTES
+    self.max_per_host = (max_per_host
+                         or settings.LYNX_FETCH_MAX_CONNECTIONS_PER_HOST)
+    if transport is None:
+      max_connections = (max_connections
+                         or settings.LYNX_FETCH_MAX_CONNECTIONS)
+      transport = httpx.AsyncHTTPTransport(
+          http2=self._http2_available(
+              http2 if http2 is not None else settings.LYNX_FETCH_HTTP2),
+          limits=httpx.Limits(max_connections=max_connections,
+                              max_keepalive_connections=max_connections))
+    self.transport = transport
+    # Only hosts with fetches in flight, so this doesn't grow with every
+    # site ever fetched
+    self._host_limits: dict[str, HostLimit] = {}
+
+  @staticmethod
+  def _http2_available(http2: bool) -> bool:
+    if not http2:
+      return False
+    try:
+      import h2  # noqa: F401
+    except ImportError:
+      logger.warning('HTTP/2 needs the h2 package, fetching over HTTP/1.1')
+      return False
+    return True
+
+  @contextlib.asynccontextmanager
+  async def _host_limit(self, url: str):
+    host = urlparse(url).netloc.lower()
+    limit = self._host_limits.get(host)
+    if limit is None:
+      limit = self._host_limits[host] = HostLimit(self.max_per_host)
+    limit.users += 1
+    try:
+      async with limit.semaphore:
+        yield
+    finally:
+      limit.users -= 1
+      if limit.users == 0:
+        del self._host_limits[host]
+
+  def _build_client(self, profile: ScrapingProfile,
+                    url: str) -> httpx.AsyncClient:
+    # Clients are cheap when they share a transport. They're not closed
+    # after use, since that would close the shared pool.
+    return httpx.AsyncClient(transport=self.transport,
+                             cookies=profile.get_cookies(url),
+                             headers=profile.headers,
+                             follow_redirects=True)
+
+  async def fetch(self,
+                  url: str,
+                  user,
+                  etag: str = '',
+                  modified: str = '') -> FetchedPage:
+    """
+    Downloads the page. Given the validators of an earlier response, asks
+    the server to skip sending the page again if it hasn't changed, in
+    which case the result has a 304 status and no text.
+    """
+    profile = await get_scraping_profile(user)
+    client = self._build_client(profile, url)
+    headers = {}
+    if etag:
+      headers['If-None-Match'] = etag
+    if modified:
+      headers['If-Modified-Since'] = modified
+    try:
+      async with self._host_limit(url):
+        async with client.stream('GET', url, headers=headers) as response:
+          if response.status_code == httpx.codes.NOT_MODIFIED:
+            text = ''
+          else:
+            response.raise_for_status()
+            self._check_headers(response)
+            text = await self._read_text(response)
+    except httpx.HTTPError as e:
+      raise UrlParseError(str(e))
+    return FetchedPage(str(response.url), response.status_code,
+                       response.headers, text)
+
+  def _check_headers(self, response: httpx.Response):
+    content_type = get_content_type(response.headers)
+    if content_type and content_type not in HTML_CONTENT_TYPES:
+      raise UrlParseError(f'Unsupported content type: {content_type}')
+    content_length = response.headers.get('content-length', '')
+    if content_length.isdigit() and int(content_length) > self.max_bytes:
+      raise UrlParseError(self._too_large_message())
+
+  async def _read_text(self, response: httpx.Response) -> str:
+    charset = get_declared_charset(response.headers)
+    decoder = None
+    head = b''
+    parts = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+      size += len(chunk)
+      if size > self.max_bytes:
+        raise UrlParseError(self._too_large_message())
+      if decoder is None:
+        # Hold back the start of the page until the charset is known
+        head += chunk
+        if charset is None and len(head) < CHARSET_SNIFF_BYTES:
+          continue
+        decoder = get_decoder(charset or sniff_charset(head))
+        chunk = head
+      parts.append(decoder.decode(chunk))
+    if decoder is None:
+      decoder = get_decoder(charset or sniff_charset(head))
+      parts.append(decoder.decode(head))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
+
+  def _too_large_message(self) -> str:
+    return f'Page is larger than {self.max_bytes} bytes'
+
+  async def aclose(self):
+    await self.transport.aclose()
+
+
+_fetchers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop,
+                                     PageFetcher] = weakref.WeakKeyDictionary()
+# The tasks that close each loop's fetcher, kept so they aren't collected
+_closers: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop,
+                                    asyncio.Task] = weakref.WeakKeyDictionary()
+
+
+async def _close_with_loop(fetcher: PageFetcher):
+  # Waits for the loop to shut down. asyncio.run, which async_to_sync uses
+  # for every new loop, cancels the tasks left over before it closes the
+  # loop, which gives the pool a chance to close its connections.
+  loop = asyncio.get_running_loop()
+  try:
+    await asyncio.Future()
+  finally:
+    # The task refers to the loop, so its entries have to go for the loop
+    # to be collected
+    _fetchers.pop(loop, None)
+    _closers.pop(loop, None)
+    await fetcher.aclose()
+
+
+def get_page_fetcher() -> PageFetcher:
+  loop = asyncio.get_running_loop()
+  if loop not in _fetchers:
+    fetcher = _fetchers[loop] = PageFetcher()
+    _closers[loop] = loop.create_task(_close_with_loop(fetcher))
+  return _fetchers[loop]
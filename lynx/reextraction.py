@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from datetime import date
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+from lynx import extraction
+from lynx.commands import REPARSED_FIELDS, apply_reparsed_fields
+from lynx.models import Link, Reextraction
+from lynx.url_context import UrlContext
+
+logger = logging.getLogger(__name__)
+
+# Number of links parsed and saved together. An interrupted run redoes at
+# most this many links.
+REEXTRACT_BATCH_SIZE = 50
+
+
+def build_filters(user_id: Optional[int] = None,
+                  hostname: Optional[str] = None,
+                  added_after: Optional[date] = None,
+                  added_before: Optional[date] = None) -> dict:
+  # The filters are stored on the Reextraction, so they have to be JSON
+  filters = {}
+  if user_id is not None:
+    filters['user_id'] = user_id
+  if hostname:
+    filters['hostname'] = hostname
+  if added_after is not None:
+    filters['added_after'] = added_after.isoformat()
+  if added_before is not None:
+    filters['added_before'] = added_before.isoformat()
+  return filters
+
+
+def get_links_to_reextract(filters: dict) -> QuerySet:
+  links = Link.objects_with_full_content.exclude(full_page_html='')
+  if 'user_id' in filters:
+    links = links.filter(user_id=filters['user_id'])
+  if 'hostname' in filters:
+    links = links.filter(hostname__iexact=filters['hostname'])
+  if 'added_after' in filters:
+    links = links.filter(added_at__date__gte=filters['added_after'])
+  if 'added_before' in filters:
+    links = links.filter(added_at__date__lt=filters['added_before'])
+  return links
+
+
+class LinkReextractor:
+  """
+  Parses the saved pages of every link matching a Reextraction's filters
+  again, e.g. after the transforms or the trafilatura config changed.
+
+  Links are streamed from a server-side cursor in pk order. Each batch is
+  parsed in parallel on the extraction process pool, and the links that
+  came out differently are written back with a single bulk_update, along
+  with the run's progress. Running it again after an interruption
+  continues after the last saved batch.
+  """
+
+  def __init__(self,
+               reextraction: Reextraction,
+               batch_size: int = REEXTRACT_BATCH_SIZE,
+               progress: Optional[Callable[[Reextraction], None]] = None):
+    self.reextraction = reextraction
+    self.batch_size = batch_size
+    self.progress = progress
+
+  async def run(self):
+    links = get_links_to_reextract(self.reextraction.filters)
+    if self.reextraction.status == Reextraction.Status.PENDING:
+      self.reextraction.total_links = await links.acount()
+    self.reextraction.status = Reextraction.Status.RUNNING
+    await self.reextraction.asave(update_fields=['status', 'total_links'])
+
+    remaining = links.filter(pk__gt=self.reextraction.last_link_id).only(
+        'pk', 'original_url', 'full_page_html',
+        *REPARSED_FIELDS).order_by('pk')
+    batch = []
+    async for link in remaining.aiterator(chunk_size=self.batch_size):
+      batch.append(link)
+      if len(batch) >= self.batch_size:
+        await self.reextract(batch)
+        batch = []
+    if batch:
+      await self.reextract(batch)
+
+    self.reextraction.status = Reextraction.Status.COMPLETE
+    self.reextraction.finished_at = timezone.now()
+    await self.reextraction.asave(update_fields=['status', 'finished_at'])
+
+  async def _parse(self, link: Link) -> Optional[dict]:
+    try:
+      return await extraction.parse_content(
+          UrlContext(link.original_url, None), link.full_page_html)
+    except Exception:
+      logger.exception('Failed to re-extract link %s', link.pk)
+      return None
+
+  async def reextract(self, links: list[Link]):
+    results = await asyncio.gather(*[self._parse(link) for link in links])
+    changed = []
+    failed = 0
+    now = timezone.now()
+    for link, parsed in zip(links, results):
+      if parsed is None:
+        failed += 1
+      elif apply_reparsed_fields(link, parsed):
+        link.updated_at = now
+        changed.append(link)
+    await sync_to_async(self._save)(changed, links[-1].pk, len(links), failed)
+    if self.progress is not None:
+      self.progress(self.reextraction)
+
+  def _save(self, changed: list[Link], last_link_id: int, processed: int,
+            failed: int):
+    with transaction.atomic():
+      Link.objects.bulk_update(changed, REPARSED_FIELDS + ['updated_at'])
+      Reextraction.objects.filter(pk=self.reextraction.pk).update(
+          last_link_id=last_link_id,
+          processed_links=F('processed_links') + processed,
+          updated_links=F('updated_links') + len(changed),
+          failed_links=F('failed_links') + failed)
+    self.reextraction.refresh_from_db()
@@ -1,11 +1,15 @@
 from asgiref.sync import async_to_sync
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 from httpx import ReadTimeout
 from lynx.commands import create_archive_for_link
 
-from lynx.models import FeedItem, Link, UserSetting
-from lynx.tasks import add_feed_item_to_library, create_archive_for_link_in_background, summarize_link_in_background
+from lynx.api_keys import invalidate_api_keys
+from lynx.archive_storage import get_archive_storage, lock_archive_content
+from lynx.models import FeedItem, Link, LinkArchive, UserCookie, UserSetting
+from lynx.page_fetcher import invalidate_scraping_profile
+from lynx.tasks import add_feed_item_to_library, create_archive_for_link_in_background, queue_pending_summaries
 from lynx.utils.singlefile import is_singlefile_enabled
 
 
@@ -32,7 +36,8 @@ def summarize_link(sender, instance: Link, created, **kwargs):
   setting, _ = UserSetting.objects.get_or_create(user=instance.user)
   if not setting.automatically_summarize_new_links:
     return
-  summarize_link_in_background(instance.user.pk, instance.pk)
+  Link.objects.filter(pk=instance.pk).update(summary_pending=True)
+  queue_pending_summaries()
 
 
 # When a new Link is saved, create an archive of the link content
@@ -44,3 +49,57 @@ def create_archive_for_new_links(sender, instance: Link, created, **kwargs):
   if not is_singlefile_enabled():
     return
   create_archive_for_link_in_background(instance.user.pk, instance.pk)
+
+
+@receiver(post_save,
+          sender=LinkArchive,
+          dispatch_uid='mark_link_as_archived')
+def mark_link_as_archived(sender, instance: LinkArchive, created, **kwargs):
+  if not created:
+    return
+  Link.objects.filter(pk=instance.link_id).update(has_archive=True)
+
+
+@receiver(post_delete,
+          sender=LinkArchive,
+          dispatch_uid='mark_link_as_not_archived')
+def mark_link_as_not_archived(sender, instance: LinkArchive, **kwargs):
+  Link.objects.filter(pk=instance.link_id).update(has_archive=False)
+
+
+# Archives are shared between every LinkArchive with the same content, so
+# only remove the stored copy once the last one referencing it is gone.
+@receiver(post_delete,
+          sender=LinkArchive,
+          dispatch_uid='delete_unused_archive_content')
+def delete_unused_archive_content(sender, instance: LinkArchive, **kwargs):
+  if not instance.content_hash:
+    return
+  # Archives being saved with the same content wait for this to finish
+  with transaction.atomic():
+    lock_archive_content(instance.content_hash)
+    if LinkArchive.objects.filter(
+        content_hash=instance.content_hash).exists():
+      return
+    get_archive_storage().delete(instance.content_hash)
+
+
+# Pages are fetched with each user's headers and cookies, which are cached
+# by the page fetcher.
+@receiver([post_save, post_delete],
+          sender=UserSetting,
+          dispatch_uid='invalidate_scraping_profile_settings')
+@receiver([post_save, post_delete],
+          sender=UserCookie,
+          dispatch_uid='invalidate_scraping_profile_cookies')
+def invalidate_user_scraping_profile(sender, instance, **kwargs):
+  invalidate_scraping_profile(instance.user_id)
+
+
+# Verified API keys are cached by api_keys, and a key may have been reset
+# or cleared.
+@receiver([post_save, post_delete],
+          sender=UserSetting,
+          dispatch_uid='invalidate_user_api_keys')
+def invalidate_user_api_keys(sender, instance: UserSetting, **kwargs):
+  invalidate_api_keys(instance)
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Count, F, Sum
+from django.utils import timezone
+from lynx.models import SummaryCacheEntry
+
+# Summaries are cached by the text they were generated from rather than by
+# link, so the same article saved by several users, saved again after being
+# deleted or reparsed without changes is only summarized once.
+
+
+class SummaryCacheMetrics:
+
+  def __init__(self):
+    self._lock = threading.Lock()
+    self.reset()
+
+  def reset(self):
+    with self._lock:
+      self.hits = 0
+      self.misses = 0
+      self.tokens_saved = 0
+      self.evictions = 0
+
+  def record_hit(self, tokens: int):
+    with self._lock:
+      self.hits += 1
+      self.tokens_saved += tokens
+
+  def record_miss(self):
+    with self._lock:
+      self.misses += 1
+
+  def record_evictions(self, count: int):
+    with self._lock:
+      self.evictions += count
+
+  def snapshot(self) -> dict:
+    with self._lock:
+      lookups = self.hits + self.misses
+      return {
+          'hits': self.hits,
+          'misses': self.misses,
+          'hit_rate': self.hits / lookups if lookups else 0.0,
+          'tokens_saved': self.tokens_saved,
+          'evictions': self.evictions,
+      }
+
+
+metrics = SummaryCacheMetrics()
+
+# Summaries cached by this process since the cache was last pruned
+_inserts_since_prune = 0
+_prune_lock = threading.Lock()
+
+
+def normalize_text(text: str) -> str:
+  # Reparsing a page can change the whitespace without changing the words
+  return ' '.join(text.split())
+
+
+def hash_text(text: str) -> str:
+  return hashlib.sha256(normalize_text(text).encode('utf-8')).hexdigest()
+
+
+async def get_cached_summary(text: str, model: str) -> Optional[str]:
+  content_hash = hash_text(text)
+  entry = await SummaryCacheEntry.objects.filter(
+      content_hash=content_hash, summarization_model=model).only(
+          'pk', 'summary', 'tokens').afirst()
+  if entry is None:
+    metrics.record_miss()
+    return None
+  await SummaryCacheEntry.objects.filter(pk=entry.pk).aupdate(
+      last_used_at=timezone.now(), hit_count=F('hit_count') + 1)
+  metrics.record_hit(entry.tokens)
+  return entry.summary
+
+
+def evict_summaries(max_entries: int) -> int:
+  # Drops the least recently used summaries beyond max_entries
+  stale = SummaryCacheEntry.objects.order_by('-last_used_at').values_list(
+      'pk', flat=True)[max_entries:]
+  count, _ = SummaryCacheEntry.objects.filter(pk__in=list(stale)).delete()
+  metrics.record_evictions(count)
+  return count
+
+
+def _cache_summary(text: str, model: str, summary: str, tokens: int):
+  SummaryCacheEntry.objects.bulk_create(
+      [
+          SummaryCacheEntry(content_hash=hash_text(text),
+                            summarization_model=model,
+                            summary=summary,
+                            tokens=tokens)
+      ],
+      update_conflicts=True,
+      unique_fields=['content_hash', 'summarization_model'],
+      update_fields=['summary', 'tokens', 'last_used_at'])
+  # Pruned every so many inserts rather than counting the entries on each
+  # one, so the cache can briefly hold a few more than the maximum.
+  global _inserts_since_prune
+  with _prune_lock:
+    _inserts_since_prune += 1
+    if _inserts_since_prune < settings.LYNX_SUMMARY_CACHE_PRUNE_INTERVAL:
+      return
+    _inserts_since_prune = 0
+  evict_summaries(settings.LYNX_SUMMARY_CACHE_MAX_ENTRIES)
+
+
+async def cache_summary(text: str, model: str, summary: str, tokens: int):
+  await sync_to_async(_cache_summary)(text, model, summary, tokens)
+
+
+async def get_totals() -> dict:
+  # Hits recorded by every process since the entries were created
+  totals = await SummaryCacheEntry.objects.aaggregate(
+      entries=Count('pk'),
+      total_hits=Sum('hit_count', default=0),
+      total_tokens_saved=Sum(F('hit_count') * F('tokens'), default=0))
+  return totals
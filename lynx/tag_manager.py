@@ -1,5 +1,7 @@
+from typing import Iterable
 from asgiref.sync import sync_to_async
 from .models import Link, Tag
+from django.db import transaction
 from django.shortcuts import aget_object_or_404
 from lynx.errors import TagError
 
@@ -20,32 +22,87 @@ async def create_tag_for_user(user, tag_name: str) -> Tag:
 async def load_all_user_tags(user) -> list[Tag]:
   return await (sync_to_async(list)(Tag.objects.filter(user=user)))
 
-async def add_tags_to_link(tags: list[Tag], link: Link) -> Link:
-  link_user = await (sync_to_async(lambda: link.user)())
-  for tag in tags: 
-    tag_user = await (sync_to_async(lambda: tag.user)())
-    if tag_user != link_user:
-      raise TagError()
 
-  await (sync_to_async(lambda: link.tags.add(*tags))())
+# The rows joining links to tags
+LinkTag = Link.tags.through
+
+
+def check_tags_belong_to_user(tags: Iterable[Tag], user_id: int) -> None:
+  # Tags are loaded with their user_id, so this doesn't need any queries
+  if any(tag.user_id != user_id for tag in tags):
+    raise TagError()
+
+
+async def get_user_link_pks(user, link_pks: Iterable[int]) -> list[int]:
+  # Checks that every link belongs to the user with a single query
+  link_pks = set(link_pks)
+  owned = [
+      pk async for pk in Link.objects.filter(
+          user=user, pk__in=link_pks).values_list('pk', flat=True)
+  ]
+  if len(owned) != len(link_pks):
+    raise TagError()
+  return owned
+
+
+def _add_tags(tag_pks: list[int], link_pks: list[int]) -> None:
+  rows = [
+      LinkTag(link_id=link_pk, tag_id=tag_pk) for link_pk in link_pks
+      for tag_pk in tag_pks
+  ]
+  LinkTag.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+def _remove_tags(tag_pks: list[int], link_pks: list[int]) -> None:
+  LinkTag.objects.filter(link_id__in=link_pks, tag_id__in=tag_pks).delete()
+
+
+def _set_tags(tag_pks: list[int], link_pks: list[int]) -> None:
+  with transaction.atomic():
+    LinkTag.objects.filter(link_id__in=link_pks).exclude(
+        tag_id__in=tag_pks).delete()
+    _add_tags(tag_pks, link_pks)
+
+
+async def add_tags_to_links(user, tags: list[Tag],
+                            link_pks: Iterable[int]) -> None:
+  """
+  Adds the tags to every one of the user's links in link_pks, e.g. for
+  tagging a selection of links from a list. Links that already have a tag
+  keep it.
+  """
+  check_tags_belong_to_user(tags, user.pk)
+  link_pks = await get_user_link_pks(user, link_pks)
+  await sync_to_async(_add_tags)([tag.pk for tag in tags], link_pks)
+
+
+async def remove_tags_from_links(user, tags: list[Tag],
+                                 link_pks: Iterable[int]) -> None:
+  check_tags_belong_to_user(tags, user.pk)
+  link_pks = await get_user_link_pks(user, link_pks)
+  await sync_to_async(_remove_tags)([tag.pk for tag in tags], link_pks)
+
+
+async def set_tags_on_links(user, tags: list[Tag],
+                            link_pks: Iterable[int]) -> None:
+  check_tags_belong_to_user(tags, user.pk)
+  link_pks = await get_user_link_pks(user, link_pks)
+  await sync_to_async(_set_tags)([tag.pk for tag in tags], link_pks)
+
+
+async def add_tags_to_link(tags: list[Tag], link: Link) -> Link:
+  check_tags_belong_to_user(tags, link.user_id)
+  await sync_to_async(_add_tags)([tag.pk for tag in tags], [link.pk])
   return link
-  
-async def remove_tags_from_link(tags: list[Tag], link: Link) -> Link:
-  link_user = await (sync_to_async(lambda: link.user)())
-  for tag in tags: 
-    tag_user = await (sync_to_async(lambda: tag.user)())
-    if tag_user != link_user:
-      raise TagError()
 
-  await (sync_to_async(lambda: link.tags.remove(*tags))())
+
+async def remove_tags_from_link(tags: list[Tag], link: Link) -> Link:
+  check_tags_belong_to_user(tags, link.user_id)
+  await sync_to_async(_remove_tags)([tag.pk for tag in tags], [link.pk])
   return link
-  
+
+
 async def set_tags_on_link(tags: list[Tag], link: Link) -> Link:
-  link_user = await (sync_to_async(lambda: link.user)())
-  for tag in tags: 
-    tag_user = await (sync_to_async(lambda: tag.user)())
-    if tag_user != link_user:
-      raise TagError()
-
-  await (sync_to_async(lambda: link.tags.set(tags))())
-  return link
\ No newline at end of file
+  check_tags_belong_to_user(tags, link.user_id)
+  await sync_to_async(_set_tags)([tag.pk for tag in tags], [link.pk])
+  return link
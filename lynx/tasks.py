@@ -1,49 +1,92 @@
-from asgiref.sync import async_to_sync
-from background_task import background
+from datetime import timedelta
 from django.contrib.auth import get_user_model
 from httpx import ReadTimeout
-from lynx.models import FeedItem, Link
-from lynx import commands, url_summarizer
+from lynx.jobs import job
+from lynx.models import BulkUpload, FeedItem, Link, Reextraction
+from lynx import bulk_import, commands, reextraction, url_summarizer
 from lynx.utils.singlefile import is_singlefile_enabled
 
+ARCHIVE_QUEUE = 'archives'
 
-@background
-def add_feed_item_to_library(user_pk: int, feed_item_pk: int):
+
+@job()
+async def add_feed_item_to_library(user_pk: int, feed_item_pk: int):
   User = get_user_model()
-  user = User.objects.get(pk=user_pk)
-  feed_item = FeedItem.objects.get(pk=feed_item_pk, feed__user=user)
-  url = feed_item.saved_as_link
-  if url is not None:
+  user = await User.objects.aget(pk=user_pk)
+  feed_item = await FeedItem.objects.select_related('feed').aget(
+      pk=feed_item_pk, feed__user=user)
+  if feed_item.saved_as_link_id is not None:
     return
 
-  link, is_new = async_to_sync(commands.get_or_create_link)(feed_item.url,
-                                                            user)
+  link, is_new = await commands.get_or_create_link(feed_item.url, user)
   if is_new:
     link.created_from_feed = feed_item.feed
-  link.save()
+  await link.asave()
   if is_new:
     feed_item.saved_as_link = link
-    feed_item.save()
+    await feed_item.asave()
 
 
-@background
-def summarize_link_in_background(user_pk: int, link_pk: int):
+# Queued by the API when a client doesn't want to wait for the page to be
+# loaded. The result is what the job status endpoint looks the link up by.
+@job(max_attempts=3)
+async def add_link_in_background(user_pk: int, url: str) -> dict:
   User = get_user_model()
-  user = User.objects.get(pk=user_pk)
-  link = Link.objects_with_full_content.get(pk=link_pk, user=user)
+  user = await User.objects.aget(pk=user_pk)
+  link, _ = await commands.get_or_create_link(url, user)
+  return {'link_id': link.pk}
+
+
+@job(timeout=timedelta(hours=1))
+async def summarize_pending_links_in_background():
+  await url_summarizer.summarize_pending_links()
+
+
+def queue_pending_summaries():
+  # A single run summarizes every pending link, and it's only queued once
+  # while waiting to start.
+  summarize_pending_links_in_background()
+
+
+# Links are now summarized by summarize_pending_links_in_background. This is
+# kept so that tasks queued before that change still run.
+@job()
+async def summarize_link_in_background(user_pk: int, link_pk: int):
+  link = await Link.objects_with_full_content.aget(pk=link_pk, user_id=user_pk)
   if link.summary:
     return
-  async_to_sync(url_summarizer.generate_and_persist_summary)(link)
+  await url_summarizer.generate_and_persist_summary(link)
 
 
-@background
-def create_archive_for_link_in_background(user_pk: int, link_pk: int):
+@job(queue=ARCHIVE_QUEUE)
+async def create_archive_for_link_in_background(user_pk: int, link_pk: int):
   if not is_singlefile_enabled():
     return
   User = get_user_model()
-  user = User.objects.get(pk=user_pk)
-  link = Link.objects.get(pk=link_pk, user=user)
+  user = await User.objects.aget(pk=user_pk)
+  link = await Link.objects.aget(pk=link_pk, user=user)
   try:
-    async_to_sync(commands.create_archive_for_link)(user, link)
+    await commands.create_archive_for_link(user, link)
   except ReadTimeout:
     pass
+
+
+# Imports pick up where they left off, so a timed out import just continues
+# on its next attempt.
+@job(timeout=timedelta(hours=1), max_attempts=10)
+async def import_bulk_upload_in_background(bulk_upload_pk: int):
+  bulk_upload = await BulkUpload.objects.select_related('user').aget(
+      pk=bulk_upload_pk)
+  if bulk_upload.status == BulkUpload.Status.COMPLETE:
+    return
+  await bulk_import.BulkImporter(bulk_upload).run()
+
+
+# Like imports, a re-extraction that times out continues on its next
+# attempt, and a large library can take several.
+@job(timeout=timedelta(hours=1), max_attempts=20)
+async def reextract_links_in_background(reextraction_pk: int):
+  run = await Reextraction.objects.aget(pk=reextraction_pk)
+  if run.status == Reextraction.Status.COMPLETE:
+    return
+  await reextraction.LinkReextractor(run).run()
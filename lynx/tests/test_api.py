@@ -1,7 +1,11 @@
 from django.contrib.auth.models import User
-from django.test import TestCase, AsyncClient
+from django.test import TestCase, AsyncClient, override_settings
 from unittest.mock import patch
-from lynx.models import UserSetting, Link
+from lynx import api_keys
+from lynx.api_keys import hash_api_key
+from lynx.jobs import JobWorker
+from lynx.errors import UrlParseError
+from lynx.models import Job, Note, UserSetting, Link
 import json
 from django.utils import timezone
 
@@ -20,8 +24,8 @@ class CreateLinkEndpointTest(TestCase):
   def setUp(self):
     self.client = AsyncClient()
     self.user = User.objects.create_user(username='testuser')
-    self.user_setting = UserSetting.objects.create(user_id=self.user.pk,
-                                                   lynx_api_key='test_api_key')
+    self.user_setting = UserSetting.objects.create(
+        user_id=self.user.pk, lynx_api_key_hash=hash_api_key('test_api_key'))
 
   @patch('lynx.url_parser.parse_url')
   async def test_test_endpoint_with_valid_key_header(self, mock_parse_url):
@@ -106,8 +110,8 @@ class CreateNoteEndpointTest(TestCase):
   def setUp(self):
     self.client = AsyncClient()
     self.user = User.objects.create_user(username='testuser')
-    self.user_setting = UserSetting.objects.create(user_id=self.user.pk,
-                                                   lynx_api_key='test_api_key')
+    self.user_setting = UserSetting.objects.create(
+        user_id=self.user.pk, lynx_api_key_hash=hash_api_key('test_api_key'))
 
   @patch('lynx.url_parser.parse_url')
   async def test_create_note_for_unsaved_link(self, mock_parse_url):
@@ -167,3 +171,197 @@ class CreateNoteEndpointTest(TestCase):
       response_data = json.loads(response.content.decode())
       self.assertEqual(response_data['content'], 'hello world')
       self.assertEqual(response_data['link']['id'], existing_link.pk)
+
+
+class CreateLinkInBackgroundTest(TestCase):
+
+  def setUp(self):
+    self.client = AsyncClient()
+    self.user = User.objects.create_user(username='testuser')
+    self.user_setting = UserSetting.objects.create(
+        user_id=self.user.pk, lynx_api_key_hash=hash_api_key('test_api_key'))
+
+  async def post_link(self, url: str):
+    return await self.client.generic('POST',
+                                     '/api/links/add',
+                                     json.dumps({
+                                         'url': url,
+                                         'background': True
+                                     }),
+                                     X_API_KEY='test_api_key')
+
+  async def get_status(self, job_id: int, api_key: str = 'test_api_key'):
+    return await self.client.get(f'/api/links/jobs/{job_id}',
+                                 X_API_KEY=api_key)
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_link_is_added_by_worker(self, mock_parse_url):
+    url = add_link_dict['url']
+    response = await self.post_link(url)
+    self.assertEqual(response.status_code, 202)
+    mock_parse_url.assert_not_called()
+    job_id = json.loads(response.content.decode())['job_id']
+    self.assertEqual(
+        json.loads((await self.get_status(job_id)).content.decode()), {
+            'job_id': job_id,
+            'status': 'pending',
+            'error': None,
+            'link': None
+        })
+
+    # Queueing it again before it runs gives the same job
+    response = await self.post_link(url)
+    self.assertEqual(json.loads(response.content.decode())['job_id'], job_id)
+
+    mock_parse_url.return_value = Link(user=self.user,
+                                       original_url=url,
+                                       cleaned_url=add_link_dict['cleaned_url'],
+                                       title=add_link_dict['title'],
+                                       article_date=timezone.now(),
+                                       read_time_seconds=12)
+    await JobWorker({'default': 1}, poll_interval=0.01).run(burst=True)
+
+    response_data = json.loads((await self.get_status(job_id)).content.decode())
+    self.assertEqual(response_data['status'], 'complete')
+    self.assertEqual(response_data['link']['original_url'], url)
+    self.assertEqual(response_data['link']['title'], add_link_dict['title'])
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_existing_link_is_returned_right_away(self, mock_parse_url):
+    link = await Link.objects.acreate(user=self.user,
+                                      original_url=add_link_dict['url'],
+                                      cleaned_url=add_link_dict['cleaned_url'],
+                                      article_date=timezone.now(),
+                                      read_time_seconds=12)
+    response = await self.post_link(add_link_dict['url'])
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(json.loads(response.content.decode())['id'], link.pk)
+    self.assertEqual(await Job.objects.acount(), 0)
+    mock_parse_url.assert_not_called()
+
+  async def test_status_of_other_users_jobs_is_not_found(self):
+    other_user = await User.objects.acreate(username='other')
+    other_setting = await UserSetting.objects.acreate(user=other_user)
+    api_keys.set_api_key(other_setting, 'other_api_key')
+    await other_setting.asave()
+
+    job_id = json.loads(
+        (await self.post_link(add_link_dict['url'])).content.decode())['job_id']
+    response = await self.get_status(job_id, api_key='other_api_key')
+    self.assertEqual(response.status_code, 404)
+
+
+class BatchEndpointsTest(TestCase):
+
+  def setUp(self):
+    self.client = AsyncClient()
+    self.user = User.objects.create_user(username='testuser')
+    self.user_setting = UserSetting.objects.create(
+        user_id=self.user.pk, lynx_api_key_hash=hash_api_key('test_api_key'))
+
+  async def post(self, path: str, data: dict):
+    return await self.client.generic('POST',
+                                     path,
+                                     json.dumps(data),
+                                     X_API_KEY='test_api_key')
+
+  async def fake_parse_url(self, url: str, user, model_fields=None) -> Link:
+    if 'broken' in url:
+      raise UrlParseError('404 Not Found')
+    return Link(user=user,
+                original_url=url,
+                cleaned_url=url,
+                hostname='example.com',
+                title=url.rsplit('/', 1)[-1],
+                article_date=timezone.now(),
+                read_time_seconds=12)
+
+  async def test_add_links(self):
+    existing = await Link.objects.acreate(user=self.user,
+                                          original_url='https://example.com/old',
+                                          cleaned_url='https://example.com/old',
+                                          article_date=timezone.now(),
+                                          read_time_seconds=12)
+    urls = [
+        'https://example.com/old', 'https://example.com/new',
+        'https://example.com/broken', 'http://www.example.com/new/'
+    ]
+    with patch('lynx.url_parser.parse_url',
+               side_effect=self.fake_parse_url) as mock_parse_url:
+      response = await self.post('/api/links/add/batch', {'urls': urls})
+    self.assertEqual(response.status_code, 200)
+    results = json.loads(response.content.decode())
+    self.assertEqual([result['status'] for result in results],
+                     ['existing', 'created', 'failed', 'existing'])
+    self.assertEqual(results[0]['link']['id'], existing.pk)
+    self.assertEqual(results[1]['link']['id'], results[3]['link']['id'])
+    self.assertEqual(results[2]['error'], '404 Not Found')
+    # The same page is only loaded once
+    self.assertEqual(mock_parse_url.call_count, 2)
+    self.assertEqual(await Link.objects.filter(user=self.user).acount(), 2)
+
+  async def test_malformed_url_only_fails_its_item(self):
+    urls = ['https://example.com/new', 'http://[::1']
+    with patch('lynx.url_parser.parse_url',
+               side_effect=self.fake_parse_url) as mock_parse_url:
+      response = await self.post('/api/links/add/batch', {'urls': urls})
+    self.assertEqual(response.status_code, 200)
+    results = json.loads(response.content.decode())
+    self.assertEqual([result['status'] for result in results],
+                     ['created', 'failed'])
+    self.assertEqual(results[1]['error'], 'Invalid IPv6 URL')
+    mock_parse_url.assert_called_once()
+
+  async def test_add_notes(self):
+    notes = [{
+        'url': 'https://example.com/first',
+        'content': 'One'
+    }, {
+        'url': 'https://example.com/broken',
+        'content': 'Two'
+    }, {
+        'url': 'https://example.com/first',
+        'content': 'Three'
+    }]
+    with patch('lynx.url_parser.parse_url', side_effect=self.fake_parse_url):
+      response = await self.post('/api/notes/add/batch', {'notes': notes})
+    self.assertEqual(response.status_code, 200)
+    results = json.loads(response.content.decode())
+    self.assertEqual([result['status'] for result in results],
+                     ['created', 'failed', 'created'])
+    self.assertEqual(results[0]['note']['content'], 'One')
+    self.assertEqual(results[0]['note']['link_title'], 'first')
+    self.assertEqual(results[2]['note']['content'], 'Three')
+    self.assertEqual(results[0]['note']['link']['id'],
+                     results[2]['note']['link']['id'])
+    self.assertEqual(
+        [note.content async for note in Note.objects.order_by('pk')],
+        ['One', 'Three'])
+
+  @override_settings(LYNX_API_BATCH_MAX_ITEMS=1)
+  async def test_batch_size_is_limited(self):
+    response = await self.post('/api/links/add/batch', {
+        'urls': ['https://example.com/1', 'https://example.com/2']
+    })
+    self.assertEqual(response.status_code, 422)
+
+
+class ExtractionMetricsEndpointTest(TestCase):
+
+  def setUp(self):
+    self.client = AsyncClient()
+    self.user = User.objects.create_user(username='testuser')
+    self.user_setting = UserSetting.objects.create(
+        user_id=self.user.pk, lynx_api_key_hash=hash_api_key('test_api_key'))
+
+  async def test_requires_api_key(self):
+    response = await self.client.get('/api/extraction/metrics')
+    self.assertEqual(response.status_code, 401)
+
+  async def test_returns_metrics(self):
+    response = await self.client.get('/api/extraction/metrics',
+                                     X_API_KEY='test_api_key')
+    self.assertEqual(response.status_code, 200)
+    response_data = json.loads(response.content.decode())
+    self.assertIn('queue_depth', response_data)
+    self.assertIn('avg_run_ms', response_data)
@@ -0,0 +1,81 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from lynx import api_keys
+from lynx.models import UserSetting
+
+# The pages are rendered without running collectstatic first
+STATIC_STORAGES = {
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    }
+}
+
+
+class ApiKeyTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    self.setting = UserSetting.objects.create(user=self.user)
+    self.key = api_keys.generate_api_key()
+    api_keys.set_api_key(self.setting, self.key)
+    self.setting.save()
+
+  def test_only_hash_is_stored(self):
+    self.setting.refresh_from_db()
+    self.assertEqual(self.setting.lynx_api_key_hash,
+                     api_keys.hash_api_key(self.key))
+    self.assertEqual(self.setting.lynx_api_key_prefix, self.key[:6])
+
+  async def test_lookup_includes_user(self):
+    setting = await api_keys.get_setting_for_api_key(self.key)
+    self.assertEqual(setting.pk, self.setting.pk)
+    # Loaded along with the setting, so this doesn't query
+    self.assertEqual(setting.user.username, 'user')
+    self.assertIsNone(await api_keys.get_setting_for_api_key('wrong'))
+    self.assertIsNone(await api_keys.get_setting_for_api_key(''))
+
+  async def test_verified_keys_are_cached(self):
+    await api_keys.get_setting_for_api_key(self.key)
+    # Not seen by the cache, since it skips the signals
+    await UserSetting.objects.filter(pk=self.setting.pk).aupdate(
+        lynx_api_key_hash='')
+    setting = await api_keys.get_setting_for_api_key(self.key)
+    self.assertEqual(setting.pk, self.setting.pk)
+
+    with override_settings(LYNX_API_KEY_CACHE_SECONDS=0):
+      self.assertIsNone(await api_keys.get_setting_for_api_key(self.key))
+
+  async def test_saving_setting_clears_cached_keys(self):
+    await api_keys.get_setting_for_api_key(self.key)
+    api_keys.set_api_key(self.setting, '')
+    await self.setting.asave()
+    self.assertIsNone(await api_keys.get_setting_for_api_key(self.key))
+
+  @override_settings(STORAGES=STATIC_STORAGES)
+  def test_reset_in_settings_shows_new_key_once(self):
+    self.client.force_login(self.user)
+    response = self.client.post('/links/settings/', {
+        'summarization_model': 'gpt-3.5-turbo',
+        'reset_api_key': 'Reset API Key'
+    })
+    self.assertEqual(response.status_code, 200)
+    new_key = response.context['form'].initial['lynx_api_key']
+    self.assertNotEqual(new_key, self.key)
+    self.setting.refresh_from_db()
+    self.assertEqual(self.setting.lynx_api_key_hash,
+                     api_keys.hash_api_key(new_key))
+
+    response = self.client.get('/links/settings/')
+    self.assertEqual(response.context['form'].initial['lynx_api_key'],
+                     f'{new_key[:6]}…')
+    self.assertNotContains(response, new_key)
+
+  def test_api_rejects_cleared_key(self):
+    self.assertEqual(
+        self.client.get('/api/extraction/metrics',
+                        HTTP_X_API_KEY=self.key).status_code, 200)
+    api_keys.set_api_key(self.setting, '')
+    self.setting.save()
+    self.assertEqual(
+        self.client.get('/api/extraction/metrics',
+                        HTTP_X_API_KEY=self.key).status_code, 401)
@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+import brotli
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from lynx.archive_storage import (ArchiveStorage, LocalArchiveStorage,
+                                  get_archive_storage)
+from lynx.models import Link, LinkArchive
+
+ARCHIVE_HTML = '<html><body>' + 'Archived content ' * 10000 + '</body></html>'
+
+
+class ArchiveStorageTestCase(TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.override = override_settings(LYNX_ARCHIVE_ROOT=self.root)
+    self.override.enable()
+
+  def tearDown(self):
+    self.override.disable()
+    shutil.rmtree(self.root)
+
+  def create_link(self, user: User, url: str = 'https://example.com') -> Link:
+    return Link.objects.create(user=user,
+                               original_url=url,
+                               cleaned_url=url,
+                               article_date=timezone.now(),
+                               read_time_seconds=12)
+
+  def create_archive(self, user: User, link: Link,
+                     content: str = ARCHIVE_HTML) -> LinkArchive:
+    data = content.encode('utf-8')
+    return LinkArchive.objects.create(
+        user=user,
+        link=link,
+        content_hash=get_archive_storage().save(data),
+        content_size=len(data))
+
+
+class LocalArchiveStorageTest(ArchiveStorageTestCase):
+
+  def test_stores_compressed_content_by_hash(self):
+    storage = LocalArchiveStorage()
+    content = ARCHIVE_HTML.encode('utf-8')
+    key = storage.save(content)
+
+    self.assertTrue(storage.exists(key))
+    self.assertTrue(storage.path(key).startswith(self.root))
+    self.assertLess(storage.size(key), len(content) / 10)
+    with storage.open(key) as f:
+      self.assertEqual(brotli.decompress(f.read()), content)
+    self.assertEqual(storage.read(key), content)
+
+  def test_identical_content_is_stored_once(self):
+    storage = LocalArchiveStorage()
+    key = storage.save(b'<html>same</html>')
+    modified_at = os.path.getmtime(storage.path(key))
+    self.assertEqual(storage.save(b'<html>same</html>'), key)
+    self.assertEqual(os.path.getmtime(storage.path(key)), modified_at)
+    self.assertNotEqual(storage.save(b'<html>different</html>'), key)
+
+  def test_content_is_deleted_with_last_archive(self):
+    user = User.objects.create(username='user')
+    first = self.create_archive(user, self.create_link(user, 'https://a.com'))
+    second = self.create_archive(user, self.create_link(user,
+                                                        'https://b.com'))
+    self.assertEqual(first.content_hash, second.content_hash)
+    storage = get_archive_storage()
+
+    first.link.delete()
+    self.assertTrue(storage.exists(second.content_hash))
+    second.delete()
+    self.assertFalse(storage.exists(second.content_hash))
+
+  def test_deleting_content_takes_the_content_lock(self):
+    user = User.objects.create(username='user')
+    archive = self.create_archive(user, self.create_link(user))
+    with CaptureQueriesContext(connection) as queries:
+      archive.delete()
+    self.assertIn(f'lynx_archive:{archive.content_hash}',
+                  ' '.join(query['sql'] for query in queries))
+
+  def test_storage_must_implement_every_method(self):
+
+    class IncompleteStorage(ArchiveStorage):
+
+      def exists(self, key: str) -> bool:
+        return False
+
+    with self.assertRaises(TypeError):
+      IncompleteStorage()
+
+
+@override_settings(STORAGES={
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage'
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    },
+})
+class LinkArchiveViewTest(ArchiveStorageTestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.user = User.objects.create(username='user')
+    self.link = self.create_link(self.user)
+    self.client.force_login(self.user)
+
+  async def read_streaming_content(self, response) -> bytes:
+    return b''.join([chunk async for chunk in response.streaming_content])
+
+  async def test_streams_compressed_archive(self):
+    archive = await sync_to_async(self.create_archive)(self.user, self.link)
+    await sync_to_async(self.async_client.force_login)(self.user)
+    response = await self.async_client.get(reverse('lynx:link_archive',
+                                       args=[self.link.pk]),
+                               headers={'Accept-Encoding': 'gzip, br'})
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.streaming)
+    self.assertEqual(response['Content-Encoding'], 'br')
+    body = await self.read_streaming_content(response)
+    self.assertEqual(int(response['Content-Length']), len(body))
+    self.assertEqual(brotli.decompress(body), ARCHIVE_HTML.encode('utf-8'))
+    self.assertEqual(await sync_to_async(archive.get_content)(), ARCHIVE_HTML)
+
+  async def test_decompresses_for_clients_without_brotli(self):
+    await sync_to_async(self.create_archive)(self.user, self.link)
+    await sync_to_async(self.async_client.force_login)(self.user)
+    response = await self.async_client.get(reverse('lynx:link_archive',
+                                       args=[self.link.pk]),
+                               headers={'Accept-Encoding': 'gzip'})
+    self.assertEqual(response.status_code, 200)
+    self.assertFalse(response.has_header('Content-Encoding'))
+    self.assertEqual(await self.read_streaming_content(response),
+                     ARCHIVE_HTML.encode('utf-8'))
+
+  async def test_decompresses_for_clients_that_refuse_brotli(self):
+    await sync_to_async(self.create_archive)(self.user, self.link)
+    await sync_to_async(self.async_client.force_login)(self.user)
+    response = await self.async_client.get(reverse('lynx:link_archive',
+                                       args=[self.link.pk]),
+                               headers={'Accept-Encoding': 'gzip, br;q=0'})
+    self.assertEqual(response.status_code, 200)
+    self.assertFalse(response.has_header('Content-Encoding'))
+    self.assertEqual(await self.read_streaming_content(response),
+                     ARCHIVE_HTML.encode('utf-8'))
+
+  def test_serves_archives_stored_in_database(self):
+    LinkArchive.objects.create(user=self.user,
+                               link=self.link,
+                               archive_content='<html>legacy</html>')
+    response = self.client.get(
+        reverse('lynx:link_archive', args=[self.link.pk]))
+    self.assertEqual(response.content, b'<html>legacy</html>')
+
+  def test_migratearchives_moves_content_to_storage(self):
+    archive = LinkArchive.objects.create(user=self.user,
+                                         link=self.link,
+                                         archive_content=ARCHIVE_HTML)
+    call_command('migratearchives', stdout=open(os.devnull, 'w'))
+
+    archive.refresh_from_db()
+    self.assertEqual(archive.archive_content, '')
+    self.assertEqual(archive.content_size, len(ARCHIVE_HTML))
+    self.assertTrue(get_archive_storage().exists(archive.content_hash))
+    self.assertEqual(archive.get_content(), ARCHIVE_HTML)
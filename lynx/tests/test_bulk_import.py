@@ -0,0 +1,163 @@
+import asyncio
+import io
+from unittest.mock import patch
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lynx import bulk_import
+from lynx.errors import UrlParseError
+from lynx.models import BulkUpload, BulkUploadRow, Job, Link, Tag
+
+READWISE_CSV = '''Title,URL,Document tags,Saved date,Reading progress
+First,https://example.com/1,"['news', 'tech']",2024-01-02 03:04:05+00:00,1
+Second,https://example.com/2,,2024-01-03 03:04:05+00:00,0
+Email,mailto:someone@example.com,,,0
+Duplicate,https://EXAMPLE.com/1,['tech'],,0
+Broken,https://example.com/broken,,,0
+Existing,https://example.com/existing,['news'],,0
+'''
+
+
+def fake_parse_url(url: str, user, model_fields: dict) -> Link:
+  if 'broken' in url:
+    raise UrlParseError('404 Not Found')
+  return Link(user=user,
+              original_url=url,
+              cleaned_url=url,
+              article_date=timezone.now(),
+              read_time_seconds=12,
+              **model_fields)
+
+
+class BulkImportTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    self.existing = Link.objects.create(
+        user=self.user,
+        original_url='https://example.com/existing',
+        cleaned_url='https://example.com/existing',
+        article_date=timezone.now(),
+        read_time_seconds=12)
+    Tag.objects.create(user=self.user, name='news')
+    self.bulk_upload = BulkUpload.objects.create(user=self.user)
+
+  def create_rows(self) -> int:
+    rows = bulk_import.read_readwise_rows(
+        io.BytesIO(READWISE_CSV.encode('utf-8')), 'bulk')
+    return bulk_import.create_upload_rows(self.bulk_upload, rows)
+
+  def test_reads_readwise_rows(self):
+    rows = list(
+        bulk_import.read_readwise_rows(
+            io.BytesIO(READWISE_CSV.encode('utf-8')), 'bulk'))
+    self.assertEqual(len(rows), 5)
+    self.assertEqual(rows[0].tags, ['news', 'tech', 'bulk'])
+    self.assertIsNotNone(rows[0].last_viewed_at)
+    self.assertEqual(rows[0].added_at.year, 2024)
+    self.assertEqual(rows[1].tags, ['bulk'])
+    self.assertIsNone(rows[1].last_viewed_at)
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_imports_rows(self, mock_parse_url):
+    mock_parse_url.side_effect = fake_parse_url
+    self.assertEqual(await sync_to_async(self.create_rows)(), 5)
+
+    await bulk_import.BulkImporter(self.bulk_upload).run()
+
+    # Only new URLs are downloaded, once each
+    fetched = sorted(call.args[0] for call in mock_parse_url.call_args_list)
+    self.assertEqual(fetched, [
+        'https://example.com/1', 'https://example.com/2',
+        'https://example.com/broken'
+    ])
+    self.assertEqual(self.bulk_upload.status, BulkUpload.Status.COMPLETE)
+    self.assertEqual(self.bulk_upload.processed_rows, 5)
+    self.assertEqual(self.bulk_upload.failed_rows, 1)
+
+    link = await Link.objects.aget(original_url='https://example.com/1')
+    self.assertEqual(link.created_from_bulk_upload_id, self.bulk_upload.pk)
+    self.assertIsNotNone(link.last_viewed_at)
+    self.assertEqual(
+        sorted([tag.name async for tag in link.tags.all()]),
+        ['bulk', 'news', 'tech'])
+    self.assertEqual(
+        sorted([tag.name async for tag in self.existing.tags.all()]),
+        ['bulk', 'news'])
+    self.assertEqual(await Tag.objects.filter(name='news').acount(), 1)
+
+    failed = await BulkUploadRow.objects.aget(
+        status=BulkUploadRow.Status.FAILED)
+    self.assertEqual(failed.url, 'https://example.com/broken')
+    self.assertIn('404', failed.error)
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_resumes_from_pending_rows(self, mock_parse_url):
+    mock_parse_url.side_effect = fake_parse_url
+    await sync_to_async(self.create_rows)()
+    importer = bulk_import.BulkImporter(self.bulk_upload, batch_size=2)
+    first_batch = [
+        row async for row in BulkUploadRow.objects.order_by('pk')[:2]
+    ]
+    await importer.import_rows(first_batch)
+    self.assertEqual(mock_parse_url.call_count, 2)
+
+    # As if the worker had died here and the task was run again
+    mock_parse_url.reset_mock()
+    await bulk_import.BulkImporter(self.bulk_upload, batch_size=2).run()
+    fetched = [call.args[0] for call in mock_parse_url.call_args_list]
+    self.assertEqual(fetched, ['https://example.com/broken'])
+    self.assertEqual(self.bulk_upload.processed_rows, 5)
+    self.assertEqual(
+        await Link.objects.filter(
+            original_url__iexact='https://example.com/1').acount(), 1)
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_limits_concurrent_fetches(self, mock_parse_url):
+    in_flight = 0
+    max_in_flight = 0
+
+    async def slow_parse_url(url, user, model_fields):
+      nonlocal in_flight, max_in_flight
+      in_flight += 1
+      max_in_flight = max(max_in_flight, in_flight)
+      await asyncio.sleep(0.01)
+      in_flight -= 1
+      return fake_parse_url(url, user, model_fields)
+
+    mock_parse_url.side_effect = slow_parse_url
+    await sync_to_async(bulk_import.create_upload_rows)(
+        self.bulk_upload, [
+            BulkUploadRow(url=f'https://example.com/page/{i}', tags=['bulk'])
+            for i in range(20)
+        ])
+    await bulk_import.BulkImporter(self.bulk_upload, max_concurrency=3).run()
+    self.assertEqual(max_in_flight, 3)
+    self.assertEqual(await Link.objects.filter(user=self.user).acount(), 21)
+
+  @override_settings(STORAGES={
+      'default': {
+          'BACKEND': 'django.core.files.storage.FileSystemStorage'
+      },
+      'staticfiles': {
+          'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+      },
+  })
+  def test_upload_view_queues_one_task(self):
+    self.client.force_login(self.user)
+    response = self.client.post(
+        reverse('lynx:bulk_upload'), {
+            'file_source': 'readwise',
+            'file': SimpleUploadedFile('readwise.csv',
+                                       READWISE_CSV.encode('utf-8')),
+        })
+    self.assertEqual(response.status_code, 302)
+    bulk_upload = BulkUpload.objects.exclude(pk=self.bulk_upload.pk).get()
+    self.assertEqual(bulk_upload.total_rows, 5)
+    self.assertEqual(bulk_upload.rows.count(), 5)
+    self.assertEqual(
+        bulk_upload.rows.first().tags[-1], f'readwise_upload_{bulk_upload.pk}')
+    self.assertEqual(Job.objects.count(), 1)
@@ -1,10 +1,19 @@
+import asyncio
+import tempfile
 from unittest.mock import patch
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
 from background_task.tasks import os
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.utils import timezone
-from lynx.commands import create_archive_for_link, get_or_create_link, get_or_create_link_with_content
+from lynx.commands import create_archive_for_link, get_or_create_link, get_or_create_link_with_content, get_or_create_links, reload_link
 from lynx.models import Link, UserCookie
+from lynx.page_fetcher import PageFetcher
+from lynx import url_parser
+from lynx.utils.urls import get_url_key
 
 
 class TestGetOrCreateLink(TestCase):
@@ -47,6 +56,106 @@ class TestGetOrCreateLink(TestCase):
     self.assertEqual(link.pk, link_again.pk,
                      'The returned link should have the same primary key')
 
+  @patch('lynx.url_parser.parse_url')
+  async def test_get_or_create_link_matches_other_spellings_of_url(
+      self, mock_parse_url):
+    user, _ = await User.objects.aget_or_create(username='user')
+    existing = await self.create_test_link(
+        user=user,
+        original_url='https://example.com/post?id=1',
+        cleaned_url='https://example.com/post?id=1')
+
+    link, created = await get_or_create_link(
+        'http://www.Example.com/post/?utm_source=feed&id=1#comments', user)
+    self.assertFalse(created)
+    self.assertEqual(link.pk, existing.pk)
+    mock_parse_url.assert_not_called()
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_get_or_create_link_matches_cleaned_url(self, mock_parse_url):
+    # Say the link was first saved through a redirect
+    user, _ = await User.objects.aget_or_create(username='user')
+    existing = await self.create_test_link(
+        user=user,
+        original_url='https://short.example/abc',
+        cleaned_url='https://example.com/post')
+
+    link, created = await get_or_create_link('https://example.com/post/',
+                                             user)
+    self.assertFalse(created)
+    self.assertEqual(link.pk, existing.pk)
+    mock_parse_url.assert_not_called()
+
+  def test_existence_check_is_one_indexed_query(self):
+    user = User.objects.create(username='user')
+    Link.objects.create(user=user,
+                        original_url='https://example.com',
+                        cleaned_url='https://example.com',
+                        article_date=timezone.now(),
+                        read_time_seconds=12)
+
+    with CaptureQueriesContext(connection) as queries:
+      _, created = async_to_sync(get_or_create_link)('https://example.com/',
+                                                     user)
+    self.assertFalse(created)
+    self.assertEqual(len(queries), 1)
+    self.assertIn('"lynx_link"."url_key" IN', queries[0]['sql'])
+    self.assertIn('"lynx_link"."cleaned_url_key" IN', queries[0]['sql'])
+    self.assertNotIn('UPPER', queries[0]['sql'])
+
+  @patch('lynx.url_parser.parse_url')
+  async def test_get_or_create_link_returns_link_saved_concurrently(
+      self, mock_parse_url):
+    user, _ = await User.objects.aget_or_create(username='user')
+    url = 'https://example.com'
+
+    async def parse_while_another_request_saves(url, user, model_fields):
+      # Another request saves the same page while this one is loading it
+      nonlocal other
+      other = await self.create_test_link(user=user,
+                                          original_url=url,
+                                          cleaned_url=url)
+      return Link(user=user,
+                  original_url=url,
+                  cleaned_url=url,
+                  article_date=timezone.now(),
+                  read_time_seconds=12)
+
+    other = None
+    mock_parse_url.side_effect = parse_while_another_request_saves
+    link, created = await get_or_create_link(url, user)
+    self.assertFalse(created)
+    self.assertEqual(link.pk, other.pk)
+    self.assertEqual(await Link.objects.filter(user=user).acount(), 1)
+
+
+class TestGetOrCreateLinks(TestCase):
+
+  async def test_loads_new_pages_with_bounded_concurrency(self):
+    user = await User.objects.acreate(username='user')
+    in_flight = 0
+    max_in_flight = 0
+
+    async def fake_parse_url(url, user, model_fields=None):
+      nonlocal in_flight, max_in_flight
+      in_flight += 1
+      max_in_flight = max(max_in_flight, in_flight)
+      await asyncio.sleep(0.01)
+      in_flight -= 1
+      return Link(user=user,
+                  original_url=url,
+                  cleaned_url=url,
+                  article_date=timezone.now(),
+                  read_time_seconds=12)
+
+    urls = [f'https://example.com/{i}' for i in range(6)]
+    with patch('lynx.url_parser.parse_url', side_effect=fake_parse_url):
+      results = await get_or_create_links(urls, user, concurrency=2)
+    self.assertEqual(max_in_flight, 2)
+    self.assertEqual([result.url for result in results], urls)
+    self.assertTrue(all(result.created for result in results))
+    self.assertEqual(await Link.objects.filter(user=user).acount(), 6)
+
 
 class TestGetOrCreateLinkWithContent(TestCase):
 
@@ -113,6 +222,8 @@ class TestCreateArchiveForLink(TestCase):
   @patch.dict(os.environ, {"SINGLEFILE_URL": "https://localhost:8000"},
               clear=True)
   @patch('lynx.commands.get_singlefile_content')
+  @override_settings(LYNX_ARCHIVE_ROOT=tempfile.gettempdir() +
+                     '/lynx-test-archives')
   async def test_create_archive_for_link_returns_existing_archive(
       self, mock_get_singlefile_content):
     user, _ = await User.objects.aget_or_create(username='user')
@@ -125,7 +236,7 @@ class TestCreateArchiveForLink(TestCase):
       # Shouldn't happen based on the previous check
       return
 
-    self.assertEqual(archive.archive_content,
+    self.assertEqual(await sync_to_async(archive.get_content)(),
                      '<html>Singlefile content</html>')
     self.assertEqual(archive.link, link)
     self.assertEqual(archive.user, user)
@@ -134,7 +245,27 @@ class TestCreateArchiveForLink(TestCase):
     new_archive = await create_archive_for_link(user, link)
 
     self.assertEqual(archive.pk, new_archive.pk)
-    self.assertEqual(archive.archive_content, new_archive.archive_content)
+    self.assertEqual(archive.content_hash, new_archive.content_hash)
+
+  @patch.dict(os.environ, {"SINGLEFILE_URL": "https://localhost:8000"},
+              clear=True)
+  @patch('lynx.commands.get_singlefile_content')
+  @override_settings(LYNX_ARCHIVE_ROOT=tempfile.gettempdir() +
+                     '/lynx-test-archives')
+  def test_create_archive_for_link_takes_the_content_lock(
+      self, mock_get_singlefile_content):
+    user = User.objects.create(username='user')
+    link = async_to_sync(self.create_test_link)(user=user)
+    mock_get_singlefile_content.return_value = '<html>Locked content</html>'
+
+    with CaptureQueriesContext(connection) as queries:
+      archive = async_to_sync(create_archive_for_link)(user, link)
+    sql = [query['sql'] for query in queries]
+    lock = next(i for i, query in enumerate(sql)
+                if f'lynx_archive:{archive.content_hash}' in query)
+    insert = next(i for i, query in enumerate(sql)
+                  if query.startswith('INSERT INTO "lynx_linkarchive"'))
+    self.assertLess(lock, insert)
 
   @patch.dict(os.environ, {"SINGLEFILE_URL": "https://localhost:8000"},
               clear=True)
@@ -180,3 +311,76 @@ class TestCreateArchiveForLink(TestCase):
             'my_cookie,my_value,example.com',
             'othercookie,othervalue,example.com',
         ])
+
+
+class TestReloadLink(TestCase):
+
+  def setUp(self):
+    self.requests = []
+    self.response = httpx.Response(200,
+                                   html='<p>New content</p>',
+                                   headers={
+                                       'ETag': '"v2"',
+                                       'Last-Modified':
+                                       'Wed, 01 May 2024 00:00:00 GMT'
+                                   })
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      self.requests.append(request)
+      return self.response
+
+    fetcher = PageFetcher(transport=httpx.MockTransport(handler))
+    patcher = patch('lynx.url_parser.get_page_fetcher', return_value=fetcher)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  async def create_link(self, **kwargs) -> Link:
+    user, _ = await User.objects.aget_or_create(username='user')
+    return await Link.objects.acreate(user=user,
+                                      original_url='https://example.com',
+                                      cleaned_url='https://example.com',
+                                      title='Old title',
+                                      article_date=timezone.now(),
+                                      read_time_seconds=12,
+                                      **kwargs)
+
+  @patch('lynx.extraction.parse_content')
+  async def test_reloads_changed_pages(self, mock_parse_content):
+    mock_parse_content.return_value = {
+        'cleaned_url': 'https://example.com/moved',
+        'title': 'New title',
+        'article_date': timezone.now(),
+        'article_html': '<p>New content</p>',
+        'full_page_html': '<p>New content</p>',
+        'read_time_seconds': 1,
+    }
+    link = await self.create_link(etag='"v1"', content_hash='old')
+
+    self.assertTrue(await reload_link(link, link.user))
+    self.assertEqual(self.requests[0].headers['If-None-Match'], '"v1"')
+    await link.arefresh_from_db()
+    self.assertEqual(link.title, 'New title')
+    self.assertEqual(link.cleaned_url_key,
+                     get_url_key('https://example.com/moved'))
+    self.assertEqual(link.etag, '"v2"')
+    self.assertEqual(link.modified, 'Wed, 01 May 2024 00:00:00 GMT')
+    self.assertEqual(link.content_hash,
+                     url_parser.hash_page('<p>New content</p>'))
+
+  @patch('lynx.extraction.parse_content')
+  async def test_skips_pages_that_are_not_modified(self, mock_parse_content):
+    self.response = httpx.Response(304)
+    link = await self.create_link(etag='"v1"')
+    updated_at = link.updated_at
+
+    self.assertFalse(await reload_link(link, link.user))
+    mock_parse_content.assert_not_called()
+    await link.arefresh_from_db()
+    self.assertEqual(link.updated_at, updated_at)
+
+  @patch('lynx.extraction.parse_content')
+  async def test_skips_pages_with_the_same_content(self, mock_parse_content):
+    link = await self.create_link(
+        content_hash=url_parser.hash_page('<p>New content</p>'))
+    self.assertFalse(await reload_link(link, link.user))
+    mock_parse_content.assert_not_called()
@@ -0,0 +1,129 @@
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from lynx.archive_storage import get_archive_storage
+from lynx.data_export import UserDataExporter
+from lynx.models import Feed, FeedItem, Link, LinkArchive, Note, Tag
+
+
+class UserDataExportTest(TestCase):
+
+  def setUp(self):
+    self.root = tempfile.mkdtemp()
+    self.override = override_settings(LYNX_ARCHIVE_ROOT=self.root)
+    self.override.enable()
+
+    self.user = User.objects.create(username='user')
+    other_user = User.objects.create(username='other')
+    tag = Tag.objects.create(user=self.user, name='tag')
+    for i in range(5):
+      link = Link.objects.create(user=self.user,
+                                 original_url=f'https://example.com/{i}',
+                                 cleaned_url=f'https://example.com/{i}',
+                                 article_date=timezone.now(),
+                                 title=f'Link {i}',
+                                 article_html=f'<p>Article {i}</p>',
+                                 raw_text_content=f'Article {i}',
+                                 full_page_html=f'<html>Article {i}</html>',
+                                 read_time_seconds=12)
+      link.tags.add(tag)
+    Link.objects.create(user=other_user,
+                        original_url='https://example.com/other',
+                        cleaned_url='https://example.com/other',
+                        article_date=timezone.now(),
+                        read_time_seconds=12)
+    content = b'<html>Archived</html>'
+    LinkArchive.objects.create(user=self.user,
+                               link=link,
+                               content_hash=get_archive_storage().save(content),
+                               content_size=len(content))
+    Note.objects.create(user=self.user, link=link, content='A note')
+    feed = Feed.objects.create(user=self.user,
+                               feed_name='Feed',
+                               feed_url='https://example.com/feed')
+    FeedItem.objects.create(feed=feed,
+                            title='Item',
+                            guid='item',
+                            url='https://example.com/item')
+    self.tag = tag
+
+  def tearDown(self):
+    self.override.disable()
+    shutil.rmtree(self.root)
+
+  def export_records(self, **kwargs) -> list[dict]:
+    f = io.StringIO()
+    UserDataExporter(self.user, **kwargs).write_ndjson(f)
+    return [json.loads(line) for line in f.getvalue().splitlines()]
+
+  def test_exports_ndjson(self):
+    records = self.export_records()
+    models = [record['model'] for record in records]
+    self.assertEqual(models.count('lynx.link'), 5)
+    for model in ['lynx.tag', 'lynx.note', 'lynx.feed', 'lynx.feeditem',
+                  'lynx.linkarchive']:
+      self.assertEqual(models.count(model), 1, model)
+
+    link = next(record for record in records if record['model'] == 'lynx.link')
+    self.assertEqual(link['fields']['full_page_html'], '<html>Article 0</html>')
+    self.assertEqual(link['fields']['tags'], [self.tag.pk])
+    self.assertNotIn('content_search', link['fields'])
+    archive = next(record for record in records
+                   if record['model'] == 'lynx.linkarchive')
+    self.assertEqual(archive['fields']['archive_content'],
+                     '<html>Archived</html>')
+
+  def test_excludes_content(self):
+    records = self.export_records(include_content=False)
+    for record in records:
+      for field in ['article_html', 'raw_text_content', 'full_page_html',
+                    'archive_content']:
+        self.assertNotIn(field, record['fields'])
+    link = next(record for record in records if record['model'] == 'lynx.link')
+    self.assertEqual(link['fields']['title'], 'Link 0')
+
+  def test_query_count_does_not_grow_with_links(self):
+    # Tags are prefetched per chunk rather than queried for every link
+    with CaptureQueriesContext(connection) as queries:
+      self.export_records(include_content=False)
+    for i in range(20):
+      link = Link.objects.create(user=self.user,
+                                 original_url=f'https://example.com/more/{i}',
+                                 cleaned_url=f'https://example.com/more/{i}',
+                                 article_date=timezone.now(),
+                                 read_time_seconds=12)
+      link.tags.add(self.tag)
+    with self.assertNumQueries(len(queries)):
+      self.export_records(include_content=False)
+
+  def test_exports_zip_per_model(self):
+    f = io.BytesIO()
+    UserDataExporter(self.user).write_zip(f)
+    with zipfile.ZipFile(f) as archive:
+      self.assertIn('lynx.link.jsonl', archive.namelist())
+      self.assertEqual(archive.getinfo('lynx.link.jsonl').compress_type,
+                       zipfile.ZIP_DEFLATED)
+      lines = archive.read('lynx.link.jsonl').decode().splitlines()
+    self.assertEqual(len(lines), 5)
+    self.assertEqual(json.loads(lines[0])['model'], 'lynx.link')
+
+  def test_command_writes_compressed_ndjson(self):
+    path = os.path.join(self.root, 'export.ndjson.gz')
+    call_command('exportuserdata',
+                 'user',
+                 '--compress',
+                 f'--output={path}',
+                 stdout=io.StringIO())
+    with gzip.open(path, 'rt') as f:
+      records = [json.loads(line) for line in f]
+    self.assertEqual(len(records), 10)
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from lynx import extraction
+from lynx.url_context import UrlContext
+
+CONTENT = '<html><head><title>A title</title></head><body><article><p>Some article text.</p></article></body></html>'
+
+
+class ExtractionTest(TestCase):
+
+  def setUp(self):
+    extraction.metrics.reset()
+
+  async def test_parse_content_in_process_pool(self):
+    user = await User.objects.acreate(username='user')
+    parsed = await extraction.parse_content(
+        UrlContext('http://test.com', user), CONTENT)
+    self.assertEqual(parsed['title'], 'A title')
+    self.assertEqual(parsed['user'], user)
+    self.assertEqual(parsed['original_url'], 'http://test.com')
+
+  @override_settings(LYNX_EXTRACTION_WORKERS=0)
+  async def test_parse_content_without_process_pool(self):
+    parsed = await extraction.parse_content(
+        UrlContext('http://test.com', None), CONTENT)
+    self.assertEqual(parsed['title'], 'A title')
+
+  @override_settings(LYNX_EXTRACTION_WORKERS=0)
+  async def test_metrics_are_recorded(self):
+    await extraction.parse_content(UrlContext('http://test.com', None),
+                                   CONTENT)
+    snapshot = extraction.metrics.snapshot()
+    self.assertEqual(snapshot['submitted'], 1)
+    self.assertEqual(snapshot['completed'], 1)
+    self.assertEqual(snapshot['in_flight'], 0)
+    self.assertEqual(snapshot['queue_depth'], 0)
+    self.assertGreater(snapshot['avg_run_ms'], 0)
@@ -0,0 +1,116 @@
+import asyncio
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+import httpx
+from lynx.feed_refresher import FeedRefresher
+from lynx.models import Feed, FeedItem
+
+RSS_CONTENT = b'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Test Feed</title><link>https://example.com</link>
+<item><title>First</title><link>https://example.com/1</link><guid>1</guid><description>One</description><pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate></item>
+<item><title>Second</title><link>https://example.com/2</link><guid>2</guid><description>Two</description><pubDate>Tue, 02 Jan 2024 00:00:00 GMT</pubDate></item>
+</channel></rss>'''
+
+
+class FeedRefresherTest(TestCase):
+
+  async def create_feed(self, user, **kwargs) -> Feed:
+    defaults = {
+        'user': user,
+        'feed_name': 'Test Feed',
+        'feed_url': 'https://example.com/feed.xml'
+    }
+    defaults.update(kwargs)
+    return await Feed.objects.acreate(**defaults)
+
+  async def refresh(self, refresher: FeedRefresher, feeds: list[Feed]):
+    feeds = [
+        feed async for feed in Feed.objects.filter(
+            pk__in=[f.pk for f in feeds]).select_related('user')
+    ]
+    return await refresher.refresh_feeds(feeds)
+
+  async def test_new_items_are_persisted(self):
+    user = await User.objects.acreate(username='user')
+    feed = await self.create_feed(user)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      return httpx.Response(200,
+                            content=RSS_CONTENT,
+                            headers={
+                                'ETag': '"abc"',
+                                'Last-Modified': 'Tue, 02 Jan 2024 00:00:00 GMT'
+                            })
+
+    results = await self.refresh(
+        FeedRefresher(transport=httpx.MockTransport(handler)), [feed])
+    self.assertTrue(results[0].succeeded())
+    self.assertEqual(len(results[0].get_new_entries()), 2)
+    self.assertEqual(await FeedItem.objects.filter(feed=feed).acount(), 2)
+
+    await sync_to_async(feed.refresh_from_db)()
+    self.assertEqual(feed.etag, '"abc"')
+    self.assertEqual(feed.modified, 'Tue, 02 Jan 2024 00:00:00 GMT')
+    self.assertIsNotNone(feed.last_fetched_at)
+
+  async def test_conditional_get_uses_stored_validators(self):
+    user = await User.objects.acreate(username='user')
+    feed = await self.create_feed(user,
+                                  etag='"abc"',
+                                  modified='Tue, 02 Jan 2024 00:00:00 GMT')
+    seen_headers = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      seen_headers.append(request.headers)
+      return httpx.Response(304)
+
+    results = await self.refresh(
+        FeedRefresher(transport=httpx.MockTransport(handler)), [feed])
+    self.assertTrue(results[0].not_modified())
+    self.assertEqual(results[0].get_new_entries(), [])
+    self.assertEqual(seen_headers[0]['if-none-match'], '"abc"')
+    self.assertEqual(seen_headers[0]['if-modified-since'],
+                     'Tue, 02 Jan 2024 00:00:00 GMT')
+
+  async def test_concurrency_is_limited_per_host(self):
+    user = await User.objects.acreate(username='user')
+    feeds = [
+        await self.create_feed(user, feed_url=f'https://{host}/feed/{i}.xml')
+        for host in ['a.example.com', 'b.example.com'] for i in range(4)
+    ]
+    in_flight: dict[str, int] = {}
+    max_in_flight: dict[str, int] = {}
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+      host = request.url.host
+      in_flight[host] = in_flight.get(host, 0) + 1
+      max_in_flight[host] = max(max_in_flight.get(host, 0), in_flight[host])
+      await asyncio.sleep(0.01)
+      in_flight[host] -= 1
+      return httpx.Response(304)
+
+    results = await self.refresh(
+        FeedRefresher(max_per_host=2,
+                      transport=httpx.MockTransport(handler)), feeds)
+    self.assertTrue(all(result.succeeded() for result in results))
+    self.assertEqual(max_in_flight, {'a.example.com': 2, 'b.example.com': 2})
+
+  async def test_failed_fetch_does_not_fail_other_feeds(self):
+    user = await User.objects.acreate(username='user')
+    broken_feed = await self.create_feed(
+        user, feed_url='https://broken.example.com/feed.xml')
+    working_feed = await self.create_feed(user)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      if request.url.host == 'broken.example.com':
+        raise httpx.ConnectTimeout('timed out', request=request)
+      return httpx.Response(200, content=RSS_CONTENT)
+
+    results = await self.refresh(
+        FeedRefresher(transport=httpx.MockTransport(handler)),
+        [broken_feed, working_feed])
+    by_feed = {result.feed.pk: result for result in results}
+    self.assertIsInstance(by_feed[broken_feed.pk].error, httpx.ConnectTimeout)
+    self.assertTrue(by_feed[working_feed.pk].succeeded())
+    self.assertEqual(len(by_feed[working_feed.pk].get_new_entries()), 2)
@@ -0,0 +1,196 @@
+from datetime import timedelta
+from unittest.mock import MagicMock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+import feedparser
+import httpx
+from lynx import feed_scheduler
+from lynx.feed_refresher import FeedRefresher, FeedRefreshResult
+from lynx.models import Feed
+
+RSS_CONTENT = b'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Test Feed</title><link>https://example.com</link>
+<item><title>First</title><link>https://example.com/1</link><guid>1</guid><description>One</description><pubDate>Mon, 01 Jan 2024 00:00:00 GMT</pubDate></item>
+<item><title>Second</title><link>https://example.com/2</link><guid>2</guid><description>Two</description><pubDate>Mon, 01 Jan 2024 02:00:00 GMT</pubDate></item>
+<item><title>Third</title><link>https://example.com/3</link><guid>3</guid><description>Three</description><pubDate>Mon, 01 Jan 2024 04:00:00 GMT</pubDate></item>
+</channel></rss>'''
+
+
+def make_result(feed: Feed,
+                status: int = 200,
+                headers: dict = {},
+                entries: list = [],
+                new_entries: list = [],
+                error: Exception | None = None) -> FeedRefreshResult:
+  if error is not None:
+    return FeedRefreshResult(feed, error=error)
+  loader = MagicMock()
+  loader.remote = feedparser.FeedParserDict(status=status,
+                                            headers=headers,
+                                            entries=entries)
+  loader.get_new_entries.return_value = new_entries
+  return FeedRefreshResult(feed, loader=loader)
+
+
+class ComputeScheduleTest(TestCase):
+
+  def setUp(self):
+    self.now = timezone.now()
+    self.feed = Feed(feed_name='Test Feed',
+                     feed_url='https://example.com/feed.xml',
+                     poll_interval_seconds=3600,
+                     consecutive_failures=0)
+
+  def test_unchanged_feed_backs_off(self):
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, status=304), self.now)
+    self.assertEqual(schedule.poll_interval, timedelta(minutes=90))
+    self.assertEqual(schedule.next_poll_at, self.now + timedelta(minutes=90))
+
+  def test_interval_follows_publish_frequency(self):
+    entries = feedparser.parse(RSS_CONTENT).entries
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, entries=entries, new_entries=[object()]),
+        self.now)
+    self.assertEqual(schedule.poll_interval, timedelta(hours=2))
+
+  def test_interval_is_clamped(self):
+    self.feed.poll_interval_seconds = int(
+        feed_scheduler.MAX_POLL_INTERVAL.total_seconds())
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, status=304), self.now)
+    self.assertEqual(schedule.poll_interval, feed_scheduler.MAX_POLL_INTERVAL)
+
+    self.feed.poll_interval_seconds = 60
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, new_entries=[object()]), self.now)
+    self.assertEqual(schedule.poll_interval, feed_scheduler.MIN_POLL_INTERVAL)
+
+  def test_errors_back_off_exponentially(self):
+    self.feed.consecutive_failures = 2
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, error=httpx.ConnectError('boom')), self.now)
+    self.assertEqual(schedule.consecutive_failures, 3)
+    self.assertEqual(schedule.poll_interval, timedelta(hours=1))
+    self.assertEqual(schedule.next_poll_at, self.now + timedelta(hours=8))
+
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, status=500), self.now)
+    self.assertEqual(schedule.consecutive_failures, 3)
+
+    schedule = feed_scheduler.compute_schedule(make_result(self.feed),
+                                               self.now)
+    self.assertEqual(schedule.consecutive_failures, 0)
+
+  def test_long_failure_runs_stay_at_max_backoff(self):
+    self.feed.consecutive_failures = 1000
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, error=httpx.ConnectError('boom')), self.now)
+    self.assertEqual(schedule.consecutive_failures, 1001)
+    self.assertEqual(schedule.next_poll_at,
+                     self.now + feed_scheduler.MAX_ERROR_BACKOFF)
+
+  def test_respects_cache_control(self):
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed,
+                    headers={'cache-control': 'public, max-age=86400'}),
+        self.now)
+    self.assertEqual(schedule.next_poll_at, self.now + timedelta(days=1))
+    # The server's request doesn't change the feed's own interval
+    self.assertEqual(schedule.poll_interval, timedelta(minutes=90))
+
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed,
+                    headers={'cache-control': 'no-cache, max-age=86400'}),
+        self.now)
+    self.assertEqual(schedule.next_poll_at, self.now + timedelta(minutes=90))
+
+  def test_respects_retry_after(self):
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, status=429, headers={'retry-after': '36000'}),
+        self.now)
+    self.assertEqual(schedule.next_poll_at, self.now + timedelta(hours=10))
+
+    retry_at = self.now.replace(microsecond=0) + timedelta(hours=20)
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed,
+                    status=503,
+                    headers={
+                        'retry-after':
+                        retry_at.strftime('%a, %d %b %Y %H:%M:%S GMT')
+                    }), self.now)
+    self.assertEqual(schedule.next_poll_at, retry_at)
+
+  def test_server_delay_is_capped(self):
+    schedule = feed_scheduler.compute_schedule(
+        make_result(self.feed, headers={'retry-after': str(365 * 86400)}),
+        self.now)
+    self.assertEqual(
+        schedule.next_poll_at,
+        self.now + feed_scheduler.MAX_SERVER_REQUESTED_DELAY)
+
+
+class PollDueFeedsTest(TestCase):
+
+  async def test_polls_due_feeds_for_all_users(self):
+    now = timezone.now()
+    user1 = await User.objects.acreate(username='user1')
+    user2 = await User.objects.acreate(username='user2')
+    never_polled = await Feed.objects.acreate(
+        user=user1, feed_name='New', feed_url='https://a.example.com/feed')
+    overdue = await Feed.objects.acreate(
+        user=user2,
+        feed_name='Overdue',
+        feed_url='https://b.example.com/feed',
+        next_poll_at=now - timedelta(minutes=5))
+    await Feed.objects.acreate(user=user1,
+                               feed_name='Not due',
+                               feed_url='https://c.example.com/feed',
+                               next_poll_at=now + timedelta(hours=1))
+    await Feed.objects.acreate(user=user2,
+                               feed_name='Deleted',
+                               feed_url='https://d.example.com/feed',
+                               is_deleted=True)
+    requested = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      requested.append(request.url.host)
+      return httpx.Response(200,
+                            content=RSS_CONTENT,
+                            headers={'Cache-Control': 'max-age=7200'})
+
+    results = await feed_scheduler.poll_due_feeds(
+        10, FeedRefresher(transport=httpx.MockTransport(handler)))
+    self.assertEqual(len(results), 2)
+    self.assertCountEqual(requested, ['a.example.com', 'b.example.com'])
+
+    for feed in [never_polled, overdue]:
+      await sync_to_async(feed.refresh_from_db)()
+      self.assertEqual(feed.poll_interval_seconds, 7200)
+      self.assertGreaterEqual(feed.next_poll_at, now + timedelta(hours=2))
+      self.assertEqual(feed.consecutive_failures, 0)
+
+    # Nothing is due any more
+    self.assertEqual(await feed_scheduler.poll_due_feeds(10), [])
+
+  async def test_limit_takes_most_overdue_first(self):
+    now = timezone.now()
+    user = await User.objects.acreate(username='user')
+    await Feed.objects.acreate(user=user,
+                               feed_name='Recent',
+                               feed_url='https://example.com/recent',
+                               next_poll_at=now - timedelta(minutes=1))
+    await Feed.objects.acreate(user=user,
+                               feed_name='Never',
+                               feed_url='https://example.com/never')
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      return httpx.Response(304)
+
+    results = await feed_scheduler.poll_due_feeds(
+        1, FeedRefresher(transport=httpx.MockTransport(handler)))
+    self.assertEqual([r.feed.feed_name for r in results], ['Never'])
+    self.assertLessEqual(await feed_scheduler.get_next_poll_at(), now)
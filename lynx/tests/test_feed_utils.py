@@ -0,0 +1,65 @@
+import io
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.test import TestCase
+import feedparser
+from lynx.feed_utils import RemoteFeedLoader
+from lynx.models import Feed, FeedItem
+
+
+def build_remote(guids: list[str]) -> feedparser.FeedParserDict:
+  items = ''.join(
+      f'<item><title>Item {guid}</title><link>https://example.com/{guid}</link>'
+      f'<guid>{guid}</guid><description>Item {guid}</description>'
+      f'<pubDate>Mon, 01 Jan 2024 00:00:0{i} GMT</pubDate></item>'
+      for i, guid in enumerate(guids))
+  content = f'<?xml version="1.0"?><rss version="2.0"><channel><title>Feed</title>{items}</channel></rss>'
+  return feedparser.parse(io.BytesIO(content.encode()))
+
+
+class PersistNewFeedItemsTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    self.feed = Feed.objects.create(user=self.user,
+                                    feed_name='Feed',
+                                    feed_url='https://example.com/feed.xml')
+
+  def test_inserts_all_items_in_one_query(self):
+    loader = RemoteFeedLoader(self.user, None,
+                              feed=self.feed).load_remote_feed(
+                                  build_remote(['a', 'b', 'c']))
+    with self.assertNumQueries(1):
+      loader.persist_new_feed_items()
+    self.assertEqual(len(loader.get_new_entries()), 3)
+    self.assertEqual(loader.get_skipped_count(), 0)
+    self.assertTrue(all(item.pk for item in loader.get_new_entries()))
+    self.assertEqual(FeedItem.objects.filter(feed=self.feed).count(), 3)
+
+  def test_skips_existing_and_repeated_guids(self):
+    FeedItem.objects.create(feed=self.feed,
+                            title='Existing',
+                            url='https://example.com/a',
+                            guid='a')
+    loader = RemoteFeedLoader(self.user, None, feed=self.feed).load_remote_feed(
+        build_remote(['a', 'b', 'b'])).persist_new_feed_items()
+    self.assertEqual([item.guid for item in loader.get_new_entries()], ['b'])
+    self.assertEqual(loader.get_skipped_count(), 2)
+    self.assertEqual(FeedItem.objects.filter(feed=self.feed).count(), 2)
+
+  @patch('lynx.signals.add_feed_item_to_library')
+  def test_auto_add_signal_only_fires_for_new_items(self, mock_add):
+    self.feed.auto_add_feed_items_to_library = True
+    self.feed.save()
+    existing = FeedItem.objects.create(feed=self.feed,
+                                       title='Existing',
+                                       url='https://example.com/a',
+                                       guid='a')
+    mock_add.reset_mock()
+
+    loader = RemoteFeedLoader(self.user, None, feed=self.feed).load_remote_feed(
+        build_remote(['a', 'b', 'c'])).persist_new_feed_items()
+    new_pks = sorted(item.pk for item in loader.get_new_entries())
+    self.assertNotIn(existing.pk, new_pks)
+    self.assertEqual(
+        sorted(call.args[1] for call in mock_add.call_args_list), new_pks)
@@ -0,0 +1,202 @@
+import asyncio
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from lynx import jobs
+from lynx.models import Job
+
+calls = []
+in_flight = 0
+max_in_flight = 0
+
+
+@jobs.job()
+async def record(value):
+  calls.append(value)
+  return value
+
+
+@jobs.job(max_attempts=2)
+async def fail():
+  raise ValueError('Something went wrong')
+
+
+@jobs.job(queue='slow')
+async def slow(number):
+  global in_flight, max_in_flight
+  in_flight += 1
+  max_in_flight = max(max_in_flight, in_flight)
+  await asyncio.sleep(0.01)
+  in_flight -= 1
+
+
+@jobs.job(timeout=timedelta(seconds=0.01))
+async def hang():
+  await asyncio.sleep(10)
+
+
+class JobsTest(TestCase):
+
+  def setUp(self):
+    global in_flight, max_in_flight
+    calls.clear()
+    in_flight = 0
+    max_in_flight = 0
+
+  def worker(self, **queues) -> jobs.JobWorker:
+    return jobs.JobWorker(queues or {'default': 4},
+                          poll_interval=0.01,
+                          worker_id='test')
+
+  async def test_runs_queued_jobs(self):
+    queued = await sync_to_async(record)('first')
+    await sync_to_async(record)(value='second')
+
+    await self.worker().run(burst=True)
+
+    self.assertEqual(sorted(calls), ['first', 'second'])
+    await queued.arefresh_from_db()
+    self.assertEqual(queued.status, Job.Status.COMPLETE)
+    self.assertEqual(queued.attempts, 1)
+    self.assertEqual(queued.result, 'first')
+    self.assertIsNotNone(queued.finished_at)
+
+  def test_claimed_jobs_are_not_claimed_again(self):
+    record('first')
+    record('second')
+    claimed = jobs.claim_jobs('default', 1, 'first-worker')
+    self.assertEqual(len(claimed), 1)
+    self.assertEqual(claimed[0].status, Job.Status.RUNNING)
+
+    others = jobs.claim_jobs('default', 10, 'second-worker')
+    self.assertEqual(len(others), 1)
+    self.assertNotEqual(others[0].pk, claimed[0].pk)
+    self.assertEqual(jobs.claim_jobs('default', 10, 'third-worker'), [])
+
+  def test_expired_claims_are_claimed_again(self):
+    queued = record('first')
+    claimed, = jobs.claim_jobs('default', 1, 'crashed-worker')
+    Job.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+
+    reclaimed, = jobs.claim_jobs('default', 1, 'other-worker')
+    self.assertEqual(reclaimed.pk, queued.pk)
+    self.assertEqual(reclaimed.attempts, 2)
+
+    # The first worker finishing late doesn't overwrite the new claim
+    jobs.finish_job(claimed)
+    queued.refresh_from_db()
+    self.assertEqual(queued.status, Job.Status.RUNNING)
+    self.assertEqual(queued.locked_by, 'other-worker')
+
+  def test_jobs_are_only_claimed_when_due(self):
+    queued = record('later')
+    Job.objects.filter(pk=queued.pk).update(run_at=timezone.now() +
+                                            timedelta(minutes=1))
+    self.assertEqual(jobs.claim_jobs('default', 1, 'worker'), [])
+
+  async def test_retries_failed_jobs_with_backoff(self):
+    queued = await sync_to_async(fail)()
+    await self.worker().run(burst=True)
+
+    await queued.arefresh_from_db()
+    self.assertEqual(queued.status, Job.Status.PENDING)
+    self.assertEqual(queued.attempts, 1)
+    self.assertEqual(queued.last_error, 'Something went wrong')
+    self.assertGreater(queued.run_at,
+                       timezone.now() + jobs.RETRY_BASE_DELAY / 2)
+
+    await Job.objects.filter(pk=queued.pk).aupdate(run_at=timezone.now())
+    await self.worker().run(burst=True)
+    await queued.arefresh_from_db()
+    self.assertEqual(queued.status, Job.Status.FAILED)
+    self.assertEqual(queued.attempts, 2)
+
+  def test_retry_delay_grows_up_to_a_limit(self):
+    self.assertEqual(jobs.get_retry_delay(1), jobs.RETRY_BASE_DELAY)
+    self.assertEqual(jobs.get_retry_delay(3), jobs.RETRY_BASE_DELAY * 4)
+    self.assertEqual(jobs.get_retry_delay(50), jobs.RETRY_MAX_DELAY)
+
+  async def test_limits_concurrency_per_queue(self):
+    await sync_to_async(slow.enqueue_many)((i,) for i in range(10))
+    await self.worker(slow=3).run(burst=True)
+    self.assertEqual(max_in_flight, 3)
+    self.assertEqual(
+        await Job.objects.filter(status=Job.Status.COMPLETE).acount(), 10)
+
+  async def test_only_runs_its_queues(self):
+    await sync_to_async(slow)(1)
+    await self.worker(default=1).run(burst=True)
+    self.assertEqual(await Job.objects.filter(status=Job.Status.PENDING).acount(),
+                     1)
+
+  async def test_cancels_jobs_past_their_timeout(self):
+    queued = await sync_to_async(hang)()
+    await self.worker().run(burst=True)
+    await queued.arefresh_from_db()
+    self.assertEqual(queued.status, Job.Status.PENDING)
+    self.assertEqual(queued.last_error, 'TimeoutError')
+
+  def test_unknown_jobs_fail(self):
+    queued = Job.objects.create(name='lynx.tasks.does_not_exist')
+    self.assertEqual(jobs.claim_jobs('default', 1, 'worker'), [])
+    queued.refresh_from_db()
+    self.assertEqual(queued.status, Job.Status.FAILED)
+
+  def test_deletes_old_finished_jobs(self):
+    old = record('old')
+    Job.objects.filter(pk=old.pk).update(status=Job.Status.COMPLETE,
+                                         finished_at=timezone.now() -
+                                         timedelta(days=30))
+    pending = record('pending')
+    self.assertEqual(jobs.delete_finished_jobs(), 1)
+    self.assertEqual(list(Job.objects.values_list('pk', flat=True)),
+                     [pending.pk])
+
+  def test_pending_duplicates_are_queued_once(self):
+    first = record('first')
+    self.assertEqual(record('first').pk, first.pk)
+    record('second')
+    self.assertEqual(Job.objects.count(), 2)
+
+    # Once it's started, changes since then need another run
+    jobs.claim_jobs('default', 10, 'worker')
+    self.assertNotEqual(record('first').pk, first.pk)
+    self.assertEqual(Job.objects.count(), 3)
+
+  def test_enqueue_many(self):
+    inserted = record.enqueue_many([('first',), ('second',), ('first',)])
+    self.assertEqual(len(inserted), 2)
+    self.assertTrue(all(job.pk is not None for job in inserted))
+    added = record.enqueue_many([('first',), ('third',)])
+    self.assertEqual([job.args for job in added], [['third']])
+    self.assertEqual(Job.objects.count(), 3)
+
+  def test_batch_inserts_jobs_together(self):
+    with CaptureQueriesContext(connection) as queries:
+      with jobs.JobBatch():
+        record('first')
+        record('second')
+        record('first')
+        fail()
+    self.assertEqual(len(queries), 1)
+    self.assertEqual(Job.objects.count(), 3)
+
+  def test_batch_is_dropped_when_block_raises(self):
+    with self.assertRaises(ValueError):
+      with jobs.JobBatch():
+        record('first')
+        raise ValueError('Save failed')
+    self.assertEqual(Job.objects.count(), 0)
+    # Jobs queued afterwards aren't batched anymore
+    record('second')
+    self.assertEqual(Job.objects.count(), 1)
+
+  async def test_async_batch(self):
+    async with jobs.JobBatch():
+      await sync_to_async(record)('first')
+      await sync_to_async(record)('second')
+      self.assertEqual(await Job.objects.acount(), 0)
+    self.assertEqual(await Job.objects.acount(), 2)
@@ -0,0 +1,98 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from lynx.models import Link, LinkArchive, Tag
+from lynx.views.paginator import PAGE_SIZE
+
+# The pages are rendered without running collectstatic first
+STATIC_STORAGES = {
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    }
+}
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class LinkListQueriesTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    self.tag = Tag.objects.create(user=self.user, name='Reading')
+    self.other_tag = Tag.objects.create(user=self.user, name='Later')
+    self.client.force_login(self.user)
+
+  def create_links(self, count: int):
+    start = Link.objects.count()
+    for i in range(start, start + count):
+      link = Link.objects.create(user=self.user,
+                                 original_url=f'https://example.com/{i}',
+                                 cleaned_url=f'https://example.com/{i}',
+                                 title=f'Link {i}',
+                                 article_date=timezone.now(),
+                                 read_time_seconds=12)
+      link.tags.set([self.tag, self.other_tag])
+      LinkArchive.objects.create(user=self.user, link=link)
+
+  def count_queries(self, url: str) -> int:
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(url)
+    self.assertEqual(response.status_code, 200)
+    return len(queries)
+
+  def assert_constant_queries(self, url: str):
+    self.create_links(1)
+    one_row = self.count_queries(url)
+    self.create_links(PAGE_SIZE)
+    full_page = self.count_queries(url)
+    self.assertEqual(one_row, full_page)
+
+  def test_links_feed_queries_do_not_grow_with_rows(self):
+    self.assert_constant_queries('/links/')
+
+  def test_tagged_links_queries_do_not_grow_with_rows(self):
+    self.assert_constant_queries(f'/links/tagged/{self.tag.slug}/')
+
+  def test_list_shows_tags_and_archives(self):
+    self.create_links(1)
+    response = self.client.get('/links/')
+    self.assertContains(response, 'Reading')
+    self.assertContains(response, 'Later')
+    self.assertContains(response, 'View archive')
+
+
+class HasArchiveTest(TestCase):
+
+  def test_has_archive_follows_archive(self):
+    user = User.objects.create(username='user')
+    link = Link.objects.create(user=user,
+                               original_url='https://example.com',
+                               cleaned_url='https://example.com',
+                               article_date=timezone.now(),
+                               read_time_seconds=12)
+    self.assertFalse(link.has_archive)
+
+    archive = LinkArchive.objects.create(user=user, link=link)
+    link.refresh_from_db()
+    self.assertTrue(link.has_archive)
+
+    archive.delete()
+    link.refresh_from_db()
+    self.assertFalse(link.has_archive)
+
+  def test_saving_stale_link_keeps_has_archive(self):
+    user = User.objects.create(username='user')
+    link = Link.objects.create(user=user,
+                               original_url='https://example.com',
+                               cleaned_url='https://example.com',
+                               article_date=timezone.now(),
+                               read_time_seconds=12)
+    LinkArchive.objects.create(user=user, link=link)
+    # This instance still thinks there's no archive
+    link.title = 'New title'
+    link.save()
+
+    link.refresh_from_db()
+    self.assertEqual(link.title, 'New title')
+    self.assertTrue(link.has_archive)
@@ -0,0 +1,169 @@
+import asyncio
+import httpx
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import TestCase
+from lynx import page_fetcher
+from lynx.errors import UrlParseError
+from lynx.models import UserCookie, UserSetting
+from lynx.page_fetcher import PageFetcher
+
+
+class PageFetcherTest(TestCase):
+  # Responses are served from self.response
+
+  def setUp(self):
+    page_fetcher._profiles.clear()
+    self.requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+      self.requests.append(request)
+      return self.response
+
+    self.response = httpx.Response(200, html='<html></html>')
+
+    self.fetcher = PageFetcher(transport=httpx.MockTransport(handler))
+
+  async def create_user(self, username: str) -> User:
+    user = await User.objects.acreate(username=username)
+    await UserSetting.objects.acreate(
+        user=user, headers_for_scraping={'user-agent': username})
+    await UserCookie.objects.acreate(user=user,
+                                     cookie_name='session',
+                                     cookie_value=username,
+                                     cookie_domain='example.com')
+    return user
+
+  async def test_applies_each_users_headers_and_cookies(self):
+    first = await self.create_user('first')
+    second = await self.create_user('second')
+    await self.fetcher.fetch('https://example.com/page', first)
+    await self.fetcher.fetch('https://example.com/page', second)
+    await self.fetcher.fetch('https://other.com/page', first)
+
+    self.assertEqual(
+        [request.headers['user-agent'] for request in self.requests],
+        ['first', 'second', 'first'])
+    self.assertEqual(self.requests[0].headers['cookie'], 'session=first')
+    self.assertEqual(self.requests[1].headers['cookie'], 'session=second')
+    self.assertNotIn('cookie', self.requests[2].headers)
+
+  def fetch_twice(self, user):
+    for _ in range(2):
+      async_to_sync(self.fetcher.fetch)('https://example.com/page', user)
+
+  def test_caches_scraping_settings(self):
+    user = User.objects.create(username='user')
+    UserSetting.objects.create(user=user)
+    with self.assertNumQueries(2):
+      self.fetch_twice(user)
+
+    # Changing a cookie reloads them on the next fetch
+    UserCookie.objects.create(user=user,
+                              cookie_name='session',
+                              cookie_value='value',
+                              cookie_domain='example.com')
+    with self.assertNumQueries(2):
+      self.fetch_twice(user)
+    self.assertEqual(self.requests[-1].headers['cookie'], 'session=value')
+
+  async def test_one_fetcher_per_event_loop(self):
+    self.assertIs(page_fetcher.get_page_fetcher(),
+                  page_fetcher.get_page_fetcher())
+
+  def test_fetcher_is_closed_with_its_loop(self):
+
+    async def get_fetcher() -> PageFetcher:
+      return page_fetcher.get_page_fetcher()
+
+    with patch.object(PageFetcher, 'aclose') as mock_aclose:
+      first = async_to_sync(get_fetcher)()
+      second = async_to_sync(get_fetcher)()
+    self.assertIsNot(first, second)
+    self.assertEqual(mock_aclose.await_count, 2)
+    self.assertNotIn(first, page_fetcher._fetchers.values())
+
+  async def fetch(self, **kwargs) -> page_fetcher.FetchedPage:
+    user = await User.objects.acreate(username='user')
+    fetcher = PageFetcher(transport=self.fetcher.transport, **kwargs)
+    return await fetcher.fetch('https://example.com/page', user)
+
+  async def test_refuses_other_content_types(self):
+    self.response = httpx.Response(200,
+                                   headers={'Content-Type': 'application/pdf'},
+                                   content=b'%PDF')
+    with self.assertRaisesRegex(UrlParseError, 'application/pdf'):
+      await self.fetch()
+
+  async def test_refuses_large_pages_from_their_length(self):
+    self.response = httpx.Response(200,
+                                   headers={
+                                       'Content-Type': 'text/html',
+                                       'Content-Length': '1000000'
+                                   })
+    with self.assertRaisesRegex(UrlParseError, 'larger than 100 bytes'):
+      await self.fetch(max_bytes=100)
+
+  async def test_stops_downloading_past_the_limit(self):
+    chunks_sent = 0
+
+    async def endless():
+      nonlocal chunks_sent
+      while True:
+        chunks_sent += 1
+        yield b'<p>' + b'a' * 60 + b'</p>'
+
+    self.response = httpx.Response(200,
+                                   headers={'Content-Type': 'text/html'},
+                                   content=endless())
+    with self.assertRaises(UrlParseError):
+      await self.fetch(max_bytes=1000)
+    self.assertLess(chunks_sent, 20)
+
+  async def test_decodes_with_declared_charset(self):
+    self.response = httpx.Response(
+        200,
+        headers={'Content-Type': 'text/html; charset=iso-8859-1'},
+        content='<p>café</p>'.encode('iso-8859-1'))
+    page = await self.fetch()
+    self.assertEqual(page.text, '<p>café</p>')
+    self.assertEqual(page.status_code, 200)
+
+  async def test_decodes_with_meta_charset(self):
+    html = '<html><head><meta charset="windows-1252"></head><p>naïve</p>'
+    self.response = httpx.Response(200,
+                                   headers={'Content-Type': 'text/html'},
+                                   content=html.encode('windows-1252'))
+    page = await self.fetch()
+    self.assertEqual(page.text, html)
+
+  async def test_defaults_to_utf8(self):
+    self.response = httpx.Response(200, content='<p>日本語</p>'.encode('utf-8'))
+    page = await self.fetch()
+    self.assertEqual(page.text, '<p>日本語</p>')
+
+  async def test_http_errors(self):
+    self.response = httpx.Response(404, text='Not found')
+    with self.assertRaisesRegex(UrlParseError, '404'):
+      await self.fetch()
+
+  async def test_limits_fetches_per_host(self):
+    user = await self.create_user('user')
+    fetcher = PageFetcher(max_per_host=2,
+                          transport=httpx.MockTransport(self.slow_handler))
+    self.running = 0
+    self.most_running = 0
+    await asyncio.gather(*[
+        fetcher.fetch(f'https://example.com/{i}', user) for i in range(5)
+    ])
+    self.assertEqual(self.most_running, 2)
+    # Hosts are forgotten once nothing is fetching from them
+    self.assertEqual(fetcher._host_limits, {})
+
+  async def slow_handler(self, request: httpx.Request) -> httpx.Response:
+    self.running += 1
+    self.most_running = max(self.most_running, self.running)
+    await asyncio.sleep(0.01)
+    self.running -= 1
+    return httpx.Response(200, html='<html></html>')
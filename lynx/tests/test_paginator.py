@@ -0,0 +1,178 @@
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.http import HttpRequest, QueryDict
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lynx.models import Feed, FeedItem, Link, Note, Tag
+from lynx.views import paginator
+
+
+def make_request(query: str = '') -> HttpRequest:
+  request = HttpRequest()
+  request.GET = QueryDict(query)
+  return request
+
+
+class CursorPaginatorTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    now = timezone.now()
+    # Pairs of links share an added_at so the pk has to break the ties
+    Link.objects.bulk_create([
+        Link(user=self.user,
+             added_at=now - timedelta(minutes=i // 2),
+             original_url=f'https://example.com/{i}',
+             cleaned_url=f'https://example.com/{i}',
+             article_date=now.date(),
+             title=f'Link {i}',
+             read_time_seconds=1) for i in range(40)
+    ])
+    self.expected = list(
+        Link.objects.filter(user=self.user).order_by('-added_at',
+                                                     '-pk').values_list(
+                                                         'pk', flat=True))
+
+  async def get_page(self, query: str = '') -> paginator.CursorPage:
+    data = await paginator.generate_cursor_paginator_context_data(
+        make_request(query), Link.objects.filter(user=self.user),
+        ['-added_at', '-pk'])
+    return data['paginator_page']
+
+  async def test_walks_forwards_and_backwards(self):
+    pages = [await self.get_page()]
+    self.assertFalse(pages[0].has_previous())
+    while pages[-1].has_next():
+      pages.append(await self.get_page(pages[-1].next_query))
+    self.assertEqual(len(pages), 3)
+    self.assertEqual([link.pk for page in pages for link in page],
+                     self.expected)
+
+    page = pages[-1]
+    self.assertFalse(page.has_next())
+    for expected_page in reversed(pages[:-1]):
+      page = await self.get_page(page.previous_query)
+      self.assertEqual([link.pk for link in page],
+                       [link.pk for link in expected_page])
+    self.assertFalse(page.has_previous())
+
+  async def test_last_page(self):
+    page = await self.get_page(
+        f'{paginator.CURSOR_BEFORE_PARAMETER}={paginator.LAST_PAGE}')
+    self.assertEqual([link.pk for link in page], self.expected[-15:])
+    self.assertTrue(page.has_previous())
+    self.assertFalse(page.has_next())
+
+  async def test_invalid_cursor_shows_first_page(self):
+    page = await self.get_page(f'{paginator.CURSOR_AFTER_PARAMETER}=garbage')
+    self.assertEqual([link.pk for link in page], self.expected[:15])
+
+  async def test_cursor_with_wrong_types_shows_first_page(self):
+    for cursor in [
+        paginator.encode_cursor(['abc', 1]),
+        paginator.encode_cursor([timezone.now(), 'abc']),
+        paginator.encode_cursor([{}, []]),
+    ]:
+      for param in [
+          paginator.CURSOR_AFTER_PARAMETER, paginator.CURSOR_BEFORE_PARAMETER
+      ]:
+        page = await self.get_page(f'{param}={cursor}')
+        self.assertEqual([link.pk for link in page], self.expected[:15])
+        self.assertFalse(page.has_previous())
+
+  async def test_keeps_other_parameters(self):
+    page = await self.get_page('q=test&page=3')
+    self.assertEqual(QueryDict(page.next_query)['q'], 'test')
+    self.assertNotIn('page', QueryDict(page.next_query))
+    self.assertNotIn(paginator.CURSOR_AFTER_PARAMETER,
+                     QueryDict(page.previous_query))
+
+  async def test_estimated_total(self):
+    page = await self.get_page()
+    self.assertIsNotNone(page.estimated_total)
+    data = await paginator.generate_cursor_paginator_context_data(
+        make_request(), Link.objects.filter(user=self.user),
+        ['-added_at', '-pk'],
+        estimate_total=False)
+    self.assertIsNone(data['paginator_page'].estimated_total)
+
+  def test_deep_pages_do_not_count(self):
+    request = make_request()
+    page = None
+    while page is None or page.has_next():
+      # One query for the rows and one EXPLAIN for the estimate, however
+      # deep the page is.
+      with self.assertNumQueries(2):
+        page = paginator._get_cursor_page(request,
+                                          Link.objects.filter(user=self.user),
+                                          ['-added_at', '-pk'], True)
+      request = make_request(page.next_query)
+
+  @override_settings(STORAGES={
+      'default': {
+          'BACKEND': 'django.core.files.storage.FileSystemStorage'
+      },
+      'staticfiles': {
+          'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+      },
+  })
+  def test_links_feed_view(self):
+    self.client.force_login(self.user)
+    response = self.client.get(reverse('lynx:links_feed'))
+    self.assertEqual(response.status_code, 200)
+    page = response.context['paginator_page']
+    self.assertEqual([link.pk for link in page], self.expected[:15])
+
+    response = self.client.get(
+        f'{reverse("lynx:links_feed")}?{page.next_query}')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual([link.pk for link in response.context['paginator_page']],
+                     self.expected[15:30])
+
+  @override_settings(STORAGES={
+      'default': {
+          'BACKEND': 'django.core.files.storage.FileSystemStorage'
+      },
+      'staticfiles': {
+          'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+      },
+  })
+  def test_other_list_views(self):
+    self.client.force_login(self.user)
+    tag = Tag.objects.create(user=self.user, name='tagged')
+    for link in Link.objects.filter(user=self.user):
+      link.tags.add(tag)
+    feed = Feed.objects.create(user=self.user,
+                               feed_name='Feed',
+                               feed_url='https://example.com/feed')
+    FeedItem.objects.bulk_create([
+        FeedItem(feed=feed,
+                 title=f'Item {i}',
+                 guid=str(i),
+                 url=f'https://example.com/{i}',
+                 pub_date=None if i % 3 == 0 else timezone.now())
+        for i in range(20)
+    ])
+    Note.objects.bulk_create(
+        [Note(user=self.user, content=f'Note {i}') for i in range(20)])
+
+    for url, count in [
+        (f'{reverse("lynx:links_feed")}?q=link', 40),
+        (reverse('lynx:links_feed_tagged', args=[tag.slug]), 40),
+        (reverse('lynx:feed_items', args=[feed.pk]), 20),
+        (reverse('lynx:all_notes'), 20),
+        (f'{reverse("lynx:all_notes")}?q=note', 20),
+    ]:
+      seen = []
+      response = self.client.get(url)
+      while True:
+        self.assertEqual(response.status_code, 200, url)
+        page = response.context['paginator_page']
+        seen.extend(item.pk for item in page)
+        self.assertLessEqual(len(seen), count, url)
+        if not page.has_next():
+          break
+        response = self.client.get(f'{url.split("?")[0]}?{page.next_query}')
+      self.assertEqual(len(seen), count, url)
+      self.assertEqual(len(set(seen)), count, url)
@@ -0,0 +1,92 @@
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from lynx import html_cleaner
+from lynx.models import Link
+from lynx.url_context import UrlContext
+from lynx.url_parser import parse_content
+
+ARTICLE_HTML = ('<h2>First</h2><p>Some text</p>'
+                '<a class="image-link" href="https://example.com/a.png">x</a>'
+                '<h2>Second</h2><p>More text</p>')
+
+# The pages are rendered without running collectstatic first
+STATIC_STORAGES = {
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+    }
+}
+
+
+@override_settings(STORAGES=STATIC_STORAGES)
+class TestReaderView(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='reader')
+    self.client = AsyncClient()
+    self.client.force_login(self.user)
+
+  async def create_link(self, **kwargs) -> Link:
+    return await Link.objects.acreate(user=self.user,
+                                      original_url='https://example.com/post',
+                                      cleaned_url='https://example.com/post',
+                                      article_date=timezone.now(),
+                                      read_time_seconds=12,
+                                      article_html=ARTICLE_HTML,
+                                      **kwargs)
+
+  def test_reader_view_is_rendered_when_content_is_parsed(self):
+    parsed = parse_content(UrlContext('https://example.com/post', None),
+                           '<html><body><article>' + ARTICLE_HTML +
+                           '</article></body></html>')
+    reader_html, table_of_contents = html_cleaner.render_reader_view(
+        parsed['article_html'])
+    self.assertEqual(parsed['reader_html'], reader_html)
+    self.assertEqual(parsed['table_of_contents'], table_of_contents)
+
+  def test_render_reader_view(self):
+    reader_html, table_of_contents = html_cleaner.render_reader_view(
+        ARTICLE_HTML)
+    self.assertIn('id="heading_1"', reader_html)
+    self.assertIn('<img src="https://example.com/a.png"/>', reader_html)
+    self.assertEqual(table_of_contents, [{
+        'id': 'heading_1',
+        'display': 'First'
+    }, {
+        'id': 'heading_2',
+        'display': 'Second'
+    }])
+
+  async def test_stored_reader_view_is_served_without_parsing(self):
+    link = await self.create_link(reader_html='<p>Stored</p>',
+                                  table_of_contents=[{
+                                      'id': 'heading_1',
+                                      'display': 'Stored heading'
+                                  }])
+    with patch('lynx.html_cleaner.HTMLCleaner') as mock_cleaner:
+      response = await self.client.get(f'/links/{link.pk}/view')
+    mock_cleaner.assert_not_called()
+    self.assertEqual(response.status_code, 200)
+    self.assertContains(response, '<p>Stored</p>')
+    self.assertContains(response, 'Stored heading')
+
+  async def test_missing_reader_view_is_rendered_and_stored(self):
+    link = await self.create_link()
+    response = await self.client.get(f'/links/{link.pk}/view')
+    self.assertEqual(response.status_code, 200)
+    self.assertContains(response, 'href="#heading_2"')
+
+    link = await Link.objects_with_full_content.aget(pk=link.pk)
+    self.assertIn('id="heading_1"', link.reader_html)
+    self.assertEqual(len(link.table_of_contents), 2)
+
+  async def test_viewing_only_updates_last_viewed_at(self):
+    link = await self.create_link(reader_html='<p>Stored</p>')
+    updated_at = link.updated_at
+    response = await self.client.get(f'/links/{link.pk}/view')
+    self.assertEqual(response.status_code, 200)
+
+    link = await Link.objects.aget(pk=link.pk)
+    self.assertIsNotNone(link.last_viewed_at)
+    self.assertEqual(link.updated_at, updated_at)
@@ -0,0 +1,126 @@
+import io
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from lynx import reextraction
+from lynx.models import Job, Link, Reextraction
+
+
+async def fake_parse_content(url_context, content: str) -> dict:
+  if 'broken' in content:
+    raise ValueError('Unable to parse')
+  return {
+      'article_date': timezone.now(),
+      'author': 'Author',
+      'title': content.upper(),
+      'excerpt': '',
+      'article_html': f'<p>{content}</p>',
+      'reader_html': f'<p>{content}</p>',
+      'table_of_contents': [],
+      'raw_text_content': content,
+      'header_image_url': '',
+      'read_time_seconds': 12,
+      'read_time_display': '1 min',
+  }
+
+
+class ReextractionTest(TestCase):
+
+  def setUp(self):
+    self.user = User.objects.create(username='user')
+    self.other_user = User.objects.create(username='other')
+    self.links = [
+        self.create_link(f'page {i}', hostname='example.com')
+        for i in range(5)
+    ]
+
+  def create_link(self, content: str, user=None, **kwargs) -> Link:
+    link = Link.objects.create(user=user or self.user,
+                               original_url=f'https://example.com/{content}',
+                               cleaned_url=f'https://example.com/{content}',
+                               article_date=datetime(2024, 1, 2).date(),
+                               author='Author',
+                               title=content,
+                               article_html=f'<p>{content}</p>',
+                               reader_html=f'<p>{content}</p>',
+                               raw_text_content=content,
+                               full_page_html=content,
+                               read_time_seconds=12,
+                               read_time_display='1 min',
+                               **kwargs)
+    return link
+
+  def run_reextraction(self, batch_size=2, **filters) -> Reextraction:
+    run = Reextraction.objects.create(
+        filters=reextraction.build_filters(**filters))
+    call_command('reextractlinks',
+                 resume=run.pk,
+                 batch_size=batch_size,
+                 stdout=io.StringIO())
+    run.refresh_from_db()
+    return run
+
+  @patch('lynx.extraction.parse_content')
+  def test_updates_links_that_changed(self, mock_parse_content):
+    mock_parse_content.side_effect = fake_parse_content
+    unchanged = self.create_link('PAGE', hostname='example.com')
+    broken = self.create_link('broken', hostname='example.com')
+
+    run = self.run_reextraction()
+
+    self.assertEqual(run.status, Reextraction.Status.COMPLETE)
+    self.assertEqual(run.total_links, 7)
+    self.assertEqual(run.processed_links, 7)
+    self.assertEqual(run.updated_links, 5)
+    self.assertEqual(run.failed_links, 1)
+    link = Link.objects_with_full_content.get(pk=self.links[0].pk)
+    self.assertEqual(link.title, 'PAGE 0')
+    # Pages without a date keep the one they had
+    self.assertEqual(link.article_date, datetime(2024, 1, 2).date())
+    unchanged_updated_at = unchanged.updated_at
+    unchanged.refresh_from_db()
+    self.assertEqual(unchanged.updated_at, unchanged_updated_at)
+    broken.refresh_from_db()
+    self.assertEqual(broken.title, 'broken')
+
+  @patch('lynx.extraction.parse_content')
+  def test_filters_links(self, mock_parse_content):
+    mock_parse_content.side_effect = fake_parse_content
+    self.create_link('elsewhere', hostname='other.com')
+    self.create_link('other user', user=self.other_user, hostname='example.com')
+    old = self.create_link('old', hostname='example.com')
+    Link.objects.filter(pk=old.pk).update(added_at=timezone.now() -
+                                          timedelta(days=30))
+
+    run = self.run_reextraction(user_id=self.user.pk,
+                                hostname='example.com',
+                                added_after=timezone.now().date() -
+                                timedelta(days=7))
+    self.assertEqual(run.total_links, 5)
+    self.assertEqual(run.updated_links, 5)
+    self.assertEqual(Link.objects.get(pk=old.pk).title, 'old')
+
+  @patch('lynx.extraction.parse_content')
+  def test_resumes_after_last_saved_link(self, mock_parse_content):
+    mock_parse_content.side_effect = fake_parse_content
+    run = Reextraction.objects.create(status=Reextraction.Status.RUNNING,
+                                      total_links=5,
+                                      processed_links=3,
+                                      last_link_id=self.links[2].pk)
+    call_command('reextractlinks', resume=run.pk, stdout=io.StringIO())
+
+    self.assertEqual(mock_parse_content.call_count, 2)
+    run.refresh_from_db()
+    self.assertEqual(run.processed_links, 5)
+    self.assertEqual(Link.objects.get(pk=self.links[2].pk).title, 'page 2')
+    self.assertEqual(Link.objects.get(pk=self.links[3].pk).title, 'PAGE 3')
+
+  def test_queues_background_job(self):
+    out = io.StringIO()
+    call_command('reextractlinks', user='user', background=True, stdout=out)
+    run = Reextraction.objects.get()
+    self.assertEqual(run.filters, {'user_id': self.user.pk})
+    self.assertEqual(Job.objects.get().args, [run.pk])
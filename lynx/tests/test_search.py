@@ -1,7 +1,10 @@
+from datetime import timedelta
+from unittest.mock import patch
 from django.utils import timezone
 from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
-from lynx.models import Link, Tag
+from lynx.models import Link, Note, Tag
 from lynx.utils.search import (query_models, SEARCH_QUERY_PARAMETER,
                                SEARCH_TAG_PARAMETER, SEARCH_UNREAD_PARAMETER,
                                SEARCH_UNREAD_READ_ONLY_VALUE,
@@ -85,3 +88,51 @@ class SearchTestCase(TestCase):
     queryset, _ = query_models(Link.objects.filter(user=other_user),
                                request)
     self.assertEqual(queryset.count(), 0)
+
+  def test_search_ranks_matches(self):
+    weak = self.create_test_link(title='Tomatoes')
+    strong = self.create_test_link(title='Tomatoes',
+                                   excerpt='Growing tomatoes',
+                                   raw_text_content='Tomatoes and tomatoes')
+    self.create_test_link(title='Unrelated')
+
+    request = HttpRequest()
+    request.GET[SEARCH_QUERY_PARAMETER] = 'tomatoes'
+    queryset, _ = query_models(Link.objects.all(), request)
+    self.assertEqual([link.pk for link in queryset], [strong.pk, weak.pk])
+
+  def test_search_only_ranks_most_recent_candidates(self):
+    now = timezone.now()
+    old = self.create_test_link(title='Tomatoes',
+                                added_at=now - timedelta(days=2))
+    recent = self.create_test_link(title='Tomatoes',
+                                   added_at=now - timedelta(days=1))
+    newest = self.create_test_link(title='Tomatoes', added_at=now)
+
+    request = HttpRequest()
+    request.GET[SEARCH_QUERY_PARAMETER] = 'tomatoes'
+    with patch('lynx.utils.search.SEARCH_CANDIDATE_LIMIT', 2):
+      queryset, _ = query_models(Link.objects.all(), request)
+      pks = {link.pk for link in queryset}
+    self.assertEqual(pks, {recent.pk, newest.pk})
+    self.assertNotIn(old.pk, pks)
+
+  def test_search_notes(self):
+    user, _ = User.objects.get_or_create(username='default_user')
+    note = Note.objects.create(user=user, content='Tomatoes are a fruit')
+    Note.objects.create(user=user, content='Something else')
+
+    request = HttpRequest()
+    request.GET[SEARCH_QUERY_PARAMETER] = 'tomato'
+    queryset, _ = query_models(Note.objects.filter(user=user), request)
+    self.assertEqual([n.pk for n in queryset], [note.pk])
+
+  def test_search_can_use_index(self):
+    request = HttpRequest()
+    request.GET[SEARCH_QUERY_PARAMETER] = 'tomatoes'
+    queryset, _ = query_models(Link.objects.all(), request)
+    with connection.cursor() as cursor:
+      # The test tables are tiny, so make sure the planner doesn't just
+      # scan them instead.
+      cursor.execute('SET LOCAL enable_seqscan = off')
+    self.assertIn('lynx_link_search_idx', queryset.explain())
@@ -0,0 +1,127 @@
+import json
+from django.contrib.auth.models import User
+from django.test import AsyncClient, TestCase, override_settings
+from django.utils import timezone
+from lynx import api_keys, summary_cache
+from lynx.models import Link, SummaryCacheEntry, UserSetting
+from lynx.url_summarizer import Summarizer, generate_and_persist_summary
+from lynx.tests.test_url_summarizer import LocalProvider
+
+ARTICLE = 'An article about tomatoes.\n\nIt has two paragraphs.'
+
+
+class SummaryCacheTest(TestCase):
+
+  def setUp(self):
+    summary_cache.metrics.reset()
+    summary_cache._inserts_since_prune = 0
+
+  async def create_link(self, username: str, text: str = ARTICLE,
+                        model: str = 'gpt-3.5-turbo') -> Link:
+    user, _ = await User.objects.aget_or_create(username=username)
+    await UserSetting.objects.aupdate_or_create(user=user,
+                                                defaults={
+                                                    'openai_api_key': 'key',
+                                                    'summarization_model':
+                                                    model,
+                                                })
+    return await Link.objects.acreate(user=user,
+                                      original_url='https://example.com',
+                                      cleaned_url='https://example.com',
+                                      article_date=timezone.now(),
+                                      raw_text_content=text,
+                                      read_time_seconds=12)
+
+  async def summarize(self, link: Link, provider: LocalProvider) -> Link:
+    return await generate_and_persist_summary(
+        link, Summarizer({'openai': provider}))
+
+  async def test_same_article_is_summarized_once(self):
+    provider = LocalProvider()
+    first = await self.summarize(await self.create_link('first'), provider)
+    # Saved by another user, and reparsed with different whitespace
+    second = await self.summarize(await self.create_link('second'), provider)
+    third = await self.summarize(
+        await self.create_link('third', text=' '.join(ARTICLE.split())),
+        provider)
+
+    self.assertEqual(len(provider.prompts), 1)
+    self.assertEqual(second.summary, first.summary)
+    self.assertEqual(third.summary, first.summary)
+    snapshot = summary_cache.metrics.snapshot()
+    self.assertEqual(snapshot['hits'], 2)
+    self.assertEqual(snapshot['misses'], 1)
+    self.assertGreater(snapshot['tokens_saved'], 0)
+    entry = await SummaryCacheEntry.objects.aget()
+    self.assertEqual(entry.hit_count, 2)
+
+  async def test_cache_is_per_model(self):
+    provider = LocalProvider()
+    await self.summarize(await self.create_link('first'), provider)
+    await self.summarize(await self.create_link('second', model='gpt-4'),
+                         provider)
+    self.assertEqual(len(provider.prompts), 2)
+
+  async def test_can_be_bypassed(self):
+    provider = LocalProvider()
+    await self.summarize(await self.create_link('first'), provider)
+    link = await self.create_link('second')
+    await generate_and_persist_summary(
+        link, Summarizer({'openai': provider}, use_cache=False))
+    self.assertEqual(len(provider.prompts), 2)
+
+  @override_settings(LYNX_SUMMARY_CACHE_MAX_ENTRIES=2,
+                     LYNX_SUMMARY_CACHE_PRUNE_INTERVAL=1)
+  async def test_evicts_least_recently_used(self):
+    provider = LocalProvider()
+    oldest = await self.summarize(await self.create_link('a', text='First'),
+                                  provider)
+    await self.summarize(await self.create_link('b', text='Second'), provider)
+    # Using the first summary again makes the second one the oldest
+    await self.summarize(await self.create_link('c', text='First'), provider)
+    await self.summarize(await self.create_link('d', text='Third'), provider)
+
+    self.assertEqual(await SummaryCacheEntry.objects.acount(), 2)
+    self.assertEqual(summary_cache.metrics.snapshot()['evictions'], 1)
+    self.assertEqual(await summary_cache.get_cached_summary('First',
+                                                            'gpt-3.5-turbo'),
+                     oldest.summary)
+    self.assertIsNone(await summary_cache.get_cached_summary(
+        'Second', 'gpt-3.5-turbo'))
+
+  @override_settings(LYNX_SUMMARY_CACHE_MAX_ENTRIES=1,
+                     LYNX_SUMMARY_CACHE_PRUNE_INTERVAL=3)
+  async def test_prunes_every_few_inserts(self):
+    provider = LocalProvider()
+    for i, text in enumerate(['First', 'Second']):
+      await self.summarize(await self.create_link(str(i), text=text), provider)
+    self.assertEqual(await SummaryCacheEntry.objects.acount(), 2)
+
+    await self.summarize(await self.create_link('2', text='Third'), provider)
+    self.assertEqual(await SummaryCacheEntry.objects.acount(), 1)
+    self.assertEqual(summary_cache.metrics.snapshot()['evictions'], 2)
+
+  async def test_metrics_endpoint(self):
+    provider = LocalProvider()
+    await self.summarize(await self.create_link('first'), provider)
+    await self.summarize(await self.create_link('second'), provider)
+    setting = await UserSetting.objects.select_related('user').aget(
+        user__username='first')
+    api_keys.set_api_key(setting, 'test_api_key')
+    await setting.asave()
+
+    response = await AsyncClient().get('/api/summaries/cache/metrics',
+                                       X_API_KEY='test_api_key')
+    self.assertEqual(response.status_code, 403)
+
+    setting.user.is_staff = True
+    await setting.user.asave()
+    api_keys.invalidate_api_keys(setting)
+    response = await AsyncClient().get('/api/summaries/cache/metrics',
+                                       X_API_KEY='test_api_key')
+    self.assertEqual(response.status_code, 200)
+    data = json.loads(response.content.decode())
+    self.assertEqual(data['hits'], 1)
+    self.assertEqual(data['entries'], 1)
+    self.assertEqual(data['total_hits'], 1)
+    self.assertGreater(data['total_tokens_saved'], 0)
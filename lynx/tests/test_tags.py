@@ -6,7 +6,7 @@ from unittest.mock import AsyncMock, Mock, mock_open, patch
 from lynx.models import Link, Tag
 from lynx.url_summarizer import generate_and_persist_summary
 from lynx.errors import TagError
-from lynx.tag_manager import delete_tag_for_user, create_tag_for_user, add_tags_to_link, remove_tags_from_link, set_tags_on_link
+from lynx.tag_manager import delete_tag_for_user, create_tag_for_user, add_tags_to_link, add_tags_to_links, remove_tags_from_link, remove_tags_from_links, set_tags_on_link, set_tags_on_links
 from django.utils import timezone
 from django.http.response import Http404
 
@@ -169,4 +169,55 @@ class TagsTestCase(TestCase):
     self.assertEqual(link.user, user)
 
     with self.assertRaises(TagError):
-      await set_tags_on_link([tag1, tag2, tag3], link)
\ No newline at end of file
+      await set_tags_on_link([tag1, tag2, tag3], link)
+
+  async def test_tag_changes_do_not_query_tag_owners(self):
+    user, _= await User.objects.aget_or_create(username='user1')
+    tags = [await create_tag_for_user(user, f'tag{i}') for i in range(5)]
+    link = await self.create_test_link(user=user)
+
+    with patch('lynx.tag_manager.sync_to_async',
+               wraps=sync_to_async) as mock_sync_to_async:
+      await add_tags_to_link(tags, link)
+    mock_sync_to_async.assert_called_once()
+    self.assertEqual(5, await link.tags.acount())
+
+  async def test_add_and_remove_tags_on_many_links(self):
+    user, _= await User.objects.aget_or_create(username='user1')
+    tag1 = await create_tag_for_user(user, 'tag1')
+    tag2 = await create_tag_for_user(user, 'tag2')
+    links = [
+        await self.create_test_link(user=user,
+                                    original_url=f'https://example.com/{i}')
+        for i in range(3)
+    ]
+    await add_tags_to_link([tag1], links[0])
+
+    await add_tags_to_links(user, [tag1, tag2], [link.pk for link in links])
+    for link in links:
+      self.assertEqual(2, await link.tags.acount())
+
+    await remove_tags_from_links(user, [tag1], [links[0].pk, links[1].pk])
+    self.assertEqual([tag2], [tag async for tag in links[0].tags.all()])
+    self.assertEqual([tag2], [tag async for tag in links[1].tags.all()])
+    self.assertEqual(2, await links[2].tags.acount())
+
+    await set_tags_on_links(user, [tag1], [link.pk for link in links])
+    for link in links:
+      self.assertEqual([tag1], [tag async for tag in link.tags.all()])
+
+  async def test_tags_on_many_links_checks_user(self):
+    user, _= await User.objects.aget_or_create(username='user1')
+    user2, _= await User.objects.aget_or_create(username='user2')
+    tag = await create_tag_for_user(user, 'tag1')
+    other_tag = await create_tag_for_user(user2, 'tag1')
+    link = await self.create_test_link(user=user)
+    other_link = await self.create_test_link(
+        user=user2, original_url='https://example.com/other')
+
+    with self.assertRaises(TagError):
+      await add_tags_to_links(user, [tag], [link.pk, other_link.pk])
+    with self.assertRaises(TagError):
+      await add_tags_to_links(user, [tag, other_tag], [link.pk])
+    self.assertEqual(0, await link.tags.acount())
+    self.assertEqual(0, await other_link.tags.acount())
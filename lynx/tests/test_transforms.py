@@ -1,4 +1,5 @@
 from unittest import TestCase
+from lynx.html_tree import parse_html
 from lynx.transforms import apply_all_transforms
 from bs4 import BeautifulSoup
 from typing import Optional
@@ -88,3 +89,12 @@ class TestTextTransforms(TestCase):
         fail_msg=
         'Absolute img sources should be kept but relative sources should be converted to absolute',
     )
+
+  def test_accepts_preparsed_tree(self):
+    tree = parse_html(
+        '<html><body><article>Check out this <a href="/post2">link</a>!</article></body></html>'
+    )
+    soup = apply_all_transforms(tree, UrlContext('http://test.com', None))
+    self.assertEqual(
+        '<html><body id="readabilityBody"><article>Check out this <a href="http://test.com/post2">link</a>!</article></body></html>',
+        str(soup))
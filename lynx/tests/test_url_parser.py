@@ -0,0 +1,25 @@
+from unittest import TestCase
+from unittest.mock import patch
+from lynx import html_tree
+from lynx.url_context import UrlContext
+from lynx.url_parser import parse_content
+
+
+class TestParseContent(TestCase):
+
+  def test_page_is_only_parsed_once(self):
+    content = '<html><head><title>A title</title></head><body><article><p>Some article text.</p></article></body></html>'
+    with patch('lynx.url_parser.parse_html',
+               wraps=html_tree.parse_html) as mock_parse_html, \
+        patch('readability.readability.build_doc') as mock_build_doc:
+      parse_content(UrlContext('http://test.com', None), content)
+      mock_parse_html.assert_called_once_with(content)
+      mock_build_doc.assert_not_called()
+
+  def test_falls_back_to_tree_for_title_and_text(self):
+    content = '<html><head><title>Fallback title</title><script>var x = 1;</script></head><body><p>hi</p></body></html>'
+    with patch('lynx.url_parser.trafilatura.extract') as mock_extract:
+      mock_extract.return_value = None
+      parsed = parse_content(UrlContext('http://test.com', None), content)
+    self.assertEqual(parsed['title'], 'Fallback title')
+    self.assertEqual(parsed['raw_text_content'], 'Fallback titlehi')
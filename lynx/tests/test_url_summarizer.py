@@ -1,10 +1,15 @@
+import asyncio
 from asgiref.sync import sync_to_async
 from django.contrib.auth.models import User
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from unittest.mock import AsyncMock, Mock, mock_open, patch, ANY
-from lynx.models import Link, UserSetting
-from lynx.url_summarizer import generate_and_persist_summary
+from lynx.models import Job, Link, UserSetting
+from lynx.tasks import queue_pending_summaries, summarize_pending_links_in_background
+from lynx.url_summarizer import (CHARS_PER_TOKEN, COMBINE_PROMPT,
+                                 SUMMARIZE_PROMPT, RateLimiter, Summarizer,
+                                 SummaryProvider, generate_and_persist_summary,
+                                 summarize_pending_links)
 from lynx.errors import NoAPIKeyInSettings
 from django.utils import timezone
 
@@ -154,4 +159,199 @@ class AnthropicUrlSummarizerTest(TestCase):
     await generate_and_persist_summary(link)
 
     mock_anthropic.return_value.messages.create.assert_called_once_with(
-        model=summarization_model, messages=ANY, max_tokens=1024, system=ANY)
\ No newline at end of file
+        model=summarization_model, messages=ANY, max_tokens=1024, system=ANY)
+
+class LocalClient:
+
+  def __init__(self, api_key: str):
+    self.api_key = api_key
+    self.closed = False
+
+  async def close(self):
+    self.closed = True
+
+
+class LocalProvider(SummaryProvider):
+  # Stands in for a real API, summarizing prompts by their length
+  api_key_setting = 'openai_api_key'
+
+  def __init__(self, delay: float = 0):
+    self.delay = delay
+    self.clients = []
+    self.prompts = []
+    self.in_flight = 0
+    self.max_in_flight = 0
+
+  def create_client(self, api_key: str):
+    client = LocalClient(api_key)
+    self.clients.append(client)
+    return client
+
+  async def complete(self, client, model: str, prompt: str) -> str:
+    self.in_flight += 1
+    self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    await asyncio.sleep(self.delay)
+    self.in_flight -= 1
+    self.prompts.append(prompt)
+    return f'Summary of {len(prompt)} characters'
+
+
+class SummarizePendingLinksTest(TestCase):
+
+  async def create_user(self, username: str, api_key: str) -> User:
+    user = await User.objects.acreate(username=username)
+    await set_usersettings_value(user, openai_api_key=api_key)
+    return user
+
+  async def test_summarizes_pending_links_in_batches(self):
+    first = await self.create_user('first', 'key-1')
+    second = await self.create_user('second', 'key-1')
+    third = await self.create_user('third', 'key-2')
+    no_key = await self.create_user('no_key', '')
+    for user in [first, second, third]:
+      for i in range(2):
+        await create_test_link(user=user,
+                               original_url=f'https://example.com/{i}',
+                               raw_text_content=f'{user.username} {i}',
+                               summary_pending=True)
+    await create_test_link(user=no_key, summary_pending=True)
+    await create_test_link(user=first,
+                           summary='Already summarized',
+                           summary_pending=True)
+    await create_test_link(user=first)
+
+    provider = LocalProvider()
+    summarized = await summarize_pending_links(
+        batch_size=3, providers={'openai': provider})
+
+    self.assertEqual(summarized, 6)
+    self.assertEqual(len(provider.prompts), 6)
+    # One client per API key, closed once the queue is drained
+    self.assertEqual(sorted(client.api_key for client in provider.clients),
+                     ['key-1', 'key-2'])
+    self.assertTrue(all(client.closed for client in provider.clients))
+    self.assertFalse(await Link.objects.filter(summary_pending=True).aexists())
+    self.assertEqual(
+        await Link.objects.filter(summary__startswith='Summary of').acount(),
+        6)
+    self.assertTrue(await Link.objects.filter(
+        summary='Already summarized').aexists())
+    self.assertEqual(await Link.objects.filter(summary='').acount(), 2)
+
+  @override_settings(LYNX_SUMMARY_MAX_CONCURRENCY=2)
+  async def test_limits_concurrent_requests(self):
+    user = await self.create_user('user', 'key')
+    for i in range(6):
+      await create_test_link(user=user,
+                             original_url=f'https://example.com/{i}',
+                             raw_text_content=f'Article {i}',
+                             summary_pending=True)
+    provider = LocalProvider(delay=0.01)
+    await summarize_pending_links(providers={'openai': provider})
+    self.assertEqual(len(provider.prompts), 6)
+    self.assertEqual(provider.max_in_flight, 2)
+
+  @override_settings(LYNX_SUMMARY_INPUT_TOKEN_BUDGET=100)
+  async def test_truncates_long_articles(self):
+    user = await self.create_user('user', 'key')
+    link = await create_test_link(user=user,
+                                  raw_text_content='word ' * 1000)
+    provider = LocalProvider()
+    await generate_and_persist_summary(link, Summarizer({'openai': provider}))
+    self.assertEqual(len(provider.prompts), 1)
+    self.assertLessEqual(len(provider.prompts[0]),
+                         len(SUMMARIZE_PROMPT) + 100 * CHARS_PER_TOKEN)
+
+  @override_settings(LYNX_SUMMARY_INPUT_TOKEN_BUDGET=100,
+                     LYNX_SUMMARY_MAX_CHUNKS=3)
+  async def test_summarizes_long_articles_in_parts(self):
+    user = await self.create_user('user', 'key')
+    link = await create_test_link(user=user,
+                                  raw_text_content='word ' * 1000)
+    provider = LocalProvider()
+    await generate_and_persist_summary(link, Summarizer({'openai': provider}))
+    self.assertEqual(len(provider.prompts), 4)
+    self.assertTrue(provider.prompts[-1].startswith(COMBINE_PROMPT))
+    self.assertTrue(link.summary.startswith('Summary of'))
+
+  @patch('lynx.signals.queue_pending_summaries')
+  async def test_new_links_are_marked_pending(self, mock_queue):
+    user = await self.create_user('user', 'key')
+    await set_usersettings_value(user, automatically_summarize_new_links=True)
+    link = await create_test_link(user=user)
+    await sync_to_async(link.refresh_from_db)()
+    self.assertTrue(link.summary_pending)
+    mock_queue.assert_called_once()
+
+  async def test_concurrent_runs_summarize_each_link_once(self):
+    user = await self.create_user('user', 'key')
+    for i in range(6):
+      await create_test_link(user=user,
+                             original_url=f'https://example.com/{i}',
+                             raw_text_content=f'Article {i}',
+                             summary_pending=True)
+    provider = LocalProvider(delay=0.01)
+    results = await asyncio.gather(
+        summarize_pending_links(batch_size=2, providers={'openai': provider}),
+        summarize_pending_links(batch_size=2, providers={'openai': provider}))
+    self.assertEqual(sum(results), 6)
+    self.assertEqual(len(provider.prompts), 6)
+    self.assertEqual(len(set(provider.prompts)), 6)
+
+  async def test_failed_links_stay_pending(self):
+    user = await self.create_user('user', 'key')
+    link = await create_test_link(user=user, summary_pending=True)
+    provider = LocalProvider()
+    provider.complete = AsyncMock(side_effect=RuntimeError('boom'))
+    self.assertEqual(
+        await summarize_pending_links(providers={'openai': provider}), 0)
+    provider.complete.assert_called_once()
+    await link.arefresh_from_db()
+    self.assertTrue(link.summary_pending)
+    self.assertEqual(link.summary, '')
+
+  def test_providers_must_implement_every_method(self):
+
+    class IncompleteProvider(SummaryProvider):
+
+      def create_client(self, api_key: str):
+        return LocalClient(api_key)
+
+    with self.assertRaises(TypeError):
+      IncompleteProvider()
+
+  def test_queues_one_task_for_many_links(self):
+    queue_pending_summaries()
+    queue_pending_summaries()
+    self.assertEqual(
+        Job.objects.filter(
+            name=summarize_pending_links_in_background.name).count(), 1)
+
+
+class RateLimiterTest(TestCase):
+
+  def setUp(self):
+    self.now = 1000.0
+    self.sleeps = []
+
+  async def fake_sleep(self, seconds: float):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+  async def make_requests(self, limiter: RateLimiter, tokens: list[int]):
+
+    async def request():
+      return self.now
+
+    with patch('lynx.url_summarizer.asyncio.sleep', self.fake_sleep):
+      return [await limiter.run(count, request) for count in tokens]
+
+  async def test_limits_requests_per_minute(self):
+    limiter = RateLimiter(10, 2, 10000, clock=lambda: self.now)
+    started = await self.make_requests(limiter, [1, 1, 1])
+    self.assertEqual(started, [1000.0, 1000.0, 1060.0])
+
+  async def test_limits_tokens_per_minute(self):
+    limiter = RateLimiter(10, 100, 100, clock=lambda: self.now)
+    started = await self.make_requests(limiter, [60, 30, 20, 500])
+    self.assertEqual(started, [1000.0, 1000.0, 1060.0, 1120.0])
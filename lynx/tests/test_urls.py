@@ -0,0 +1,66 @@
+import importlib
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+from lynx.models import Link
+from lynx.utils.urls import canonicalize_url, get_url_key
+
+
+class CanonicalizeUrlTest(TestCase):
+
+  def test_normalizes_scheme_and_host(self):
+    self.assertEqual(canonicalize_url('HTTP://WWW.Example.COM:80/Path'),
+                     'https://example.com/Path')
+    self.assertEqual(canonicalize_url('https://example.com:8443/'),
+                     'https://example.com:8443/')
+
+  def test_normalizes_path(self):
+    self.assertEqual(canonicalize_url('https://example.com'),
+                     'https://example.com/')
+    self.assertEqual(canonicalize_url('https://example.com/a/b/'),
+                     'https://example.com/a/b')
+
+  def test_strips_tracking_parameters_and_sorts_query(self):
+    self.assertEqual(
+        canonicalize_url('https://example.com/post?utm_source=rss&b=2&'
+                         'fbclid=abc&a=1&UTM_Medium=x#section'),
+        'https://example.com/post?a=1&b=2')
+
+  def test_keys_match_for_same_page(self):
+    self.assertEqual(get_url_key('http://example.com/post/?utm_source=x'),
+                     get_url_key('https://www.example.com/post'))
+    self.assertNotEqual(get_url_key('https://example.com/post?id=1'),
+                        get_url_key('https://example.com/post?id=2'))
+
+
+class UrlKeyBackfillTest(TestCase):
+
+  def create_link(self, user: User, url: str) -> Link:
+    return Link.objects.create(user=user,
+                               original_url=url,
+                               cleaned_url=url,
+                               article_date=timezone.now(),
+                               read_time_seconds=12)
+
+  def test_backfill_keeps_key_on_oldest_duplicate(self):
+    user = User.objects.create(username='user')
+    other_user = User.objects.create(username='other')
+    first = self.create_link(user, 'https://example.com/post')
+    Link.objects.filter(pk=first.pk).update(url_key=None)
+    # Saved before duplicates were checked by key
+    duplicate = self.create_link(user, 'https://example.com/post?utm_source=x')
+    Link.objects.filter(pk=duplicate.pk).update(url_key=None)
+    other = self.create_link(other_user, 'https://example.com/post')
+    Link.objects.filter(pk=other.pk).update(url_key=None)
+
+    migration = importlib.import_module('lynx.migrations.0014_link_url_key')
+    migration.backfill_url_keys(apps, None)
+
+    key = get_url_key('https://example.com/post')
+    first.refresh_from_db()
+    duplicate.refresh_from_db()
+    other.refresh_from_db()
+    self.assertEqual(first.url_key, key)
+    self.assertIsNone(duplicate.url_key)
+    self.assertEqual(other.url_key, key)
@@ -1,46 +1,79 @@
 from bs4 import BeautifulSoup
+from lxml.html import HtmlElement
 from readability import Document
+from readability.cleaners import html_cleaner
 from urllib.parse import urljoin, urlparse
 
 from lynx.errors import UrlParseError
+from lynx.html_tree import parse_html
 from .url_context import UrlContext
 
 
-def apply_all_transforms(html_content: str,
+def apply_all_transforms(html_content: str | HtmlElement,
                          url_context: UrlContext) -> BeautifulSoup:
-  soup = BeautifulSoup(html_content, features="lxml")
-  transforms = [
-      convert_image_links, readability_summarize, remove_styling,
-      relative_to_absolute_links
-  ]
-  for transform in transforms:
-    soup = transform(soup, url_context)
+  """
+  Run the full page through every transform. The full page is only ever
+  handled as an lxml tree; BeautifulSoup is only used for the (much smaller)
+  article that Readability produces. If a tree is passed in it is modified
+  in place.
+  """
+  if isinstance(html_content, HtmlElement):
+    tree = html_content
+  else:
+    tree = parse_html(html_content)
+
+  tree_transforms = [convert_image_links]
+  for tree_transform in tree_transforms:
+    tree = tree_transform(tree, url_context)
+
+  soup = readability_summarize(tree, url_context)
+  soup_transforms = [remove_styling, relative_to_absolute_links]
+  for soup_transform in soup_transforms:
+    soup = soup_transform(soup, url_context)
   return soup
 
 
-def convert_image_links(soup: BeautifulSoup,
-                        url_context: UrlContext) -> BeautifulSoup:
+def convert_image_links(tree: HtmlElement,
+                        url_context: UrlContext) -> HtmlElement:
   """
   Substack often uses <a class="image-link"> tags to link to images.
   This function replaces those links with <img> tags.
   """
-  for image_container in soup.find_all(class_="captioned-image-container"):
-    image_container.unwrap()
-  for image_container in soup.find_all(class_="image-link-expand"):
-    image_container.decompose()
+  for image_container in tree.find_class("captioned-image-container"):
+    image_container.drop_tag()
+  for image_container in tree.find_class("image-link-expand"):
+    image_container.drop_tree()
 
-  for link in soup.find_all('a', class_='image-link'):
-    link.replace_with(soup.new_tag('img', src=link['href']))
+  for link in tree.find_class('image-link'):
+    if link.tag != 'a':
+      continue
+    img = link.makeelement('img', src=link.get('href', ''))
+    # lxml keeps the text following an element on the element itself
+    img.tail = link.tail
+    link.getparent().replace(link, img)
 
-  return soup
+  return tree
+
+
+class TreeDocument(Document):
+  """
+  Readability Document that works from an already-parsed tree rather than
+  re-parsing its input every time it needs a fresh copy.
+  """
+
+  def _parse(self, input):
+    # clean_html works on a deep copy so the shared tree is left untouched
+    doc = html_cleaner.clean_html(input)
+    doc.resolve_base_href(handle_failures=self.handle_failures)
+    return doc
 
 
-def readability_summarize(soup: BeautifulSoup,
+def readability_summarize(tree: HtmlElement,
                           url_context: UrlContext) -> BeautifulSoup:
   """
   Strip out non-article content using Readability.
   """
-  readable_doc = Document(str(soup))
+  readable_doc = TreeDocument(tree)
   new_soup = BeautifulSoup(readable_doc.summary(), features="lxml")
   return new_soup
 
@@ -1,49 +1,59 @@
+from copy import deepcopy
+import hashlib
 import json
 from datetime import datetime
 from typing import Optional
 from django.http.request import HttpRequest
 
-from bs4 import BeautifulSoup
-import httpx
 import readtime
 from django.utils import timezone
-from readability import Document
 import trafilatura
 from trafilatura.settings import use_config
 from urllib.parse import urlparse
-from lynx.errors import UrlParseError
+from lynx import extraction, html_cleaner
+from lynx.html_tree import get_text_from_tree, get_title_from_tree, parse_html
 from lynx.transforms import apply_all_transforms
 
-from .models import Link, UserCookie, UserSetting
+from .models import Link
+from .page_fetcher import FetchedPage, get_page_fetcher
 from .url_context import UrlContext
 
 
+async def fetch_page(url_context: UrlContext,
+                     etag: str = '',
+                     modified: str = '') -> FetchedPage:
+  return await get_page_fetcher().fetch(url_context.url,
+                                        url_context.user,
+                                        etag=etag,
+                                        modified=modified)
+
+
 async def load_content_from_remote_url(url_context: UrlContext) -> str:
-  domain = urlparse(url_context.url).netloc
-  cookies = UserCookie.objects.filter(user=url_context.user,
-                                      cookie_domain=domain)
-  cookie_data = {
-      cookie.cookie_name: cookie.cookie_value
-      async for cookie in cookies
-  }
-  setting, _ = await UserSetting.objects.aget_or_create(user=url_context.user)
+  page = await fetch_page(url_context)
+  return page.text
 
-  try:
-    async with httpx.AsyncClient(cookies=cookie_data,
-                                 headers=setting.headers_for_scraping,
-                                 follow_redirects=True) as client:
-      response = await client.get(url_context.url)
-      response.raise_for_status()
-      return response.text
-  except httpx.HTTPError as e:
-    raise UrlParseError(str(e))
+
+def hash_page(content: str) -> str:
+  return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def get_page_validators(page: FetchedPage) -> dict[str, str]:
+  return {
+      'etag': page.headers.get('etag', ''),
+      'modified': page.headers.get('last-modified', ''),
+      'content_hash': hash_page(page.text),
+  }
 
 
 def parse_content(url_context: UrlContext, content: str) -> dict[str, str]:
+  # Parse the page once and share the tree with every stage below. Stages
+  # that modify the tree (trafilatura, the transforms) go last or get a copy.
+  tree = parse_html(content)
+
   # Required to avoid signals not on main thread error
   new_config = use_config()
   new_config.set("DEFAULT", "EXTRACTION_TIMEOUT", "0")
-  extracted_json_str = trafilatura.extract(content,
+  extracted_json_str = trafilatura.extract(deepcopy(tree),
                                            include_links=True,
                                            include_formatting=True,
                                            include_images=True,
@@ -57,9 +67,14 @@ def parse_content(url_context: UrlContext, content: str) -> dict[str, str]:
   article_date = datetime.strptime(json_meta['date'], '%Y-%m-%d').date(
   ) if 'date' in json_meta and json_meta['date'] else timezone.now()
 
-  summary_html = apply_all_transforms(content,
+  title = json_meta.get('title') or get_title_from_tree(tree)
+  raw_text_content = json_meta.get('raw_text') or get_text_from_tree(tree)
+
+  summary_html = apply_all_transforms(tree,
                                       url_context).prettify(formatter='html')
   read_time = readtime.of_html(summary_html)
+  reader_html, table_of_contents = html_cleaner.render_reader_view(
+      summary_html)
   domain = urlparse(url_context.url).netloc
   model_args = {
       'original_url': url_context.url,
@@ -68,10 +83,12 @@ def parse_content(url_context: UrlContext, content: str) -> dict[str, str]:
       'hostname': json_meta.get('hostname') or domain,
       'article_date': article_date,
       'author': json_meta.get('author') or 'Unknown Author',
-      'title': json_meta.get('title') or Document(content).title(),
+      'title': title,
       'excerpt': json_meta.get('excerpt') or '',
       'article_html': summary_html,
-      'raw_text_content': json_meta.get('raw_text') or BeautifulSoup(content).get_text(),
+      'reader_html': reader_html,
+      'table_of_contents': table_of_contents,
+      'raw_text_content': raw_text_content,
       'full_page_html': content,
       'header_image_url': json_meta.get('image') or '',
       'read_time_seconds': read_time.seconds,
@@ -84,20 +101,26 @@ async def parse_url(url: str,
                     user,
                     model_fields: Optional[dict] = None) -> Link:
   url_context = UrlContext(url, user)
-  content = await load_content_from_remote_url(url_context)
-  parsed_data = parse_content(url_context, content)
+  page = await fetch_page(url_context)
+  return await parse_page(url_context, page, model_fields)
+
+
+async def parse_page(url_context: UrlContext,
+                     page: FetchedPage,
+                     model_fields: Optional[dict] = None) -> Link:
+  parsed_data = await extraction.parse_content(url_context, page.text)
   if model_fields is None:
     model_fields = {}
 
-  return Link(**{**parsed_data, **model_fields})
+  return Link(**{**parsed_data, **get_page_validators(page), **model_fields})
 
 
-def parse_url_with_content(url: str,
-                           content: str,
-                           user,
-                           model_fields: Optional[dict] = None) -> Link:
+async def parse_url_with_content(url: str,
+                                 content: str,
+                                 user,
+                                 model_fields: Optional[dict] = None) -> Link:
   url_context = UrlContext(url, user)
-  parsed_data = parse_content(url_context, content)
+  parsed_data = await extraction.parse_content(url_context, content)
   if model_fields is None:
     model_fields = {}
   return Link(**{**parsed_data, **model_fields})
@@ -1,12 +1,279 @@
+import abc
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Optional
+
 from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
 from openai import AsyncOpenAI
 from anthropic import AsyncAnthropic
 from lynx.models import Link, UserSetting
 from lynx.errors import NoAPIKeyInSettings
-from typing import Optional
+from lynx import summary_cache
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "You are a helpful assistant."
+SUMMARIZE_PROMPT = "Summarize the following article:\n\n"
+COMBINE_PROMPT = ("The following are summaries of consecutive parts of one "
+                  "article. Combine them into a single summary:\n\n")
+SUMMARY_MAX_TOKENS = 1024
+# Rough size of a token in English text. Only used for budgeting, so it
+# doesn't need to match any model's tokenizer exactly.
+CHARS_PER_TOKEN = 4
+RATE_LIMIT_WINDOW_SECONDS = 60
+PENDING_BATCH_SIZE = 20
+
+
+def estimate_tokens(text: str) -> int:
+  return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_to_token_budget(text: str, token_budget: int,
+                          max_chunks: int) -> list[str]:
+  """
+  Splits text into at most `max_chunks` pieces of about `token_budget`
+  tokens each, preferring to break between paragraphs. Anything past the
+  last chunk is dropped.
+  """
+  limit = token_budget * CHARS_PER_TOKEN
+  chunks = []
+  while text and len(chunks) < max_chunks:
+    if len(text) <= limit:
+      chunks.append(text)
+      break
+    cut = text.rfind('\n', 0, limit)
+    if cut < limit // 2:
+      cut = text.rfind(' ', 0, limit)
+    if cut < limit // 2:
+      cut = limit
+    chunks.append(text[:cut].rstrip())
+    text = text[cut:].lstrip()
+  return chunks or ['']
+
+
+class RateLimiter:
+  """
+  Limits the number of requests in flight, and the number of requests and
+  tokens started in any rolling minute. A single request larger than the
+  token limit is still let through once the window is empty.
+  """
+
+  def __init__(self,
+               max_concurrency: int,
+               requests_per_minute: int,
+               tokens_per_minute: int,
+               clock: Callable[[], float] = time.monotonic):
+    self.requests_per_minute = requests_per_minute
+    self.tokens_per_minute = tokens_per_minute
+    self.clock = clock
+    self._concurrency = asyncio.Semaphore(max_concurrency)
+    self._lock = asyncio.Lock()
+    # (start time, tokens) of each request in the current window
+    self._window: deque[tuple[float, int]] = deque()
+    self._window_tokens = 0
+
+  def _expire(self, now: float):
+    window_start = now - RATE_LIMIT_WINDOW_SECONDS
+    while self._window and self._window[0][0] <= window_start:
+      _, tokens = self._window.popleft()
+      self._window_tokens -= tokens
+
+  def _wait_time(self, now: float, tokens: int) -> float:
+    if not self._window:
+      return 0
+    if (len(self._window) < self.requests_per_minute
+        and self._window_tokens + tokens <= self.tokens_per_minute):
+      return 0
+    return self._window[0][0] + RATE_LIMIT_WINDOW_SECONDS - now
+
+  async def _reserve(self, tokens: int):
+    async with self._lock:
+      while True:
+        now = self.clock()
+        self._expire(now)
+        wait = self._wait_time(now, tokens)
+        if wait <= 0:
+          self._window.append((now, tokens))
+          self._window_tokens += tokens
+          return
+        await asyncio.sleep(wait)
+
+  async def run(self, tokens: int, request):
+    async with self._concurrency:
+      await self._reserve(tokens)
+      return await request()
+
+
+class SummaryProvider(abc.ABC):
+  # An LLM API. Clients are created once per API key and shared.
+  api_key_setting: str = ''
+
+  @abc.abstractmethod
+  def create_client(self, api_key: str):
+    pass
+
+  @abc.abstractmethod
+  async def complete(self, client, model: str, prompt: str) -> Optional[str]:
+    pass
+
+
+class OpenAIProvider(SummaryProvider):
+  api_key_setting = 'openai_api_key'
+
+  def create_client(self, api_key: str):
+    return AsyncOpenAI(api_key=api_key)
+
+  async def complete(self, client, model: str, prompt: str) -> Optional[str]:
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[{
+            "role": "system",
+            "content": SYSTEM_PROMPT
+        }, {
+            "role": "user",
+            "content": prompt
+        }])
+    return response.choices[0].message.content
+
+
+class AnthropicProvider(SummaryProvider):
+  api_key_setting = 'anthropic_api_key'
 
+  def create_client(self, api_key: str):
+    return AsyncAnthropic(api_key=api_key)
 
-async def generate_and_persist_summary(link: Link) -> Link:
+  async def complete(self, client, model: str, prompt: str) -> Optional[str]:
+    response = await client.messages.create(
+        max_tokens=SUMMARY_MAX_TOKENS,
+        system=SYSTEM_PROMPT,
+        messages=[{
+            "role": "user",
+            "content": prompt
+        }],
+        model=model)
+    return response.content[0].text
+
+
+PROVIDERS: dict[str, SummaryProvider] = {
+    'openai': OpenAIProvider(),
+    'anthropic': AnthropicProvider(),
+}
+MODEL_PROVIDERS = {
+    UserSetting.SummarizationModel.GPT35TURBO: 'openai',
+    UserSetting.SummarizationModel.GPT35TURBO0125: 'openai',
+    UserSetting.SummarizationModel.GPT4: 'openai',
+    UserSetting.SummarizationModel.GPT4TURBO: 'openai',
+    UserSetting.SummarizationModel.CLAUDE3HAIKU: 'anthropic',
+    UserSetting.SummarizationModel.CLAUDE3SONNET: 'anthropic',
+    UserSetting.SummarizationModel.CLAUDE3OPUS: 'anthropic',
+}
+
+
+def get_provider_name(model: str) -> str:
+  if model not in MODEL_PROVIDERS:
+    raise ValueError(f"Unknown summarization model: {model}")
+  return MODEL_PROVIDERS[model]
+
+
+class Summarizer:
+  """
+  Summarizes text through the provider for each model, reusing one client
+  per API key and applying each provider's rate limits. Summaries are
+  looked up in the summary cache before any request is made. Articles longer
+  than LYNX_SUMMARY_INPUT_TOKEN_BUDGET are cut down to it, or if
+  LYNX_SUMMARY_MAX_CHUNKS allows, summarized in parts and then combined.
+
+  Clients and limits belong to the event loop the summarizer is used on,
+  so a summarizer shouldn't outlive it.
+  """
+
+  def __init__(self,
+               providers: Optional[dict[str, SummaryProvider]] = None,
+               use_cache: bool = True):
+    self.providers = providers if providers is not None else PROVIDERS
+    self.use_cache = use_cache
+    self.token_budget = settings.LYNX_SUMMARY_INPUT_TOKEN_BUDGET
+    self.max_chunks = max(1, settings.LYNX_SUMMARY_MAX_CHUNKS)
+    self._clients: dict[tuple[str, str], object] = {}
+    self._limiters: dict[str, RateLimiter] = {}
+
+  def _get_client(self, provider_name: str, api_key: str):
+    key = (provider_name, api_key)
+    if key not in self._clients:
+      self._clients[key] = self.providers[provider_name].create_client(api_key)
+    return self._clients[key]
+
+  def _get_limiter(self, provider_name: str) -> RateLimiter:
+    if provider_name not in self._limiters:
+      self._limiters[provider_name] = RateLimiter(
+          settings.LYNX_SUMMARY_MAX_CONCURRENCY,
+          settings.LYNX_SUMMARY_REQUESTS_PER_MINUTE,
+          settings.LYNX_SUMMARY_TOKENS_PER_MINUTE)
+    return self._limiters[provider_name]
+
+  def get_api_key(self, user_settings: UserSetting) -> str:
+    provider_name = get_provider_name(user_settings.summarization_model)
+    return getattr(user_settings,
+                   self.providers[provider_name].api_key_setting, '')
+
+  async def _complete(self, provider_name: str, api_key: str, model: str,
+                      prompt: str) -> tuple[Optional[str], int]:
+    # Returns the completion and roughly how many tokens it used
+    provider = self.providers[provider_name]
+    client = self._get_client(provider_name, api_key)
+    tokens = estimate_tokens(prompt) + SUMMARY_MAX_TOKENS
+    completion = await self._get_limiter(provider_name).run(
+        tokens, lambda: provider.complete(client, model, prompt))
+    used = estimate_tokens(prompt) + estimate_tokens(completion or '')
+    return completion, used
+
+  async def _generate(self, text: str, model: str,
+                      api_key: str) -> tuple[Optional[str], int]:
+    provider_name = get_provider_name(model)
+    chunks = split_to_token_budget(text, self.token_budget, self.max_chunks)
+    results = await asyncio.gather(*[
+        self._complete(provider_name, api_key, model, SUMMARIZE_PROMPT + chunk)
+        for chunk in chunks
+    ])
+    tokens = sum(used for _, used in results)
+    if len(results) == 1:
+      return results[0][0], tokens
+    summary, used = await self._complete(
+        provider_name, api_key, model,
+        COMBINE_PROMPT + '\n\n'.join(summary or '' for summary, _ in results))
+    return summary, tokens + used
+
+  async def summarize(self, text: str, model: str,
+                      api_key: str) -> Optional[str]:
+    # Unknown models fail before the cache is consulted
+    get_provider_name(model)
+    if self.use_cache:
+      cached = await summary_cache.get_cached_summary(text, model)
+      if cached is not None:
+        return cached
+    summary, tokens = await self._generate(text, model, api_key)
+    if summary and self.use_cache:
+      await summary_cache.cache_summary(text, model, summary, tokens)
+    return summary
+
+  async def aclose(self):
+    for client in self._clients.values():
+      await client.close()
+    self._clients = {}
+
+  async def __aenter__(self):
+    return self
+
+  async def __aexit__(self, *args):
+    await self.aclose()
+
+
+async def generate_and_persist_summary(
+    link: Link, summarizer: Optional[Summarizer] = None) -> Link:
   # Don't summarize if it's already summarized
   if link.summary:
     return link
@@ -14,29 +281,14 @@ async def generate_and_persist_summary(link: Link) -> Link:
   link_owner = await (sync_to_async(lambda: link.user)())
   user_settings, _ = await UserSetting.objects.aget_or_create(user=link_owner)
 
-  summary = None
-
-  model = user_settings.summarization_model
-  match model:
-    case UserSetting.SummarizationModel.GPT35TURBO | \
-        UserSetting.SummarizationModel.GPT35TURBO0125 | \
-        UserSetting.SummarizationModel.GPT4 | \
-        UserSetting.SummarizationModel.GPT4TURBO:
-      api_key = user_settings.openai_api_key
-      if not api_key:
-        raise NoAPIKeyInSettings()
-      summary = await summarize_openai(link, api_key, model)
-
-    case UserSetting.SummarizationModel.CLAUDE3HAIKU | \
-        UserSetting.SummarizationModel.CLAUDE3SONNET | \
-        UserSetting.SummarizationModel.CLAUDE3OPUS:
-      api_key = user_settings.anthropic_api_key
-      if not api_key:
-        raise NoAPIKeyInSettings()
-      summary = await summarize_anthropic(link, api_key, model)
-
-    case _:
-      raise ValueError(f"Unknown summarization model: {model}")
+  if summarizer is None:
+    summarizer = Summarizer()
+  api_key = summarizer.get_api_key(user_settings)
+  if not api_key:
+    raise NoAPIKeyInSettings()
+  summary = await summarizer.summarize(link.raw_text_content,
+                                       user_settings.summarization_model,
+                                       api_key)
 
   if summary:
     link.summary = summary
@@ -45,35 +297,75 @@ async def generate_and_persist_summary(link: Link) -> Link:
   return link
 
 
-async def summarize_openai(link: Link, api_key: str,
-                           model: str) -> Optional[str]:
-  client = AsyncOpenAI(api_key=api_key)
-
-  prompt_message = f"Summarize the following article:\n\n{link.raw_text_content}"
-
-  response = await client.chat.completions.create(
-      model=model,
-      messages=[{
-          "role": "system",
-          "content": "You are a helpful assistant."
-      }, {
-          "role": "user",
-          "content": prompt_message
-      }])
-
-  return response.choices[0].message.content
-
-
-async def summarize_anthropic(link: Link, api_key: str,
-                              model_name: str) -> Optional[str]:
-  client = AsyncAnthropic(api_key=api_key)
-  prompt_message = f"Summarize the following article:\n\n{link.raw_text_content}"
-  response = await client.messages.create(
-      max_tokens=1024,
-      system="You are a helpful assistant.",
-      messages=[{
-          "role": "user",
-          "content": prompt_message
-      }],
-      model=model_name)
-  return response.content[0].text
+async def _summarize_pending_link(summarizer: Summarizer, link: Link) -> bool:
+  # Returns whether the link was summarized. Links that can't be summarized
+  # (no API key) are skipped, errors from the provider are raised.
+  if link.summary:
+    return False
+  user_settings = link.user.usersetting
+  api_key = summarizer.get_api_key(user_settings)
+  if not api_key:
+    return False
+  summary = await summarizer.summarize(link.raw_text_content,
+                                       user_settings.summarization_model,
+                                       api_key)
+  link.summary = summary or ''
+  return bool(summary)
+
+
+def _claim_pending_links(batch_size: int, skipped: set[int]) -> list[int]:
+  # Clears the flag on a batch in the same transaction that selects it, so
+  # a run happening at the same time can't pick the same links. Rows
+  # locked by that run are skipped rather than waited on.
+  with transaction.atomic():
+    pks = list(
+        Link.objects.filter(summary_pending=True).exclude(
+            pk__in=skipped).select_for_update(skip_locked=True).order_by(
+                'pk').values_list('pk', flat=True)[:batch_size])
+    Link.objects.filter(pk__in=pks).update(summary_pending=False)
+  return pks
+
+
+async def summarize_pending_links(
+    batch_size: int = PENDING_BATCH_SIZE,
+    providers: Optional[dict[str, SummaryProvider]] = None) -> int:
+  """
+  Summarizes every link marked summary_pending, a batch at a time. Each
+  batch is claimed before any provider is called, so concurrent runs
+  don't summarize the same link twice. The links in a batch are
+  summarized concurrently, within the providers' rate limits, and saved
+  together. Links whose summary failed are marked pending again for the
+  next run. Returns the number of links summarized.
+  """
+  summarized = 0
+  failed: set[int] = set()
+  async with Summarizer(providers) as summarizer:
+    while True:
+      pks = await sync_to_async(_claim_pending_links)(batch_size, failed)
+      if not pks:
+        break
+      links = [
+          link async for link in Link.objects_with_full_content.filter(
+              pk__in=pks).select_related('user__usersetting').only(
+                  'pk', 'summary', 'raw_text_content', 'user__id',
+                  'user__usersetting__summarization_model',
+                  'user__usersetting__openai_api_key',
+                  'user__usersetting__anthropic_api_key')
+      ]
+      results = await asyncio.gather(
+          *[_summarize_pending_link(summarizer, link) for link in links],
+          return_exceptions=True)
+      retry = []
+      for link, result in zip(links, results):
+        if isinstance(result, BaseException):
+          logger.error('Failed to summarize link %s',
+                       link.pk,
+                       exc_info=result)
+          retry.append(link.pk)
+        elif result:
+          summarized += 1
+      await Link.objects.abulk_update(links, ['summary'])
+      if retry:
+        failed.update(retry)
+        await Link.objects.filter(pk__in=retry).aupdate(summary_pending=True)
+  return summarized
@@ -1,6 +1,7 @@
 from typing import Optional, Tuple
 from django.contrib.postgres.search import SearchQuery, SearchRank
-from django.db.models import F, Manager
+from django.db.models import F, FloatField, Manager, QuerySet
+from django.db.models.functions import Cast
 from django.http import HttpRequest
 from enum import Enum
 
@@ -12,6 +13,12 @@ SEARCH_UNREAD_UNREAD_ONLY_VALUE = 'u'
 SEARCH_UNREAD_READ_ONLY_VALUE = 'r'
 SEARCH_TAG_PARAMETER = 't'
 
+# Results ranked below this are dropped
+SEARCH_RANK_THRESHOLD = 0.3
+# Ranking needs every matching row's full search vector, so only the most
+# recent matches are ranked rather than all of them.
+SEARCH_CANDIDATE_LIMIT = 1000
+
 ReadStatusMode = Enum('ReadStatusMode', ['UNREAD', 'READ', 'ALL'])
   
 def get_read_status_mode(request: HttpRequest) -> ReadStatusMode:
@@ -53,17 +60,6 @@ def query_models(objects: Manager,
   modified_queryset = objects
   search_config: dict[str, str | bool] = {'should_expand': False}
 
-  query_string = request.GET.get(SEARCH_QUERY_PARAMETER, '')
-  if query_string:
-    search_config['should_expand'] = True
-    search_config["query_string"] = query_string
-    search_query = SearchQuery(query_string,
-                               search_type="websearch",
-                               config='english')
-    modified_queryset = objects.annotate(
-        rank=SearchRank(F('content_search'), search_query)).filter(
-            content_search=search_query, rank__gte=0.3).order_by('-rank')
-
   read_status_mode = get_read_status_mode(request)
   if read_status_mode == ReadStatusMode.READ:
     search_config['should_expand'] = True
@@ -82,4 +78,39 @@ def query_models(objects: Manager,
     search_config["tag"] = tag_param
     modified_queryset = modified_queryset.filter(tags__slug=tag_param)
 
+  # Full text search goes last so the candidates it picks have already
+  # been narrowed down by the other filters.
+  query_string = request.GET.get(SEARCH_QUERY_PARAMETER, '')
+  if query_string:
+    search_config['should_expand'] = True
+    search_config["query_string"] = query_string
+    modified_queryset = search_queryset(modified_queryset, query_string)
+
   return (modified_queryset, search_config)
+
+
+def get_ordering(search_config: dict[str, str | bool],
+                 default: list[str]) -> list[str]:
+  # Ordering for paginating the results of query_models. Search results
+  # are sorted by rank, everything else by `default`. Either way the pk
+  # breaks ties.
+  if search_config.get('query_string'):
+    return ['-rank', '-pk']
+  return default
+
+
+def search_queryset(queryset: QuerySet, query_string: str) -> QuerySet:
+  # Searches in two phases. First, the content_search GIN index
+  # finds the matching rows and the most recent SEARCH_CANDIDATE_LIMIT of
+  # them are kept, without ranking anything. Then only those candidates
+  # are ranked, filtered and sorted.
+  search_query = SearchQuery(query_string,
+                             search_type="websearch",
+                             config='english')
+  candidates = queryset.filter(content_search=search_query).values(
+      'pk')[:SEARCH_CANDIDATE_LIMIT]
+  # ts_rank returns a real, which doesn't survive the round trip through
+  # a pagination cursor exactly. A double does.
+  return queryset.filter(pk__in=candidates).annotate(rank=Cast(
+      SearchRank(F('content_search'), search_query), FloatField())).filter(
+          rank__gte=SEARCH_RANK_THRESHOLD).order_by('-rank')
@@ -0,0 +1,53 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Query parameters that only track where a click came from. Links that
+# differ only by these are the same page.
+TRACKING_PARAMETER_PREFIXES = ('utm_', 'mtm_', 'pk_campaign', 'pk_kwd')
+TRACKING_PARAMETERS = {
+    'fbclid', 'gclid', 'dclid', 'gbraid', 'wbraid', 'msclkid', 'yclid',
+    'twclid', 'igshid', 'mc_cid', 'mc_eid', '_hsenc', '_hsmi', 'mkt_tok',
+    'ref_src', 'ref_url', 'oly_anon_id', 'oly_enc_id', 'vero_id', 'wickedid'
+}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def is_tracking_parameter(name: str) -> bool:
+  name = name.lower()
+  return name in TRACKING_PARAMETERS or name.startswith(
+      TRACKING_PARAMETER_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+  """
+  Normalizes a URL so that the different ways of writing the same page
+  compare equal: http and https, letter case and "www." in the host,
+  default ports, trailing slashes, fragments, tracking parameters and the
+  order of the query string.
+  """
+  parts = urlsplit(url.strip())
+  scheme = parts.scheme.lower()
+  if scheme == 'http':
+    scheme = 'https'
+
+  host = (parts.hostname or '').rstrip('.')
+  host = host.removeprefix('www.')
+  try:
+    port = parts.port
+  except ValueError:
+    port = None
+  if port is not None and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+    host = f'{host}:{port}'
+
+  path = parts.path.rstrip('/') or '/'
+  query = urlencode(
+      sorted((name, value)
+             for name, value in parse_qsl(parts.query, keep_blank_values=True)
+             if not is_tracking_parameter(name)))
+  return urlunsplit((scheme, host, path, query, ''))
+
+
+def get_url_key(url: str) -> str:
+  # A fixed-size key for the canonical URL, since URLs can be longer than
+  # an index entry allows.
+  return hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
@@ -1,10 +1,14 @@
+from typing import AsyncIterator, BinaryIO, Iterator
+from asgiref.sync import sync_to_async
 from httpx import ReadTimeout
+from lynx.archive_storage import (CHUNK_SIZE, decompress_chunks,
+                                  get_archive_storage)
 from lynx.commands import create_archive_for_link
 from lynx.models import Link, LinkArchive
 from lynx.utils.singlefile import is_singlefile_enabled
 from .decorators import async_login_required, lynx_post_only
 from django.contrib import messages
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
 from django.shortcuts import aget_object_or_404, redirect
 
 @async_login_required
@@ -28,7 +32,67 @@ async def create_archive_view(request: HttpRequest, link_pk: int) -> HttpRespons
     
   return redirect('lynx:link_archive', link_pk)
   
+def read_chunks(f: BinaryIO, decompress: bool) -> Iterator[bytes]:
+  if decompress:
+    yield from decompress_chunks(f)
+    return
+  while chunk := f.read(CHUNK_SIZE):
+    yield chunk
+
+
+async def stream_archive(f: BinaryIO, decompress: bool) -> AsyncIterator[bytes]:
+  # Each chunk is read in a thread, so neither the event loop nor memory
+  # use depends on the size of the archive.
+  chunks = read_chunks(f, decompress)
+  try:
+    while (chunk := await sync_to_async(next, thread_sensitive=False)(
+        chunks, None)) is not None:
+      yield chunk
+  finally:
+    f.close()
+
+
+def accepts_encoding(request: HttpRequest, encoding: str) -> bool:
+  # An encoding listed with q=0 is one the client refuses
+  accept_encoding = request.headers.get('Accept-Encoding', '')
+  for value in accept_encoding.split(','):
+    name, *params = [part.strip() for part in value.split(';')]
+    if name.lower() != encoding:
+      continue
+    for param in params:
+      key, _, quality = param.partition('=')
+      if key.strip().lower() == 'q':
+        try:
+          return float(quality) > 0
+        except ValueError:
+          return False
+    return True
+  return False
+
+
 async def link_archive_view(request: HttpRequest, link_pk: int) -> HttpResponse:
   user = await request.auser()
-  archive = await aget_object_or_404(LinkArchive, user=user, link__pk=link_pk)
-  return HttpResponse(archive.archive_content)
\ No newline at end of file
+  archive = await aget_object_or_404(
+      LinkArchive.objects.defer('archive_content'),
+      user=user,
+      link__pk=link_pk)
+  if not archive.content_hash:
+    # Saved before archives were moved out of the database
+    await archive.arefresh_from_db(fields=['archive_content'])
+    return HttpResponse(archive.archive_content)
+
+  storage = get_archive_storage()
+  compressed = await sync_to_async(storage.open)(archive.content_hash)
+  content_type = 'text/html; charset=utf-8'
+  if accepts_encoding(request, storage.content_encoding):
+    # Send the stored bytes as they are and let the browser decompress them
+    response = StreamingHttpResponse(stream_archive(compressed, False),
+                                     content_type=content_type)
+    response['Content-Encoding'] = storage.content_encoding
+    response['Content-Length'] = await sync_to_async(storage.size)(
+        archive.content_hash)
+  else:
+    response = StreamingHttpResponse(stream_archive(compressed, True),
+                                     content_type=content_type)
+  response['Vary'] = 'Accept-Encoding'
+  return response
\ No newline at end of file
@@ -9,9 +9,11 @@ from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
 from django.shortcuts import aget_object_or_404, redirect
 from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from lynx.models import FeedItem, Feed, Link
 from lynx.utils import headers
 from lynx import feed_utils, tasks
+from lynx.feed_refresher import FeedRefresher
 
 
 @async_login_required
@@ -38,9 +40,11 @@ async def feed_items_list_view(request: HttpRequest,
                                   pk=feed_id,
                                   is_deleted=False,
                                   user=user)
-  queryset = FeedItem.objects.filter(feed=feed).order_by('-pub_date')
-  paginator_data = await paginator.generate_paginator_context_data(
-      request, queryset)
+  # pub_date is nullable, which doesn't work as a pagination key
+  queryset = FeedItem.objects.filter(feed=feed).annotate(
+      sort_date=Coalesce('pub_date', 'created_at'))
+  paginator_data = await paginator.generate_cursor_paginator_context_data(
+      request, queryset, ['-sort_date', '-pk'])
   breadcrumb_data = breadcrumbs.generate_breadcrumb_context_data(
       [breadcrumbs.HOME, breadcrumbs.FEEDS,
        breadcrumbs.FEED_ITEMS(feed)])
@@ -55,15 +59,21 @@ async def feed_items_list_view(request: HttpRequest,
 async def refresh_all_feeds_view(request: HttpRequest) -> HttpResponse:
   user = await request.auser()
   await headers.maybe_update_usersetting_headers(request, user)
-  feeds = Feed.objects.filter(user=user, is_deleted=False)
-  async for feed in feeds:
-    loader = await (sync_to_async(
-        lambda: feed_utils.RemoteFeedLoader(user, request, feed=feed).
-        load_remote_feed().persist_new_feed_items().persist_feed())())
-    if len(loader.get_new_entries()) > 0:
+  feeds = [
+      feed async for feed in Feed.objects.filter(
+          user=user, is_deleted=False).select_related('user')
+  ]
+  results = await FeedRefresher(request).refresh_feeds(feeds)
+  for result in results:
+    if result.error is not None:
+      messages.error(
+          request,
+          f"Feed (ID {result.feed.pk}) could not be refreshed: {result.error}"
+      )
+    elif len(result.get_new_entries()) > 0:
       messages.success(
           request,
-          f"Feed (ID {loader.get_feed().pk}) refreshed and {len(loader.get_new_entries())} entries added."
+          f"Feed (ID {result.feed.pk}) refreshed and {len(result.get_new_entries())} entries added."
       )
   return redirect('lynx:feeds')
 
@@ -118,8 +128,7 @@ async def add_feed_item_to_library_view(request: HttpRequest, pk):
 
   url = feed_item.saved_as_link
   if url is None:
-    await (sync_to_async(lambda: tasks.add_feed_item_to_library.now(
-        feed.user.pk, feed_item.pk))())
+    await tasks.add_feed_item_to_library.func(feed.user.pk, feed_item.pk)
 
   return redirect('lynx:feed_items', feed_id=feed.pk)
 
@@ -130,11 +139,13 @@ async def add_all_feed_items_to_library_view(request: HttpRequest, pk):
   user = await request.auser()
   await headers.maybe_update_usersetting_headers(request, user)
   feed = await aget_object_or_404(Feed, pk=pk, user=user)
-  count = 0
-  async for item in feed.items.filter(saved_as_link__isnull=True):
-    await (sync_to_async(
-        lambda: tasks.add_feed_item_to_library(feed.user.pk, item.pk))())
-    count += 1
+  item_pks = [
+      item_pk async for item_pk in feed.items.filter(
+          saved_as_link__isnull=True).values_list('pk', flat=True)
+  ]
+  await sync_to_async(tasks.add_feed_item_to_library.enqueue_many)(
+      (user.pk, item_pk) for item_pk in item_pks)
+  count = len(item_pks)
   if count > 0:
     messages.success(request, f"Added {count} new feed items to library.")
   else:
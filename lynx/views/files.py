@@ -1,7 +1,4 @@
-from asgiref.sync import async_to_sync, sync_to_async
-from background_task import background
-import csv
-import codecs
+from asgiref.sync import sync_to_async
 from datetime import datetime as datetime
 from dateutil import parser
 from django import forms
@@ -12,8 +9,10 @@ from django.http import HttpRequest, HttpResponse
 from django.shortcuts import redirect
 from django.template.response import TemplateResponse
 from django.utils import timezone
-from lynx import commands
+from lynx import bulk_import, commands
+from lynx.jobs import job
 from lynx.models import Tag, BulkUpload
+from lynx.tasks import import_bulk_upload_in_background
 from typing import Optional
 from .widgets import DaisySelect
 from . import breadcrumbs
@@ -33,7 +32,7 @@ async def bulk_upload_view(request: HttpRequest) -> HttpResponse:
           bulk_tag, _ = await Tag.objects.aget_or_create(name=f'readwise_upload_{bulk_upload.pk}', user=user)
           bulk_upload.tag_slug = bulk_tag.slug
           await bulk_upload.asave()
-          await handle_readwise_upload(request, request.FILES['file'], bulk_tag.name)
+          await handle_readwise_upload(request, request.FILES['file'], bulk_upload, bulk_tag.name)
           return redirect('lynx:links_feed_tagged', slug=bulk_tag.slug)
         case _:
           messages.warning(request, 'Unsupported file source')
@@ -43,36 +42,23 @@ async def bulk_upload_view(request: HttpRequest) -> HttpResponse:
   breadcrumb_data = breadcrumbs.generate_breadcrumb_context_data([
     breadcrumbs.HOME, breadcrumbs.BULK_UPLOAD
   ])
-  return TemplateResponse(request, 'lynx/bulk_upload.html', context={'form': form} | breadcrumb_data)
+  recent_uploads = [upload async for upload in BulkUpload.objects.filter(user=user).order_by('-created_at')[:10]]
+  return TemplateResponse(request, 'lynx/bulk_upload.html', context={'form': form, 'recent_uploads': recent_uploads} | breadcrumb_data)
 
-async def handle_readwise_upload(request: HttpRequest, file: File, bulk_tag: str) -> None:
-  user = await request.auser()
-  reader = csv.DictReader(codecs.iterdecode(file, 'utf-8'))
-  for row in reader:
-    url = row['URL']
-    if url.startswith('mailto'):
-      continue
-    tags = []
-    if len(row.get('Document tags', '')) > 2:
-      tags = [
-        tag.strip().removesuffix("'").removeprefix("'") for tag 
-        in row['Document tags'][1:-1].split(', ')]
-    tags.append(bulk_tag)
-
-    last_viewed_at = None
-    if float(row.get('Reading progress', '0')) > 0.75:
-      last_viewed_at = str(timezone.now())
-
-    added_at = str(timezone.now())
-    if row.get('Saved date'):
-      added_at = str(parser.parse(row['Saved date']))
-    
-    await (sync_to_async(add_new_link_in_background)(user.pk, url, tags, last_viewed_at, added_at))
+async def handle_readwise_upload(request: HttpRequest, file: File, bulk_upload: BulkUpload, bulk_tag: str) -> None:
+  # The rows are stored up front and imported by a single background task,
+  # which can pick up where it left off if it's interrupted.
+  total = await sync_to_async(bulk_import.create_upload_rows)(
+    bulk_upload, bulk_import.read_readwise_rows(file, bulk_tag))
+  await sync_to_async(import_bulk_upload_in_background)(bulk_upload.pk)
+  messages.info(request, f'Importing {total} links in the background')
 
-@background
-def add_new_link_in_background(user_pk: int, url: str, tags: list[str],  last_viewed_at_str: Optional[str], added_at_str: Optional[str]):
-  user = User.objects.get(pk=user_pk)
-  tag_models = [Tag.objects.get_or_create(name=tag, user=user)[0] for tag in tags]
+# Uploads are now imported by tasks.import_bulk_upload_in_background. This is
+# kept so that tasks queued before that change still run.
+@job()
+async def add_new_link_in_background(user_pk: int, url: str, tags: list[str],  last_viewed_at_str: Optional[str], added_at_str: Optional[str]):
+  user = await User.objects.aget(pk=user_pk)
+  tag_models = [(await Tag.objects.aget_or_create(name=tag, user=user))[0] for tag in tags]
   
   added_at = timezone.now()
   if added_at_str:
@@ -82,12 +68,12 @@ def add_new_link_in_background(user_pk: int, url: str, tags: list[str],  last_vi
   if last_viewed_at_str:
     last_viewed_at = parser.parse(last_viewed_at_str)
 
-  link, _ = async_to_sync(commands.get_or_create_link)(url, user, model_fields={
+  link, _ = await commands.get_or_create_link(url, user, model_fields={
     'added_at': added_at,
     'last_viewed_at': last_viewed_at,
   })
-  link.save()
+  await link.asave()
   
   if tag_models:
-    link.tags.set(tag_models)
-    link.save()
\ No newline at end of file
+    await link.tags.aset(tag_models)
+    await link.asave()
\ No newline at end of file
@@ -1,4 +1,3 @@
-from django.db.models import Exists, OuterRef
 
 from lynx.utils.singlefile import is_singlefile_enabled
 from .decorators import async_login_required, lynx_post_only
@@ -10,8 +9,8 @@ from django.contrib import messages
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
 from django.utils import timezone
-from lynx import url_parser, url_summarizer, html_cleaner, commands
-from lynx.models import Link, LinkArchive, Note, Tag
+from lynx import url_parser, url_summarizer, commands
+from lynx.models import Link, Note, Tag
 from lynx.errors import NoAPIKeyInSettings, UrlParseError
 from lynx.tag_manager import delete_tag_for_user, create_tag_for_user, add_tags_to_link, load_all_user_tags, remove_tags_from_link, set_tags_on_link
 from lynx.utils import headers, search
@@ -89,36 +88,14 @@ async def link_actions_view(request: HttpRequest, pk: int) -> HttpResponse:
           'You must have an OpenAI API key in your settings to summarize links.'
       )
   elif 'action_reload' in request.POST:
-    # Don't use the command here because we want to directly fetch
-    # the content rather than returning early because the link exists.
-    new_link = await (sync_to_async(url_parser.parse_url)(link.original_url,
-                                                          user))
-    link.cleaned_url = new_link.cleaned_url
-    link.hostname = new_link.hostname
-    link.title = new_link.title
-    link.article_date = new_link.article_date
-    link.author = new_link.author
-    link.excerpt = new_link.excerpt
-    link.article_html = new_link.article_html
-    link.raw_text_content = new_link.raw_text_content
-    link.full_page_html = new_link.full_page_html
-    link.header_image_url = new_link.header_image_url
-    link.read_time_seconds = new_link.read_time_seconds
-    link.read_time_display = new_link.read_time_display
-    await link.asave()
+    try:
+      if not await commands.reload_link(link, user):
+        messages.info(request, 'The page hasn\'t changed since it was saved.')
+    except UrlParseError as e:
+      messages.error(request,
+                     f'Unable to reload link. The error was: {e.http_error}')
   elif 'action_reparse' in request.POST:
-    url_context = url_parser.UrlContext(link.original_url, user)
-    reparsed = url_parser.parse_content(url_context, link.full_page_html)
-    link.article_date = reparsed['article_date']
-    link.author = reparsed['author']
-    link.title = reparsed['title']
-    link.excerpt = reparsed['excerpt']
-    link.article_html = reparsed['article_html']
-    link.raw_text_content = reparsed['raw_text_content']
-    link.header_image_url = reparsed['header_image_url']
-    link.read_time_seconds = reparsed['read_time_seconds']
-    link.read_time_display = reparsed['read_time_display']
-    await link.asave()
+    await commands.reparse_link(link, user)
   else:
     messages.warning(request, 'Unable to perform unknown action')
 
@@ -131,11 +108,17 @@ async def link_actions_view(request: HttpRequest, pk: int) -> HttpResponse:
 async def readable_view(request: HttpRequest, pk: int) -> HttpResponse:
   user = await request.auser()
   link = await aget_object_or_404(Link.objects_with_full_content.defer(
-      'raw_text_content', 'full_page_html', 'content_search'),
+      'article_html', 'raw_text_content', 'full_page_html', 'content_search'),
                                   pk=pk,
                                   user=user)
-  cleaner = html_cleaner.HTMLCleaner(link.article_html)
-  cleaner.generate_headings().replace_image_links_with_images()
+  if not link.reader_html:
+    # Links extracted before the reader view was stored with them
+    await link.arefresh_from_db(fields=['article_html'])
+    if link.article_html:
+      await sync_to_async(link.render_reader_view)()
+      await Link.objects.filter(pk=link.pk).aupdate(
+          reader_html=link.reader_html,
+          table_of_contents=link.table_of_contents)
   tags_queryset = link.tags.all()
   tags = await (sync_to_async(list)(tags_queryset))
   all_user_tags = await (sync_to_async(list)(Tag.objects.filter(user=user)))
@@ -147,15 +130,18 @@ async def readable_view(request: HttpRequest, pk: int) -> HttpResponse:
       'all_user_tags':
       all_user_tags,
       'html_with_sections':
-      cleaner.prettify(),
-      'table_of_contents': [h.to_dict() for h in cleaner.get_headings()],
+      link.reader_html,
+      'table_of_contents':
+      link.table_of_contents,
       'back_button_link':
       headers.get_lynx_referrer_or_default(request,
                                            exclude_route='links/<int:pk>/view')
   }
 
+  # Only the one column, rather than every field loaded above
   link.last_viewed_at = timezone.now()
-  await link.asave()
+  await Link.objects.filter(pk=link.pk).aupdate(
+      last_viewed_at=link.last_viewed_at)
   return TemplateResponse(request, "lynx/link_viewer.html", context_data)
 
 
@@ -194,8 +180,6 @@ async def details_view(request: HttpRequest, pk: int) -> HttpResponse:
             'article_date': link.article_date
         })
 
-  has_existing_archive = await LinkArchive.objects.filter(link=link).aexists()
-
   breadcrumb_data = breadcrumbs.generate_breadcrumb_context_data(
       [breadcrumbs.HOME, breadcrumbs.EDIT_LINK(link)])
   return TemplateResponse(request,
@@ -204,7 +188,7 @@ async def details_view(request: HttpRequest, pk: int) -> HttpResponse:
                               'link': link,
                               'form': form,
                               'singlefile_enabled': is_singlefile_enabled(),
-                              'has_existing_archive': has_existing_archive
+                              'has_existing_archive': link.has_archive
                           } | breadcrumb_data)
 
 
@@ -219,15 +203,14 @@ async def link_feed_view(request: HttpRequest,
   # Filter to just links owned by this user, then the search
   # helper will do the rest.
   queryset, search_config = search.query_models(
-      Link.objects.filter(user=user).annotate(
-          has_archive=Exists(LinkArchive.objects.filter(link=OuterRef('pk')))),
-      request)
+      Link.objects.filter(user=user).prefetch_related('tags'), request)
 
   data = {}
   data['search_config'] = search_config
 
-  paginator_data = await paginator.generate_paginator_context_data(
-      request, queryset)
+  paginator_data = await paginator.generate_cursor_paginator_context_data(
+      request, queryset,
+      search.get_ordering(search_config, ['-added_at', '-pk']))
   tags = await load_all_user_tags(user)
   data['tags'] = tags
   data = data | paginator_data | breadcrumbs.generate_breadcrumb_context_data(
@@ -239,12 +222,12 @@ async def link_feed_view(request: HttpRequest,
 async def tagged_links_view(request: HttpRequest, slug: str) -> HttpResponse:
   user = await request.auser()
   tag = await aget_object_or_404(Tag, slug=slug, user=user)
-  queryset = Link.objects.filter(user=user, tags=tag).annotate(
-      has_archive=Exists(LinkArchive.objects.filter(link=OuterRef('pk'))))
+  queryset = Link.objects.filter(user=user,
+                                 tags=tag).prefetch_related('tags')
   data = {}
   data['title'] = f"Links tagged with '{tag.name}'"
-  paginator_data = await paginator.generate_paginator_context_data(
-      request, queryset)
+  paginator_data = await paginator.generate_cursor_paginator_context_data(
+      request, queryset, ['-added_at', '-pk'])
   breadcrumb_data = breadcrumbs.generate_breadcrumb_context_data([
       breadcrumbs.HOME, breadcrumbs.MANAGE_TAGS,
       breadcrumbs.TAGGED_LINKS(slug)
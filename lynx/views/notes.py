@@ -47,9 +47,10 @@ async def all_notes_view(request: HttpRequest) -> HttpResponse:
   user = await request.auser()
   tags = await load_all_user_tags(user)
   queryset, search_config = search.query_models(
-      Note.objects.filter(user=user).order_by('-saved_at'), request)
-  paginator_data = await paginator.generate_paginator_context_data(
-      request, queryset)
+      Note.objects.filter(user=user), request)
+  paginator_data = await paginator.generate_cursor_paginator_context_data(
+      request, queryset,
+      search.get_ordering(search_config, ['-saved_at', '-pk']))
 
   breadcrumb_data = breadcrumbs.generate_breadcrumb_context_data(
       [breadcrumbs.HOME, breadcrumbs.NOTES])
@@ -1,6 +1,7 @@
 from .decorators import async_login_required
 from .widgets import FancyTextWidget, FancyPasswordWidget, APIKeyWidget
 from . import breadcrumbs
+from typing import Optional
 from asgiref.sync import sync_to_async
 from django.http import HttpRequest, HttpResponse
 from django.template.response import TemplateResponse
@@ -10,9 +11,8 @@ from django.contrib import messages
 from django.utils import timezone
 from extra_views import ModelFormSetView
 from lynx.models import UserSetting, UserCookie
-import secrets
 from django.shortcuts import redirect
-from lynx import url_parser
+from lynx import api_keys, url_parser
 from lynx.utils import headers
 
 
@@ -48,12 +48,16 @@ class UpdateSettingsForm(forms.Form):
           'required': False
       }))
 
-  def update_setting(self, user, request: HttpRequest):
+  def update_setting(self, user, request: HttpRequest) -> Optional[str]:
+    # Returns the new API key if it was reset, which is the only time it
+    # can be shown.
     setting, _ = UserSetting.objects.get_or_create(user=user)
+    new_api_key = None
     if 'reset_api_key' in self.data:
-      setting.lynx_api_key = secrets.token_hex(16)
+      new_api_key = api_keys.generate_api_key()
+      api_keys.set_api_key(setting, new_api_key)
     elif 'clear_api_key' in self.data:
-      setting.lynx_api_key = ""
+      api_keys.set_api_key(setting, '')
     setting.headers_for_scraping = headers.extract_headers_to_pass_for_parse(
         request)
     setting.headers_updated_at = timezone.now()
@@ -64,6 +68,13 @@ class UpdateSettingsForm(forms.Form):
     setting.automatically_summarize_new_links = self.cleaned_data.get(
         'auto_summarize_new_links', False)
     setting.save()
+    return new_api_key
+
+
+def get_api_key_display(setting: UserSetting) -> str:
+  if not setting.lynx_api_key_hash:
+    return ''
+  return f'{setting.lynx_api_key_prefix}…'
 
 
 @async_login_required
@@ -73,15 +84,23 @@ async def update_settings_view(request: HttpRequest) -> HttpResponse:
   if request.method == 'POST':
     form = UpdateSettingsForm(request.POST)
     if form.is_valid():
-      await (sync_to_async(lambda: form.update_setting(user, request))())
-      messages.success(request, "Settings updated.")
-      return redirect('lynx:user_settings')
+      new_api_key = await (
+          sync_to_async(lambda: form.update_setting(user, request))())
+      if new_api_key is None:
+        messages.success(request, "Settings updated.")
+        return redirect('lynx:user_settings')
+      # Rendered instead of redirecting, since the key can't be shown again
+      messages.success(
+          request, "Settings updated. Copy your new API key now, it won't "
+          "be shown again.")
+      form = UpdateSettingsForm(
+          initial=form.cleaned_data | {'lynx_api_key': new_api_key})
   else:
     form = UpdateSettingsForm(
         initial={
             'openai_api_key': setting.openai_api_key,
             'anthropic_api_key': setting.anthropic_api_key,
-            'lynx_api_key': setting.lynx_api_key,
+            'lynx_api_key': get_api_key_display(setting),
             'summarization_model': setting.summarization_model,
             'auto_summarize_new_links': setting.automatically_summarize_new_links
         })
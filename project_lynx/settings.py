@@ -44,6 +44,7 @@ INSTALLED_APPS = [
     'django.contrib.postgres',
     'django.contrib.humanize',
     'extra_views',
+    # Only needed to move tasks queued by older versions over to lynx jobs
     'background_task',
     'query_parameters'
 ]
@@ -147,3 +148,65 @@ STORAGES = {
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',')
+
+# Number of processes used for article extraction (parsing fetched pages).
+# Set to 0 to run extraction in a thread of the web process instead.
+LYNX_EXTRACTION_WORKERS = int(
+    os.getenv('LYNX_EXTRACTION_WORKERS', os.cpu_count() or 1))
+
+# Where SingleFile archives are stored. The default backend keeps them on
+# the local filesystem under LYNX_ARCHIVE_ROOT.
+LYNX_ARCHIVE_STORAGE = os.getenv('LYNX_ARCHIVE_STORAGE',
+                                 'lynx.archive_storage.LocalArchiveStorage')
+LYNX_ARCHIVE_ROOT = os.getenv('LYNX_ARCHIVE_ROOT', BASE_DIR / 'archives')
+
+# Limits for generating summaries, applied separately to each provider.
+# Articles longer than the token budget are cut down to it, or summarized
+# in up to LYNX_SUMMARY_MAX_CHUNKS parts which are then combined.
+LYNX_SUMMARY_MAX_CONCURRENCY = int(
+    os.getenv('LYNX_SUMMARY_MAX_CONCURRENCY', '4'))
+LYNX_SUMMARY_REQUESTS_PER_MINUTE = int(
+    os.getenv('LYNX_SUMMARY_REQUESTS_PER_MINUTE', '50'))
+LYNX_SUMMARY_TOKENS_PER_MINUTE = int(
+    os.getenv('LYNX_SUMMARY_TOKENS_PER_MINUTE', '100000'))
+LYNX_SUMMARY_INPUT_TOKEN_BUDGET = int(
+    os.getenv('LYNX_SUMMARY_INPUT_TOKEN_BUDGET', '12000'))
+LYNX_SUMMARY_MAX_CHUNKS = int(os.getenv('LYNX_SUMMARY_MAX_CHUNKS', '1'))
+
+# Generated summaries are cached by article text, keeping at most this many
+# and dropping the least recently used ones first.
+LYNX_SUMMARY_CACHE_MAX_ENTRIES = int(
+    os.getenv('LYNX_SUMMARY_CACHE_MAX_ENTRIES', '10000'))
+# The cache is pruned back to that size once every this many new summaries
+LYNX_SUMMARY_CACHE_PRUNE_INTERVAL = int(
+    os.getenv('LYNX_SUMMARY_CACHE_PRUNE_INTERVAL', '100'))
+
+# Background jobs are run by `manage.py runjobs`. Each queue runs at most
+# this many jobs at once per worker process.
+LYNX_JOB_QUEUES = {
+    'default': int(os.getenv('LYNX_JOB_CONCURRENCY', '16')),
+    'archives': int(os.getenv('LYNX_JOB_ARCHIVE_CONCURRENCY', '2')),
+}
+LYNX_JOB_POLL_INTERVAL_SECONDS = float(
+    os.getenv('LYNX_JOB_POLL_INTERVAL_SECONDS', '2'))
+
+# Pages are downloaded over a shared connection pool. HTTP/2 needs the h2
+# package (httpx[http2]).
+LYNX_FETCH_MAX_CONNECTIONS = int(os.getenv('LYNX_FETCH_MAX_CONNECTIONS', '100'))
+LYNX_FETCH_MAX_CONNECTIONS_PER_HOST = int(
+    os.getenv('LYNX_FETCH_MAX_CONNECTIONS_PER_HOST', '6'))
+LYNX_FETCH_HTTP2 = os.getenv('LYNX_FETCH_HTTP2', 'False') == 'True'
+# Pages larger than this are not saved
+LYNX_FETCH_MAX_BYTES = int(os.getenv('LYNX_FETCH_MAX_BYTES',
+                                     str(10 * 1024 * 1024)))
+# How long each user's scraping headers and cookies are cached for
+LYNX_SCRAPING_PROFILE_CACHE_SECONDS = int(
+    os.getenv('LYNX_SCRAPING_PROFILE_CACHE_SECONDS', '300'))
+
+# How long a verified API key is trusted before it's looked up again
+LYNX_API_KEY_CACHE_SECONDS = int(os.getenv('LYNX_API_KEY_CACHE_SECONDS', '60'))
+
+# The batch API endpoints take at most this many items per request, and
+# load at most this many new pages at once for each request.
+LYNX_API_BATCH_MAX_ITEMS = int(os.getenv('LYNX_API_BATCH_MAX_ITEMS', '100'))
+LYNX_API_BATCH_CONCURRENCY = int(os.getenv('LYNX_API_BATCH_CONCURRENCY', '4'))